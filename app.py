@@ -3,16 +3,368 @@ Prompt-to-JSON Enhancer Web App
 Flask backend with modular prompt transformation logic
 """
 
-from flask import Flask, request, jsonify, render_template
+import atexit
+import hmac
+import json
+import logging
+import os
+import time
+
+from flask import Flask, Response, g, request, jsonify, render_template, stream_with_context
 from flask_cors import CORS
+from config import Config
 from utils import validate_prompt, get_cache_key, transform_prompt_to_json
+from utils.batch import transform_many
+from utils.cache import LRUCache, create_cache
+from utils.cache_snapshot import CacheSnapshotter
+from utils.compact_results import ResultCodec
+from utils.responses import PreparedResponse, make_etag, etag_matches, prepare_response, select_body
+from utils.prompt_analyzer import fingerprint_cache, transform_hits
+from utils.rules import get_rules, use_rules, reload_rules_if_changed
+from utils.customizer import DEFAULT_INCLUDE_KEYS, apply_output_options, validate_output_options
+from utils.metrics import MetricsRegistry, MultiProcessMetrics, StageTimer, PROMPT_LENGTH_BUCKETS
+from utils.single_flight import SingleFlight
+from utils.admission import AdmissionController, Overloaded, RateLimiter
+from utils.profiler import SamplingProfiler
+from utils.shadow import ShadowRunner, load_engine
+from utils.sessions import SessionError, SessionStore
+from utils.tracing import (EXPOSED_HEADERS, REQUEST_ID_HEADER, log_request_error, log_slow_request,
+                           request_context, request_id, server_timing)
 
 # Initialize Flask app
 app = Flask(__name__)
-CORS(app)
+app.config.from_object(Config)
+CORS(app, expose_headers=list(EXPOSED_HEADERS))
+
+# Rule tables, hot-reloaded when RULES_PATH changes
+use_rules(app.config['RULES_PATH'], app.config['RULES_RELOAD_INTERVAL_SECONDS'])
+
+
+def render_cache_hit(result):
+    """Serialize the response a cache hit on result is served as: (body, gzipped)"""
+    prepared = prepare_response(dict(result, cached=True), None, app.config['RESPONSE_GZIP_MIN_BYTES'])
+    return prepared.body, prepared.gzipped
+
+
+# Bounded LRU cache for transformations (per worker or shared per host). SQLite
+# rows also hold the serialized hit response, so every worker serves its bytes.
+transformation_cache = create_cache(
+    app.config['CACHE_BACKEND'],
+    path=app.config['CACHE_SQLITE_PATH'],
+    max_entries=app.config['CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['CACHE_MAX_BYTES'],
+    ttl=app.config['CACHE_TTL_SECONDS'],
+    codec=ResultCodec() if app.config['CACHE_COMPACT'] else None,
+    renderer=render_cache_hit
+)
+
+# Serialized cache-hit responses for /transform in front of the per-worker memory
+# cache (the SQLite backend keeps them in its rows instead).
+response_cache = None
+if isinstance(transformation_cache, LRUCache) and app.config['RESPONSE_CACHE_MAX_ENTRIES'] > 0:
+    response_cache = LRUCache(
+        max_entries=app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+        max_bytes=app.config['RESPONSE_CACHE_MAX_BYTES'],
+        ttl=app.config['CACHE_TTL_SECONDS']
+    )
+
+# Warm restarts: the in-memory cache is restored from its last snapshot
+# (the SQLite backend already persists on disk)
+cache_snapshotter = None
+if isinstance(transformation_cache, LRUCache) and app.config['CACHE_SNAPSHOT_PATH']:
+    cache_snapshotter = CacheSnapshotter(
+        transformation_cache, app.config['CACHE_SNAPSHOT_PATH'],
+        app.config['CACHE_SNAPSHOT_INTERVAL_SECONDS'], lambda: get_rules().version)
+    cache_snapshotter.restore()
+    atexit.register(cache_snapshotter.stop)
+
+# Snapshots and compact storage only apply to the memory backend; name the
+# ones that are configured but off so this is not silent
+disabled_cache_features = []
+if not isinstance(transformation_cache, LRUCache):
+    for enabled, feature in ((app.config['CACHE_SNAPSHOT_PATH'], 'snapshots'),
+                             (app.config['CACHE_COMPACT'], 'compact')):
+        if enabled:
+            disabled_cache_features.append(feature)
+if disabled_cache_features:
+    logging.getLogger('prompt_enhancer').warning(
+        "CACHE_BACKEND=%s: %s only work with CACHE_BACKEND=memory and are disabled",
+        app.config['CACHE_BACKEND'], ', '.join(disabled_cache_features))
+
+# Concurrent cache misses for the same prompt run one transformation
+transform_flight = SingleFlight(timeout=app.config['SINGLE_FLIGHT_TIMEOUT_SECONDS'])
+
+# Load shedding for the transform endpoints
+admission = AdmissionController(
+    max_in_flight=app.config['ADMISSION_MAX_IN_FLIGHT'],
+    max_queue=app.config['ADMISSION_MAX_QUEUE'],
+    queue_timeout=app.config['ADMISSION_QUEUE_TIMEOUT_SECONDS'],
+    retry_after=app.config['ADMISSION_RETRY_AFTER_SECONDS']
+)
+# Batches fan out over the process pool, so they are also bounded on their own
+batch_admission = AdmissionController(
+    max_in_flight=app.config['BATCH_MAX_IN_FLIGHT'],
+    max_queue=app.config['BATCH_MAX_QUEUE'],
+    queue_timeout=app.config['ADMISSION_QUEUE_TIMEOUT_SECONDS'],
+    retry_after=app.config['ADMISSION_RETRY_AFTER_SECONDS']
+)
+rate_limiter = RateLimiter(app.config['RATE_LIMIT_PER_SECOND'], app.config['RATE_LIMIT_BURST'])
+
+# Live-typing sessions: match state updated from edits (per worker or shared per host)
+session_store = SessionStore(
+    max_length=app.config['MAX_PROMPT_LENGTH'],
+    states=create_cache(
+        app.config['SESSION_BACKEND'],
+        path=app.config['SESSION_SQLITE_PATH'],
+        max_entries=app.config['SESSION_MAX_ENTRIES'],
+        max_bytes=app.config['SESSION_MAX_BYTES'],
+        ttl=app.config['SESSION_IDLE_SECONDS']
+    )
+)
+
+# On-demand stack sampling for this worker, driven through /debug/profile
+profiler = SamplingProfiler()
+
+# Per-worker metrics published at /metrics
+metrics = MetricsRegistry()
+REQUEST_COUNT = metrics.counter(
+    'prompt_enhancer_requests_total', 'HTTP requests by endpoint and status', ('endpoint', 'status'))
+REQUEST_LATENCY = metrics.histogram(
+    'prompt_enhancer_request_duration_seconds', 'Request latency by endpoint', ('endpoint',))
+STAGE_LATENCY = metrics.histogram(
+    'prompt_enhancer_stage_duration_seconds', 'Time spent per processing stage', ('stage',))
+CACHE_LOOKUPS = metrics.counter(
+    'prompt_enhancer_cache_lookups_total', 'Transformation cache lookups by result', ('result',))
+COALESCED = metrics.counter(
+    'prompt_enhancer_coalesced_total', 'Cache misses by single-flight role', ('role',))
+PROMPT_LENGTH = metrics.histogram(
+    'prompt_enhancer_prompt_length_chars', 'Length of validated prompts', buckets=PROMPT_LENGTH_BUCKETS)
+SHED = metrics.counter(
+    'prompt_enhancer_shed_total', 'Requests refused by admission control', ('reason',))
+SHADOW_RUNS = metrics.counter(
+    'prompt_enhancer_shadow_runs_total', 'Shadow runs of the candidate engine by outcome', ('outcome',))
+SHADOW_LATENCY = metrics.histogram(
+    'prompt_enhancer_shadow_duration_seconds', 'Transformation time on shadowed prompts', ('engine',))
+metrics.gauge('prompt_enhancer_admission_saturation', 'Share of admission slots and queue in use',
+              lambda: admission.stats()['saturation'])
+metrics.gauge('prompt_enhancer_cache_hit_ratio', 'Transformation cache hit ratio',
+              lambda: transformation_cache.stats()['hit_ratio'])
+metrics.gauge('prompt_enhancer_cache_entries', 'Entries in the transformation cache',
+              lambda: len(transformation_cache))
+
+# Under Gunicorn, /metrics reports all workers' totals, whichever worker is scraped
+metrics_store = None
+if app.config['METRICS_MULTIPROC_DIR']:
+    metrics_store = MultiProcessMetrics(
+        metrics, app.config['METRICS_MULTIPROC_DIR'], app.config['METRICS_FLUSH_INTERVAL_SECONDS'])
+    atexit.register(metrics_store.stop)
+
+
+
+def record_shadow_run(outcome, primary_seconds, candidate_seconds):
+    """Export a shadow run's outcome and both engines' timings"""
+    SHADOW_RUNS.inc(outcome=outcome)
+    SHADOW_LATENCY.observe(primary_seconds, engine='current')
+    SHADOW_LATENCY.observe(candidate_seconds, engine='candidate')
+
+
+# Candidate engine checked against live traffic without affecting responses
+shadow = None
+if app.config['SHADOW_ENGINE']:
+    shadow = ShadowRunner(
+        load_engine(app.config['SHADOW_ENGINE']), app.config['SHADOW_ENGINE'],
+        sample_rate=app.config['SHADOW_SAMPLE_RATE'],
+        max_pending=app.config['SHADOW_MAX_PENDING'],
+        on_result=record_shadow_run
+    )
+
+
+# Endpoints whose requests are checked against SLOW_REQUEST_THRESHOLD_MS
+SLOW_LOG_ENDPOINTS = frozenset(('transform', 'transform_custom', 'transform_batch', 'transform_session'))
+
+
+@app.before_request
+def start_request_timer():
+    """Start timing the request and collecting per-stage timings"""
+    g.request_started = time.perf_counter()
+    g.timings = {}
+    g.request_id = request_id(request.headers.get(REQUEST_ID_HEADER))
+    reload_rules_if_changed()
+    if cache_snapshotter is not None:
+        cache_snapshotter.ensure_started()
+    if metrics_store is not None:
+        metrics_store.ensure_started()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record request count, latency and stage timings, and trace the request"""
+    started = g.get('request_started')
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unknown'
+        REQUEST_COUNT.inc(endpoint=endpoint, status=str(response.status_code))
+        REQUEST_LATENCY.observe(elapsed, endpoint=endpoint)
+        for stage, seconds in g.timings.items():
+            STAGE_LATENCY.observe(seconds, stage=stage)
+        if profiler.running and endpoint != 'debug_profile':
+            profiler.request_finished()
+        response.headers[REQUEST_ID_HEADER] = g.request_id
+        response.headers['Server-Timing'] = server_timing(g.timings, elapsed)
+        if endpoint in SLOW_LOG_ENDPOINTS:
+            log_slow_request(trace_context(), response.status_code, elapsed,
+                             app.config['SLOW_REQUEST_THRESHOLD_MS'] / 1000)
+    return response
+
+
+def trace_context():
+    """Request ID, route, prompt length, cache outcome and stage timings of the current request"""
+    return request_context(g.request_id, request.method, request.path, request.endpoint or 'unknown',
+                           g.timings, g.get('prompt_length'), g.get('cache_outcome'))
+
+
+def internal_error(error):
+    """Log an unhandled error with its request context; returns the 500 response body"""
+    log_request_error(trace_context(), error)
+    return {"error": f"Internal server error: {str(error)}", "request_id": g.request_id}
+
+
+def rules_cache_key(prompt, rules=None):
+    """Cache key for a prompt under the active (or given) rules, so a rule update misses old entries"""
+    return f"{(rules or get_rules()).version}:{get_cache_key(prompt)}"
+
+
+def lookup_cache(cache_key, timings=None):
+    """Fetch a cached result, timing the lookup and counting hits/misses"""
+    with StageTimer(timings, 'cache_lookup'):
+        cached_result = transformation_cache.get(cache_key)
+    CACHE_LOOKUPS.inc(result='miss' if cached_result is None else 'hit')
+    return cached_result
+
+
+def lookup_prepared(cache_key, timings=None):
+    """
+    Return the serialized cache-hit response for a key, or None on a miss.
+    
+    The SQLite backend returns the bytes stored with the entry. With the
+    memory backend they come from the response cache when possible;
+    otherwise the cached result is serialized once and kept there for the
+    next hit.
+    """
+    if not isinstance(transformation_cache, LRUCache):
+        with StageTimer(timings, 'cache_lookup'):
+            rendered = transformation_cache.get_rendered(cache_key)
+        CACHE_LOOKUPS.inc(result='miss' if rendered is None else 'hit')
+        if rendered is None:
+            return None
+        return PreparedResponse(*rendered, make_etag(cache_key))
+
+    if response_cache is not None:
+        with StageTimer(timings, 'cache_lookup'):
+            prepared = response_cache.get(cache_key)
+        if prepared is not None:
+            CACHE_LOOKUPS.inc(result='hit')
+            return prepared
+    
+    cached_result = lookup_cache(cache_key, timings)
+    if cached_result is None:
+        return None
+    with StageTimer(timings, 'serialization'):
+        prepared = prepare_response(dict(cached_result, cached=True), make_etag(cache_key),
+                                    app.config['RESPONSE_GZIP_MIN_BYTES'])
+    if response_cache is not None:
+        response_cache.set(cache_key, prepared)
+    return prepared
+
 
-# Simple in-memory cache for transformations
-transformation_cache = {}
+def compute_and_cache(prompt, cache_key, timings=None):
+    """Transform a prompt and cache the full result, offering it to shadow mode"""
+    rules = get_rules()
+    started = time.perf_counter()
+    result = transform_prompt_to_json(prompt, timings=timings, rules=rules)
+    if shadow is not None:
+        shadow.submit(prompt, result, time.perf_counter() - started, rules)
+    transformation_cache.set(cache_key, result)
+    return result
+
+
+def admitted_compute_and_cache(prompt, cache_key, timings=None):
+    """compute_and_cache() inside an admission slot"""
+    with admission.slot():
+        return compute_and_cache(prompt, cache_key, timings)
+
+
+def client_id(headers, remote_addr):
+    """Identify a client for rate limiting: the configured header's first value, else the peer address"""
+    header = app.config['RATE_LIMIT_CLIENT_HEADER']
+    value = headers.get(header) if header else None
+    return value.split(',')[0].strip() if value else (remote_addr or 'unknown')
+
+
+def overloaded_payload(error):
+    """Count a refused request and return (body, status, headers) for it"""
+    SHED.inc(reason=error.reason)
+    return {"error": str(error)}, error.status, {'Retry-After': str(error.retry_after)}
+
+
+def record_coalescing(shared, started, timings=None):
+    """Count a single-flight outcome; followers record their wait as a stage"""
+    COALESCED.inc(role='follower' if shared else 'leader')
+    if shared and timings is not None:
+        timings['coalesce_wait'] = timings.get('coalesce_wait', 0.0) + time.perf_counter() - started
+
+
+def coalesced_transform(prompt, cache_key, timings=None, admit=False):
+    """
+    Compute and cache a full result for a cache miss.
+    
+    Concurrent misses for the same cache key wait for one computation
+    instead of each running the transformer. With ``admit``, the
+    computation needs an admission slot and may raise Overloaded.
+    """
+    started = time.perf_counter()
+    compute = admitted_compute_and_cache if admit else compute_and_cache
+    result, shared = transform_flight.do(cache_key, compute, prompt, cache_key, timings)
+    record_coalescing(shared, started, timings)
+    return result
+
+
+def timed_jsonify(payload):
+    """jsonify() with the time spent recorded as the serialization stage"""
+    with StageTimer(g.get('timings'), 'serialization'):
+        return jsonify(payload)
+
+
+def transform_with_options(prompt, include_keys, output_style, timings=None, admit=False):
+    """
+    Return a customized result for a validated prompt, using the cache.
+    
+    The cached canonical result is projected through include_keys and
+    output_style. On a miss, a full key set is computed and cached, while a
+    partial key set runs only the pipeline stages it needs. With ``admit``,
+    misses need an admission slot and may raise Overloaded.
+    """
+    cache_key = rules_cache_key(prompt)
+    cached_result = lookup_cache(cache_key, timings)
+    if cached_result is not None:
+        filtered_result = apply_output_options(cached_result, include_keys, output_style)
+        filtered_result["cached"] = True
+        return filtered_result
+    
+    if set(include_keys) >= set(DEFAULT_INCLUDE_KEYS):
+        # Full result: compute once and cache it for every endpoint
+        result = coalesced_transform(prompt, cache_key, timings, admit)
+    elif admit:
+        # Partial result: run only the stages the requested keys need
+        with admission.slot():
+            result = transform_prompt_to_json(prompt, include_keys, timings=timings)
+    else:
+        result = transform_prompt_to_json(prompt, include_keys, timings=timings)
+    
+    # Apply customization and filter keys based on user selection
+    filtered_result = apply_output_options(result, include_keys, output_style)
+    filtered_result["cached"] = False
+    return filtered_result
 
 
 @app.route('/')
@@ -27,6 +379,7 @@ def transform():
     Transform endpoint that accepts a prompt and returns structured JSON
     """
     try:
+        rate_limiter.check(client_id(request.headers, request.remote_addr))
         data = request.get_json()
         
         if not data or 'prompt' not in data:
@@ -37,33 +390,43 @@ def transform():
         prompt = data['prompt']
         
         # Validate the prompt
-        is_valid, error_message = validate_prompt(prompt)
+        with StageTimer(g.timings, 'validation'):
+            is_valid, error_message = validate_prompt(prompt, app.config['MAX_PROMPT_LENGTH'])
         if not is_valid:
             return jsonify({
                 "error": error_message
             }), 400
+        PROMPT_LENGTH.observe(len(prompt))
+        g.prompt_length = len(prompt)
         
-        # Check cache first
-        cache_key = get_cache_key(prompt)
-        if cache_key in transformation_cache:
-            result = transformation_cache[cache_key]
-            result["cached"] = True
-            return jsonify(result)
+        # The ETag depends only on the prompt and rules, so a client's copy
+        # can be confirmed without touching the cache
+        cache_key = rules_cache_key(prompt)
+        etag = make_etag(cache_key)
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            g.cache_outcome = 'not_modified'
+            return Response(status=304, headers={'ETag': etag})
         
-        # Transform the prompt to JSON
-        result = transform_prompt_to_json(prompt)
-        result["cached"] = False
+        # Check cache first; hits are written from pre-serialized bytes
+        prepared = lookup_prepared(cache_key, g.timings)
+        if prepared is not None:
+            g.cache_outcome = 'hit'
+            body, headers = select_body(prepared, request.headers.get('Accept-Encoding'))
+            return Response(body, mimetype='application/json', headers=headers)
         
-        # Cache the result (limit cache size to prevent memory issues)
-        if len(transformation_cache) < 1000:
-            transformation_cache[cache_key] = result
+        g.cache_outcome = 'miss'
+        # Transform the prompt to JSON and cache it; the stored dict is never mutated
+        result = coalesced_transform(prompt, cache_key, g.timings, admit=True)
         
-        return jsonify(result)
+        response = timed_jsonify(dict(result, cached=False))
+        response.headers['ETag'] = etag
+        return response
         
+    except Overloaded as e:
+        body, status, headers = overloaded_payload(e)
+        return jsonify(body), status, headers
     except Exception as e:
-        return jsonify({
-            "error": f"Internal server error: {str(e)}"
-        }), 500
+        return jsonify(internal_error(e)), 500
 
 
 @app.route('/transform/custom', methods=['POST'])
@@ -72,6 +435,7 @@ def transform_custom():
     Transform endpoint with customization options
     """
     try:
+        rate_limiter.check(client_id(request.headers, request.remote_addr))
         data = request.get_json()
         
         if not data or 'prompt' not in data:
@@ -80,48 +444,529 @@ def transform_custom():
             }), 400
         
         prompt = data['prompt']
-        include_keys = data.get('include_keys', ['context', 'problem', 'expected_solution', 'output_format'])
+        include_keys = data.get('include_keys', DEFAULT_INCLUDE_KEYS)
         output_style = data.get('output_style', 'detailed')  # 'short' or 'detailed'
         
         # Validate the prompt
-        is_valid, error_message = validate_prompt(prompt)
+        with StageTimer(g.timings, 'validation'):
+            is_valid, error_message = validate_prompt(prompt, app.config['MAX_PROMPT_LENGTH'])
+            if is_valid:
+                is_valid, error_message = validate_output_options(include_keys, output_style)
         if not is_valid:
             return jsonify({
                 "error": error_message
             }), 400
+        PROMPT_LENGTH.observe(len(prompt))
+        g.prompt_length = len(prompt)
         
-        # Transform the prompt to JSON
-        result = transform_prompt_to_json(prompt)
+        filtered_result = transform_with_options(prompt, include_keys, output_style, g.timings, admit=True)
+        g.cache_outcome = 'hit' if filtered_result["cached"] else 'miss'
         
-        # Apply customization
-        if output_style == 'short':
-            if 'expected_solution' in result:
-                result['expected_solution'] = result['expected_solution'].split('.')[0] + '.'
+        return timed_jsonify(filtered_result)
         
-        # Filter keys based on user selection
-        filtered_result = {key: result[key] for key in include_keys if key in result}
-        filtered_result["cached"] = False
+    except Overloaded as e:
+        body, status, headers = overloaded_payload(e)
+        return jsonify(body), status, headers
+    except Exception as e:
+        return jsonify(internal_error(e)), 500
+
+
+@app.route('/transform/batch', methods=['POST'])
+def transform_batch():
+    """
+    Batch transform endpoint that accepts a list of prompts.
+    
+    Each item is either a prompt string or an object with 'prompt' and the
+    same 'include_keys'/'output_style' options as /transform/custom; top-level
+    options apply to items that don't set their own. Results are returned in
+    request order, and a failing item reports its own error without failing
+    the batch.
+    """
+    try:
+        rate_limiter.check(client_id(request.headers, request.remote_addr))
+        data = request.get_json()
+        trace = {}
+        # A batch holds a batch slot and one admission slot while it runs
+        with batch_admission.slot(), admission.slot():
+            payload, status = batch_payload(data, g.timings, trace)
+        g.prompt_length = trace.get('prompt_length')
+        g.cache_outcome = trace.get('cache_outcome')
+        return timed_jsonify(payload), status
+        
+    except Overloaded as e:
+        body, status, headers = overloaded_payload(e)
+        return jsonify(body), status, headers
+    except Exception as e:
+        return jsonify(internal_error(e)), 500
+
+
+def batch_payload(data, timings=None, trace=None):
+    """
+    Transform a /transform/batch request body.
+    
+    Shared by the Flask and ASGI apps. Distinct uncached prompts are
+    transformed once, with transform_many().
+    
+    Args:
+        data: Parsed JSON body
+        timings (dict, optional): Receives seconds spent per stage
+        trace (dict, optional): Receives 'prompt_length' (total of valid
+            prompts) and 'cache_outcome' for the request trace
+        
+    Returns:
+        tuple: (response payload, status)
+    """
+    trace = {} if trace is None else trace
+    if not isinstance(data, dict) or not isinstance(data.get('prompts'), list):
+        return {"error": "Missing 'prompts' list in request body"}, 400
+    
+    items = data['prompts']
+    if len(items) > app.config['BATCH_MAX_ITEMS']:
+        return {"error": f"Batch must contain at most {app.config['BATCH_MAX_ITEMS']} prompts"}, 400
+    
+    default_keys = data.get('include_keys', DEFAULT_INCLUDE_KEYS)
+    default_style = data.get('output_style', 'detailed')
+    
+    # One rule version for the whole batch, so every result matches its cache key
+    rules = get_rules()
+    results = [None] * len(items)
+    options = [None] * len(items)
+    pending = {}  # cache_key -> (prompt, [indices])
+    
+    for index, item in enumerate(items):
+        if isinstance(item, dict):
+            prompt = item.get('prompt')
+            include_keys = item.get('include_keys', default_keys)
+            output_style = item.get('output_style', default_style)
+        else:
+            prompt, include_keys, output_style = item, default_keys, default_style
+        
+        with StageTimer(timings, 'validation'):
+            is_valid, error_message = validate_prompt(prompt, app.config['MAX_PROMPT_LENGTH'])
+            if is_valid:
+                is_valid, error_message = validate_output_options(include_keys, output_style)
+        if not is_valid:
+            results[index] = {"error": error_message}
+            continue
+        PROMPT_LENGTH.observe(len(prompt))
+        trace['prompt_length'] = trace.get('prompt_length', 0) + len(prompt)
+        
+        options[index] = (include_keys, output_style)
+        
+        # Check cache first
+        cache_key = rules_cache_key(prompt, rules)
+        cached_result = lookup_cache(cache_key, timings)
+        if cached_result is not None:
+            result = apply_output_options(cached_result, include_keys, output_style)
+            result["cached"] = True
+            results[index] = result
+        elif cache_key in pending:
+            pending[cache_key][1].append(index)
+        else:
+            pending[cache_key] = (prompt, [index])
+    
+    # Transform each distinct uncached prompt once
+    cache_keys = list(pending)
+    with StageTimer(timings, 'batch_transform'):
+        outcomes = transform_many(
+            [pending[cache_key][0] for cache_key in cache_keys],
+            max_workers=app.config['BATCH_WORKERS'],
+            parallel_threshold=app.config['BATCH_PARALLEL_THRESHOLD'],
+            rules=rules
+        )
+    
+    for cache_key, (result, error) in zip(cache_keys, outcomes):
+        indices = pending[cache_key][1]
+        if error is not None:
+            for index in indices:
+                results[index] = {"error": f"Internal server error: {error}"}
+            continue
         
-        return jsonify(filtered_result)
+        transformation_cache.set(cache_key, result)
         
+        for index in indices:
+            include_keys, output_style = options[index]
+            item_result = apply_output_options(result, include_keys, output_style)
+            item_result["cached"] = False
+            results[index] = item_result
+    
+    error_count = sum(1 for result in results if "error" in result)
+    trace['cache_outcome'] = batch_cache_outcome(results)
+    return {
+        "results": results,
+        "count": len(results),
+        "errors": error_count
+    }, 200
+
+
+def batch_cache_outcome(results):
+    """'hit', 'miss' or 'partial' for a batch's successful items, None if all failed"""
+    cached = {result["cached"] for result in results if "error" not in result}
+    if not cached:
+        return None
+    if len(cached) > 1:
+        return 'partial'
+    return 'hit' if cached == {True} else 'miss'
+
+
+@app.route('/transform/stream', methods=['POST'])
+def transform_stream():
+    """
+    Streaming transform endpoint for newline-delimited JSON uploads.
+    
+    Each request line is a {"prompt": ...} record (optionally with
+    'include_keys'/'output_style'); each response line is the result for the
+    matching input line, or {"error": ..., "line": n}. Lines are read and
+    answered one at a time, so memory stays flat for any upload size.
+    """
+    try:
+        rate_limiter.check(client_id(request.headers, request.remote_addr))
+    except Overloaded as e:
+        body, status, headers = overloaded_payload(e)
+        return jsonify(body), status, headers
+    
+    max_line = app.config['STREAM_MAX_LINE_BYTES']
+    stream = request.stream
+    
+    def generate():
+        line_number = 0
+        while True:
+            line = stream.readline(max_line + 1)
+            if not line:
+                break
+            line_number += 1
+            
+            if len(line) > max_line and not line.endswith(b'\n'):
+                # Discard the rest of an oversized line without buffering it
+                while line and not line.endswith(b'\n'):
+                    line = stream.readline(max_line + 1)
+                yield _ndjson({"error": f"Line exceeds {max_line} bytes", "line": line_number})
+                continue
+            
+            if not line.strip():
+                continue
+            
+            # Each record needs an admission slot; the status line has been
+            # sent, so a refused record is answered on its own line
+            try:
+                with admission.slot():
+                    record = _transform_stream_record(line, line_number, log_stream_error)
+            except Overloaded as e:
+                record = overloaded_record(e, line_number)
+            yield _ndjson(record)
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+def overloaded_record(error, line_number):
+    """Count a refused /transform/stream record and return its error line"""
+    SHED.inc(reason=error.reason)
+    return {"error": str(error), "line": line_number}
+
+
+def log_stream_error(error, line_number):
+    """Log a failed /transform/stream record with the request context"""
+    log_request_error(dict(trace_context(), line=line_number), error)
+
+
+def _transform_stream_record(line, line_number, on_error=None):
+    """
+    Transform one NDJSON record, returning a result or an error object.
+    
+    ``on_error(error, line_number)`` is called for unexpected errors, from
+    the handling ``except`` block.
+    """
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return {"error": "Invalid JSON", "line": line_number}
+    
+    if not isinstance(record, dict) or 'prompt' not in record:
+        return {"error": "Missing 'prompt' field in record", "line": line_number}
+    
+    prompt = record['prompt']
+    include_keys = record.get('include_keys', DEFAULT_INCLUDE_KEYS)
+    output_style = record.get('output_style', 'detailed')
+    
+    is_valid, error_message = validate_prompt(prompt, app.config['MAX_PROMPT_LENGTH'])
+    if is_valid:
+        is_valid, error_message = validate_output_options(include_keys, output_style)
+    if not is_valid:
+        return {"error": error_message, "line": line_number}
+    
+    try:
+        return transform_with_options(prompt, include_keys, output_style)
     except Exception as e:
-        return jsonify({
-            "error": f"Internal server error: {str(e)}"
-        }), 500
+        if on_error is not None:
+            on_error(e, line_number)
+        return {"error": f"Internal server error: {str(e)}", "line": line_number}
+
+
+def _ndjson(obj):
+    """Serialize one NDJSON line"""
+    return json.dumps(obj, separators=(',', ':')) + '\n'
+
+
+def session_options(data):
+    """
+    Read the output options of a session request.
+
+    Returns:
+        tuple: (include_keys, output_style)
+
+    Raises:
+        ValueError: If the options are invalid
+    """
+    include_keys = data.get('include_keys', DEFAULT_INCLUDE_KEYS)
+    output_style = data.get('output_style', 'detailed')
+    is_valid, error_message = validate_output_options(include_keys, output_style)
+    if not is_valid:
+        raise ValueError(error_message)
+    return include_keys, output_style
+
+
+def session_payload(session_id, state, rules, include_keys, output_style, timings=None):
+    """
+    Build the response for a session's current revision.
+
+    The result is derived from the session's hits, never from the
+    transformation cache. While the text does not pass validate_prompt
+    (e.g. while it is still being typed), the result is null and "error"
+    says why.
+    """
+    payload = {"session": session_id, "revision": state.revision}
+    is_valid, error_message = validate_prompt(state.text, app.config['MAX_PROMPT_LENGTH'])
+    if not is_valid:
+        return dict(payload, result=None, error=error_message)
+    result = transform_hits(state.text, session_store.hits(state, rules), rules, timings)
+    return dict(payload, result=apply_output_options(result, include_keys, output_style))
+
+
+def open_session(data, timings=None):
+    """Open a session from a request body; returns (response payload, prompt length)"""
+    if not isinstance(data, dict) or 'prompt' not in data:
+        raise ValueError("Missing 'prompt' field in request body")
+    include_keys, output_style = session_options(data)
+    rules = get_rules()
+    with StageTimer(timings, 'scan'):
+        session_id, state = session_store.open(data['prompt'], rules)
+    return session_payload(session_id, state, rules, include_keys, output_style, timings), len(state.text)
+
+
+def edit_session(session_id, data, timings=None):
+    """Apply a request's edits to a session; returns (response payload, prompt length)"""
+    if not isinstance(data, dict) or 'revision' not in data or 'edits' not in data:
+        raise ValueError("Request body must contain 'revision' and 'edits'")
+    include_keys, output_style = session_options(data)
+    rules = get_rules()
+    with StageTimer(timings, 'scan'):
+        state = session_store.edit(session_id, data['revision'], data['edits'], rules)
+    return session_payload(session_id, state, rules, include_keys, output_style, timings), len(state.text)
+
+
+@app.route('/transform/session', methods=['POST'])
+@app.route('/transform/session/<session_id>', methods=['POST', 'DELETE'])
+def transform_session(session_id=None):
+    """
+    Incremental transformation for clients that re-analyze while the user types.
+    
+    POST /transform/session opens a session with {"prompt": ...}; POST to
+    /transform/session/<id> sends {"revision": n, "edits": [{"start", "end",
+    "text"}, ...]} made against revision n and gets revision n + 1. Both
+    accept 'include_keys'/'output_style' like /transform/custom. An unknown
+    or expired session is 404 and a stale revision 409: the client then
+    opens a new session with its full text. DELETE closes a session.
+    """
+    try:
+        if request.method == 'DELETE':
+            return jsonify({"closed": session_store.close(session_id)})
+        rate_limiter.check(client_id(request.headers, request.remote_addr))
+        data = request.get_json(silent=True)
+        if session_id is None:
+            payload, g.prompt_length = open_session(data, g.timings)
+        else:
+            payload, g.prompt_length = edit_session(session_id, data, g.timings)
+        return timed_jsonify(payload)
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except SessionError as e:
+        return jsonify({"error": str(e)}), e.status
+    except Overloaded as e:
+        body, status, headers = overloaded_payload(e)
+        return jsonify(body), status, headers
+    except Exception as e:
+        return jsonify(internal_error(e)), 500
 
 
 @app.route('/cache/clear', methods=['POST'])
 def clear_cache():
     """Clear the transformation cache"""
-    global transformation_cache
     transformation_cache.clear()
+    fingerprint_cache.clear()
+    if response_cache is not None:
+        response_cache.clear()
     return jsonify({"message": "Cache cleared successfully"})
 
 
+@app.route('/cache/stats')
+def cache_stats():
+    """Report cache occupancy and hit/miss/eviction counters"""
+    stats = transformation_cache.stats()
+    stats["fingerprint"] = fingerprint_cache.stats()
+    stats["single_flight"] = transform_flight.stats()
+    if response_cache is not None:
+        stats["responses"] = response_cache.stats()
+    if cache_snapshotter is not None:
+        stats["snapshot"] = cache_snapshotter.stats()
+    if disabled_cache_features:
+        stats["disabled"] = disabled_cache_features
+    stats["sessions"] = session_store.stats()
+    return jsonify(stats)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Publish metrics in Prometheus text format (all workers' totals when METRICS_MULTIPROC_DIR is set)"""
+    body = metrics.render() if metrics_store is None else metrics_store.render()
+    return Response(body, mimetype='text/plain; version=0.0.4')
+
+
+def admission_health():
+    """Saturation report for /health, so orchestrators can scale before requests are shed"""
+    stats = admission.stats()
+    stats["batch"] = batch_admission.stats()
+    stats["rate_limit"] = rate_limiter.stats()
+    return stats
+
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "prompt-to-json-enhancer"})
+    return jsonify({"status": "healthy", "service": "prompt-to-json-enhancer",
+                    "rules_version": get_rules().version, "admission": admission_health()})
+
+
+def admin_denied(authorization):
+    """
+    Check a request's Authorization header against ADMIN_TOKEN.
+
+    Args:
+        authorization (str or None): Request header value ("Bearer <token>")
+
+    Returns:
+        tuple or None: (error payload, status) when refused, None when allowed.
+                       Without a configured token the debug surface does not exist (404).
+    """
+    token = app.config['ADMIN_TOKEN']
+    if not token:
+        return {"error": "Not found"}, 404
+    scheme, _, supplied = (authorization or '').partition(' ')
+    if scheme.lower() != 'bearer' or not hmac.compare_digest(supplied.strip().encode(), token.encode()):
+        return {"error": "Admin token required"}, 401
+    return None
+
+
+def parse_profile_options(data):
+    """
+    Validate a /debug/profile request body.
+
+    Args:
+        data (dict): {"seconds": float, "requests": int, "interval_ms": float, "wait": bool}
+
+    Returns:
+        tuple: (seconds, max_requests or None, interval in seconds, wait)
+
+    Raises:
+        ValueError: If an option is out of range
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Request body must be a JSON object")
+    max_seconds = app.config['PROFILE_MAX_SECONDS']
+    seconds = data.get('seconds', min(10, max_seconds))
+    max_requests = data.get('requests')
+    interval_ms = data.get('interval_ms', 10)
+    wait = data.get('wait', False)
+
+    for name, value in (('seconds', seconds), ('interval_ms', interval_ms)):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f"'{name}' must be a number")
+    if not 0 < seconds <= max_seconds:
+        raise ValueError(f"'seconds' must be between 0 and {max_seconds}")
+    if not 1 <= interval_ms <= 1000:
+        raise ValueError("'interval_ms' must be between 1 and 1000")
+    if max_requests is not None and (isinstance(max_requests, bool) or not isinstance(max_requests, int)
+                                     or max_requests < 1):
+        raise ValueError("'requests' must be a positive integer")
+    if not isinstance(wait, bool):
+        raise ValueError("'wait' must be a boolean")
+    return seconds, max_requests, interval_ms / 1000, wait
+
+
+def profile_report(output_format):
+    """
+    Render the last profile of this worker.
+
+    Args:
+        output_format (str): 'collapsed' (flamegraph input) or 'json' (summary)
+
+    Returns:
+        tuple: (body: str, mimetype: str)
+
+    Raises:
+        ValueError: For an unknown format
+    """
+    if output_format == 'collapsed':
+        return profiler.collapsed(), 'text/plain'
+    if output_format == 'json':
+        return json.dumps(profiler.summary(), sort_keys=True, separators=(',', ':')) + '\n', 'application/json'
+    raise ValueError("'format' must be 'collapsed' or 'json'")
+
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def debug_profile():
+    """
+    Sample this worker's stacks for a window (POST) and fetch the result (GET).
+
+    POST starts a window of ``seconds`` that also ends after ``requests``
+    finished requests; with ``wait`` the call blocks and returns the stacks.
+    GET returns the last window as collapsed stacks (?format=json for a summary).
+    """
+    denied = admin_denied(request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    headers = {'X-Profile-Worker': str(os.getpid()), 'Cache-Control': 'no-store'}
+
+    if request.method == 'GET':
+        try:
+            body, mimetype = profile_report(request.args.get('format', 'collapsed'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return Response(body, mimetype=mimetype, headers=headers)
+
+    try:
+        seconds, max_requests, interval, wait = parse_profile_options(request.get_json(silent=True) or {})
+        profiler.start(seconds, max_requests, interval)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 409, headers
+
+    if not wait:
+        return jsonify(profiler.summary()), 202, headers
+    profiler.wait()
+    return Response(profiler.collapsed(), mimetype='text/plain', headers=headers)
+
+
+@app.route('/debug/shadow')
+def debug_shadow():
+    """Report shadow-mode outcomes, timings and recent divergences"""
+    denied = admin_denied(request.headers.get('Authorization'))
+    if denied:
+        return jsonify(denied[0]), denied[1]
+    if shadow is None:
+        return jsonify({"enabled": False})
+    return jsonify(dict(shadow.stats(), enabled=True))
 
 
 if __name__ == '__main__':
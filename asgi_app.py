@@ -0,0 +1,543 @@
+"""
+Prompt-to-JSON Enhancer ASGI app
+Async serving mode exposing the same routes and API contract as the Flask app
+
+Run with:
+    uvicorn asgi_app:app --port 5000
+    SERVER_MODE=asgi gunicorn -c gunicorn.conf.py
+"""
+
+import asyncio
+import contextlib
+import functools
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import render_template
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import HTMLResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+
+from app import (
+    app as flask_app, transformation_cache, response_cache, transform_flight, cache_snapshotter, metrics,
+    REQUEST_COUNT, REQUEST_LATENCY, STAGE_LATENCY, PROMPT_LENGTH, admission, batch_admission, rate_limiter,
+    lookup_cache, lookup_prepared, compute_and_cache, record_coalescing, rules_cache_key, client_id,
+    overloaded_payload, admission_health, profiler, admin_denied, parse_profile_options, profile_report, shadow,
+    session_store, open_session, edit_session, SLOW_LOG_ENDPOINTS, metrics_store, batch_payload,
+    _transform_stream_record, _ndjson, overloaded_record, disabled_cache_features
+)
+from utils import validate_prompt, transform_prompt_to_json
+from utils.admission import Overloaded
+from utils.cache import LRUCache
+from utils.customizer import DEFAULT_INCLUDE_KEYS, apply_output_options, validate_output_options
+from utils.metrics import StageTimer
+from utils.prompt_analyzer import fingerprint_cache
+from utils.responses import make_etag, etag_matches, serialize_json, select_body
+from utils.rules import get_rules, reload_rules_if_changed
+from utils.sessions import SessionError
+from utils.tracing import (EXPOSED_HEADERS, REQUEST_ID_HEADER, log_request_error, log_slow_request,
+                           request_context, request_id, server_timing)
+from utils.text_chunks import CHUNK_SIZE
+
+# CPU-bound transformations and blocking cache I/O run here, off the event loop
+executor = ThreadPoolExecutor(
+    max_workers=flask_app.config['ASGI_EXECUTOR_WORKERS'], thread_name_prefix='transform')
+
+# The in-memory cache is a dict lookup; the SQLite backend touches disk
+CACHE_IS_BLOCKING = not isinstance(transformation_cache, LRUCache)
+
+
+async def run_blocking(function, *args, **kwargs):
+    """Run a blocking call in the transform executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(function, *args, **kwargs))
+
+
+async def get_json(request, silent=False):
+    """
+    Parse the request body like Flask's request.get_json().
+
+    Raises the same werkzeug exceptions, so error responses match the Flask
+    app's; with ``silent``, returns None instead, like get_json(silent=True).
+    """
+    mimetype = request.headers.get('content-type', '').split(';')[0].strip().lower()
+    is_json = mimetype == 'application/json' or (
+        mimetype.startswith('application/') and mimetype.endswith('+json'))
+    if not is_json:
+        if silent:
+            return None
+        raise UnsupportedMediaType(
+            "Did not attempt to load JSON data because the request Content-Type was not 'application/json'.")
+
+    body = await request.body()
+    try:
+        return json.loads(body)
+    except ValueError:
+        if silent:
+            return None
+        raise BadRequest()
+
+
+def json_response(payload, status_code=200, timings=None):
+    """Serialize like Flask's jsonify(): sorted keys, compact, trailing newline"""
+    with StageTimer(timings, 'serialization'):
+        body = serialize_json(payload)
+    return Response(body, status_code=status_code, media_type='application/json')
+
+
+def trace_context(request, timings):
+    """Request ID, route, prompt length, cache outcome and stage timings of a request"""
+    state = request.state
+    return request_context(state.request_id, request.method, request.url.path, state.endpoint, timings,
+                           getattr(state, 'prompt_length', None), getattr(state, 'cache_outcome', None))
+
+
+def internal_error_response(request, timings, error):
+    """Log an unhandled error with its request context and answer 500, like app.internal_error"""
+    log_request_error(trace_context(request, timings), error)
+    return json_response({
+        "error": f"Internal server error: {str(error)}", "request_id": request.state.request_id
+    }, 500)
+
+
+def instrumented(endpoint):
+    """Record request metrics under the Flask endpoint name, pass timings in and pick up rule updates"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(request):
+            started = time.perf_counter()
+            timings = {}
+            request.state.endpoint = endpoint
+            request.state.request_id = request_id(request.headers.get(REQUEST_ID_HEADER))
+            reload_rules_if_changed()
+            if cache_snapshotter is not None:
+                cache_snapshotter.ensure_started()
+            if metrics_store is not None:
+                metrics_store.ensure_started()
+            response = await handler(request, timings)
+            elapsed = time.perf_counter() - started
+            REQUEST_COUNT.inc(endpoint=endpoint, status=str(response.status_code))
+            REQUEST_LATENCY.observe(elapsed, endpoint=endpoint)
+            for stage, seconds in timings.items():
+                STAGE_LATENCY.observe(seconds, stage=stage)
+            if profiler.running and endpoint != 'debug_profile':
+                profiler.request_finished()
+            response.headers[REQUEST_ID_HEADER] = request.state.request_id
+            response.headers['Server-Timing'] = server_timing(timings, elapsed)
+            if endpoint in SLOW_LOG_ENDPOINTS:
+                log_slow_request(trace_context(request, timings), response.status_code, elapsed,
+                                 flask_app.config['SLOW_REQUEST_THRESHOLD_MS'] / 1000)
+            return response
+        return wrapper
+    return decorator
+
+
+async def cached_lookup(cache_key, timings):
+    """lookup_cache(), moved off the event loop when the backend blocks"""
+    if CACHE_IS_BLOCKING:
+        return await run_blocking(lookup_cache, cache_key, timings)
+    return lookup_cache(cache_key, timings)
+
+
+async def prepared_lookup(cache_key, timings):
+    """lookup_prepared(), moved off the event loop when the backend blocks"""
+    if CACHE_IS_BLOCKING:
+        return await run_blocking(lookup_prepared, cache_key, timings)
+    return lookup_prepared(cache_key, timings)
+
+
+async def prompt_cache_key(prompt):
+    """rules_cache_key(), moved off the event loop for prompts longer than one chunk"""
+    if len(prompt) > CHUNK_SIZE:
+        return await run_blocking(rules_cache_key, prompt)
+    return rules_cache_key(prompt)
+
+
+async def admitted_compute_and_cache(prompt, cache_key, timings):
+    """compute_and_cache() in the executor, inside an admission slot"""
+    async with admission.slot_async():
+        return await run_blocking(compute_and_cache, prompt, cache_key, timings)
+
+
+def overloaded_response(error):
+    """429/503 with Retry-After for a refused request"""
+    body, status, headers = overloaded_payload(error)
+    response = json_response(body, status)
+    response.headers.update(headers)
+    return response
+
+
+async def coalesced_transform(prompt, cache_key, timings):
+    """Async counterpart of app.coalesced_transform(admit=True): one admitted computation per key in flight"""
+    started = time.perf_counter()
+    result, shared = await transform_flight.do_async(
+        cache_key, admitted_compute_and_cache, prompt, cache_key, timings)
+    record_coalescing(shared, started, timings)
+    return result
+
+
+@instrumented('transform')
+async def transform(request, timings):
+    """
+    Transform endpoint that accepts a prompt and returns structured JSON
+    """
+    try:
+        rate_limiter.check(client_id(request.headers, request.client.host if request.client else None))
+        data = await get_json(request)
+
+        if not data or 'prompt' not in data:
+            return json_response({
+                "error": "Missing 'prompt' field in request body"
+            }, 400)
+
+        prompt = data['prompt']
+
+        # Validate the prompt
+        with StageTimer(timings, 'validation'):
+            is_valid, error_message = validate_prompt(prompt, flask_app.config['MAX_PROMPT_LENGTH'])
+        if not is_valid:
+            return json_response({
+                "error": error_message
+            }, 400)
+        PROMPT_LENGTH.observe(len(prompt))
+        request.state.prompt_length = len(prompt)
+
+        # Same conditional and pre-serialized hit handling as the Flask app
+        cache_key = await prompt_cache_key(prompt)
+        etag = make_etag(cache_key)
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            request.state.cache_outcome = 'not_modified'
+            return Response(status_code=304, headers={'ETag': etag})
+
+        prepared = await prepared_lookup(cache_key, timings)
+        if prepared is not None:
+            request.state.cache_outcome = 'hit'
+            body, headers = select_body(prepared, request.headers.get('accept-encoding'))
+            return Response(body, media_type='application/json', headers=headers)
+
+        request.state.cache_outcome = 'miss'
+
+        # Transform and cache off the event loop
+        result = await coalesced_transform(prompt, cache_key, timings)
+
+        response = json_response(dict(result, cached=False), timings=timings)
+        response.headers['ETag'] = etag
+        return response
+
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return internal_error_response(request, timings, e)
+
+
+@instrumented('transform_custom')
+async def transform_custom(request, timings):
+    """
+    Transform endpoint with customization options
+    """
+    try:
+        rate_limiter.check(client_id(request.headers, request.client.host if request.client else None))
+        data = await get_json(request)
+
+        if not data or 'prompt' not in data:
+            return json_response({
+                "error": "Missing 'prompt' field in request body"
+            }, 400)
+
+        prompt = data['prompt']
+        include_keys = data.get('include_keys', DEFAULT_INCLUDE_KEYS)
+        output_style = data.get('output_style', 'detailed')  # 'short' or 'detailed'
+
+        # Validate the prompt
+        with StageTimer(timings, 'validation'):
+            is_valid, error_message = validate_prompt(prompt, flask_app.config['MAX_PROMPT_LENGTH'])
+            if is_valid:
+                is_valid, error_message = validate_output_options(include_keys, output_style)
+        if not is_valid:
+            return json_response({
+                "error": error_message
+            }, 400)
+        PROMPT_LENGTH.observe(len(prompt))
+        request.state.prompt_length = len(prompt)
+
+        # Same flow as app.transform_with_options, with the work awaited
+        cache_key = await prompt_cache_key(prompt)
+        cached_result = await cached_lookup(cache_key, timings)
+        if cached_result is not None:
+            result, cached = cached_result, True
+        elif set(include_keys) >= set(DEFAULT_INCLUDE_KEYS):
+            result, cached = await coalesced_transform(prompt, cache_key, timings), False
+        else:
+            async with admission.slot_async():
+                result = await run_blocking(transform_prompt_to_json, prompt, include_keys, timings=timings)
+            cached = False
+
+        request.state.cache_outcome = 'hit' if cached else 'miss'
+        filtered_result = apply_output_options(result, include_keys, output_style)
+        filtered_result["cached"] = cached
+
+        return json_response(filtered_result, timings=timings)
+
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return internal_error_response(request, timings, e)
+
+
+@instrumented('index')
+async def index(request, timings):
+    """Serve the main application page"""
+    # The template's url_for() needs a Flask request context
+    with flask_app.test_request_context(request.url.path):
+        return HTMLResponse(render_template('index.html'))
+
+
+@instrumented('transform_batch')
+async def transform_batch(request, timings):
+    """Batch transform endpoint; see app.transform_batch"""
+    try:
+        rate_limiter.check(client_id(request.headers, request.client.host if request.client else None))
+        data = await get_json(request)
+        trace = {}
+        async with batch_admission.slot_async(), admission.slot_async():
+            payload, status = await run_blocking(batch_payload, data, timings, trace)
+        request.state.prompt_length = trace.get('prompt_length')
+        request.state.cache_outcome = trace.get('cache_outcome')
+        return json_response(payload, status, timings=timings)
+
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return internal_error_response(request, timings, e)
+
+
+async def stream_lines(request, max_line):
+    """
+    Yield the body's lines like the Flask app's readline(max_line + 1) loop.
+
+    A line longer than ``max_line`` bytes (newline excluded) is skipped
+    without being buffered and reported as None.
+    """
+    buffer = bytearray()
+    scanned = 0  # buffer[:scanned] is known to hold no newline
+    discarding = False
+    async for chunk in request.stream():
+        buffer += chunk
+        start = 0
+        while True:
+            newline = buffer.find(b'\n', max(start, scanned))
+            if newline == -1:
+                if len(buffer) - start > max_line:
+                    if not discarding:
+                        yield None
+                        discarding = True
+                    start = len(buffer)
+                break
+            line_start, start = start, newline + 1
+            if discarding:
+                discarding = False
+            elif start - line_start > max_line + 1:
+                yield None
+            else:
+                yield bytes(buffer[line_start:start])
+        # Consumed lines are dropped once per chunk, not once per line
+        del buffer[:start]
+        scanned = len(buffer)
+    if buffer and not discarding:
+        yield bytes(buffer)
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for a generator that is still reading the request body.
+
+    StreamingResponse listens for the disconnect message on receive() while
+    it streams, which would swallow the body messages the generator waits
+    for; a disconnect still surfaces as ClientDisconnect from request.stream().
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+@instrumented('transform_stream')
+async def transform_stream(request, timings):
+    """Streaming NDJSON transform endpoint; see app.transform_stream"""
+    try:
+        rate_limiter.check(client_id(request.headers, request.client.host if request.client else None))
+    except Overloaded as e:
+        return overloaded_response(e)
+    max_line = flask_app.config['STREAM_MAX_LINE_BYTES']
+
+    def log_error(error, line_number):
+        log_request_error(dict(trace_context(request, timings), line=line_number), error)
+
+    async def generate():
+        line_number = 0
+        async for line in stream_lines(request, max_line):
+            line_number += 1
+            if line is None:
+                yield _ndjson({"error": f"Line exceeds {max_line} bytes", "line": line_number})
+            elif line.strip():
+                try:
+                    async with admission.slot_async():
+                        record = await run_blocking(_transform_stream_record, line, line_number, log_error)
+                except Overloaded as e:
+                    record = overloaded_record(e, line_number)
+                yield _ndjson(record)
+
+    return BodyStreamingResponse(generate(), media_type='application/x-ndjson')
+
+
+@instrumented('transform_session')
+async def transform_session(request, timings):
+    """Incremental transformation sessions; see app.transform_session"""
+    session_id = request.path_params.get('session_id')
+    try:
+        if request.method == 'DELETE':
+            return json_response({"closed": await run_blocking(session_store.close, session_id)})
+        rate_limiter.check(client_id(request.headers, request.client.host if request.client else None))
+        data = await get_json(request, silent=True)
+        if session_id is None:
+            payload, request.state.prompt_length = await run_blocking(open_session, data, timings)
+        else:
+            payload, request.state.prompt_length = await run_blocking(edit_session, session_id, data, timings)
+        return json_response(payload, timings=timings)
+
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    except SessionError as e:
+        return json_response({"error": str(e)}, e.status)
+    except Overloaded as e:
+        return overloaded_response(e)
+    except Exception as e:
+        return internal_error_response(request, timings, e)
+
+
+@instrumented('clear_cache')
+async def clear_cache(request, timings):
+    """Clear the transformation cache"""
+    await run_blocking(transformation_cache.clear)
+    fingerprint_cache.clear()
+    if response_cache is not None:
+        response_cache.clear()
+    return json_response({"message": "Cache cleared successfully"})
+
+
+@instrumented('cache_stats')
+async def cache_stats(request, timings):
+    """Report cache occupancy and hit/miss/eviction counters"""
+    stats = await run_blocking(transformation_cache.stats)
+    stats["fingerprint"] = fingerprint_cache.stats()
+    stats["single_flight"] = transform_flight.stats()
+    if response_cache is not None:
+        stats["responses"] = response_cache.stats()
+    if cache_snapshotter is not None:
+        stats["snapshot"] = cache_snapshotter.stats()
+    if disabled_cache_features:
+        stats["disabled"] = disabled_cache_features
+    stats["sessions"] = await run_blocking(session_store.stats)
+    return json_response(stats)
+
+
+@instrumented('metrics_endpoint')
+async def metrics_endpoint(request, timings):
+    """Publish metrics in Prometheus text format (all workers' totals when METRICS_MULTIPROC_DIR is set)"""
+    if metrics_store is None:
+        return Response(metrics.render(), media_type='text/plain; version=0.0.4')
+    body = await run_blocking(metrics_store.render)
+    return Response(body, media_type='text/plain; version=0.0.4')
+
+
+@instrumented('health')
+async def health(request, timings):
+    """Health check endpoint"""
+    return json_response({"status": "healthy", "service": "prompt-to-json-enhancer",
+                          "rules_version": get_rules().version, "admission": admission_health()})
+
+
+@instrumented('debug_profile')
+async def debug_profile(request, timings):
+    """Sample this worker's stacks for a window (POST) and fetch the result (GET)"""
+    denied = admin_denied(request.headers.get('authorization'))
+    if denied:
+        return json_response(*denied)
+    headers = {'X-Profile-Worker': str(os.getpid()), 'Cache-Control': 'no-store'}
+
+    if request.method == 'GET':
+        try:
+            body, media_type = profile_report(request.query_params.get('format', 'collapsed'))
+        except ValueError as e:
+            return json_response({"error": str(e)}, 400)
+        return Response(body, media_type=media_type, headers=headers)
+
+    try:
+        data = json.loads(await request.body() or b'{}')
+    except ValueError:
+        data = {}
+    try:
+        seconds, max_requests, interval, wait = parse_profile_options(data or {})
+        profiler.start(seconds, max_requests, interval)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+    except RuntimeError as e:
+        response = json_response({"error": str(e)}, 409)
+        response.headers.update(headers)
+        return response
+
+    if not wait:
+        response = json_response(profiler.summary(), 202)
+        response.headers.update(headers)
+        return response
+    await asyncio.to_thread(profiler.wait)
+    return Response(profiler.collapsed(), media_type='text/plain', headers=headers)
+
+
+@instrumented('debug_shadow')
+async def debug_shadow(request, timings):
+    """Report shadow-mode outcomes, timings and recent divergences"""
+    denied = admin_denied(request.headers.get('authorization'))
+    if denied:
+        return json_response(*denied)
+    if shadow is None:
+        return json_response({"enabled": False})
+    return json_response(dict(shadow.stats(), enabled=True))
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    yield
+    executor.shutdown(wait=True)
+    if cache_snapshotter is not None:
+        await asyncio.to_thread(cache_snapshotter.stop)
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Mount('/static', app=StaticFiles(directory=flask_app.static_folder), name='static'),
+        Route('/transform', transform, methods=['POST']),
+        Route('/transform/batch', transform_batch, methods=['POST']),
+        Route('/transform/stream', transform_stream, methods=['POST']),
+        Route('/transform/custom', transform_custom, methods=['POST']),
+        Route('/transform/session', transform_session, methods=['POST']),
+        Route('/transform/session/{session_id}', transform_session, methods=['POST', 'DELETE']),
+        Route('/cache/clear', clear_cache, methods=['POST']),
+        Route('/cache/stats', cache_stats),
+        Route('/metrics', metrics_endpoint),
+        Route('/health', health),
+        Route('/debug/profile', debug_profile, methods=['GET', 'POST']),
+        Route('/debug/shadow', debug_shadow),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                          expose_headers=list(EXPOSED_HEADERS))],
+    lifespan=lifespan
+)
@@ -0,0 +1,106 @@
+"""
+Memory accounting for the transformation cache
+
+Usage:
+    python -m benchmarks.cache_memory
+    python -m benchmarks.cache_memory --entries 5000 --length 250
+
+Fills an LRUCache with transformation results, storing full result dicts
+or compact results, and reports bytes per entry as estimated by the cache
+and as measured with tracemalloc (everything the cache keeps alive,
+including keys, LRU bookkeeping and the shared string table).
+
+Fresh results share their derived strings through the fingerprint cache;
+results loaded from JSON (a snapshot restore) each carry their own copies,
+which is where interning saves the most.
+"""
+
+import argparse
+import gc
+import json
+import sys
+import tracemalloc
+
+from utils import transform_prompt_to_json
+from utils.cache import LRUCache
+from utils.compact_results import ResultCodec
+from utils.prompt_analyzer import fingerprint_cache
+from benchmarks.corpus import generate_corpus
+
+
+def _request_bodies(count, length, seed):
+    """JSON request bodies for ``count`` distinct prompts of about ``length`` characters"""
+    corpus = generate_corpus(seed)
+    if length:
+        corpus = [prompt for prompt in corpus if abs(len(prompt) - length) <= max(10, length // 5)] or corpus
+    return [json.dumps({"prompt": f"{corpus[i % len(corpus)]} #{i}"}) for i in range(count)]
+
+
+def measure(bodies, codec=None, from_json=False):
+    """
+    Cache one result per request body and account for the memory it holds.
+
+    Prompts are parsed from the request bodies inside the measurement, as
+    the app does, so the problem text counts against the cache. With
+    from_json, each result is round-tripped through JSON before caching.
+
+    Returns:
+        dict: Entries, estimated and measured bytes per entry
+    """
+    fingerprint_cache.clear()
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    cache = LRUCache(max_entries=len(bodies), codec=codec)
+    for index, body in enumerate(bodies):
+        prompt = json.loads(body)["prompt"]
+        result = transform_prompt_to_json(prompt)
+        if from_json:
+            result = json.loads(json.dumps(result))
+        cache.set(f"{index:012x}:{index:032x}", result)
+    fingerprint_cache.clear()  # Keep only what the cache itself holds
+    gc.collect()
+
+    measured = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    stats = cache.stats()
+    return {
+        "entries": stats["entries"],
+        "estimated_bytes_per_entry": stats["bytes_per_entry"],
+        "measured_bytes_per_entry": round(measured / stats["entries"], 1),
+        "interned_strings": stats.get("interned", {}).get("strings", 0)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=2000, help="results to cache")
+    parser.add_argument('--length', type=int, default=0, help="approximate prompt length (0: whole corpus)")
+    parser.add_argument('--seed', type=int, default=0, help="corpus seed")
+    args = parser.parse_args(argv)
+
+    bodies = _request_bodies(args.entries, args.length, args.seed)
+    reports = {
+        "dict": measure(bodies),
+        "compact": measure(bodies, ResultCodec()),
+        "dict, from JSON": measure(bodies, from_json=True),
+        "compact, from JSON": measure(bodies, ResultCodec(), from_json=True),
+    }
+
+    width = max(len(name) for name in reports)
+    print(f"{'storage':<{width}}  {'entries':>8}  {'estimated B/entry':>18}  {'measured B/entry':>17}  {'strings':>8}")
+    for name, report in reports.items():
+        print(f"{name:<{width}}  {report['entries']:>8}  {report['estimated_bytes_per_entry']:>18.1f}"
+              f"  {report['measured_bytes_per_entry']:>17.1f}  {report['interned_strings']:>8}")
+
+    print()
+    for suffix in ("", ", from JSON"):
+        ratio = (reports["dict" + suffix]["measured_bytes_per_entry"]
+                 / reports["compact" + suffix]["measured_bytes_per_entry"])
+        print(f"Compact entries{suffix}: {ratio:.1f}x less memory (measured)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+"""
+Deterministic prompt corpus covering every detector branch
+
+Prompts combine an intent keyword, a language or special-case trigger and
+optional detail words, then are padded with neutral filler to a range of
+lengths up to the validator's 5000-character limit.
+"""
+
+import random
+
+from utils.rules import load_rules
+
+# The corpus is built from the shipped rule file so it stays stable across hot reloads
+RULES = load_rules()
+
+PROMPT_LENGTHS = (40, 250, 1000, 2500, 4999)
+
+# Filler avoids every rule keyword so padding does not change the outcome
+FILLER_WORDS = ["lorem", "nimbus", "dolor", "amet", "quux", "zeta", "kappa", "omega", "vivid", "glyph"]
+
+# Triggers for the framework/component special cases and each language
+TECH_TRIGGERS = {
+    "none": [],
+    "react": ["react"],
+    "vue": ["vue"],
+    "docker": ["docker"],
+    "docker_compose": ["docker", "compose"],
+    "api_rest": ["api", "rest"],
+    "api_graphql": ["graphql", "endpoint"],
+    "Python": ["python", "pandas"],
+    "JavaScript": ["javascript", "node"],
+    "SQL": ["sql", "query", "table"],
+    "Bash": ["bash", "shell", "grep"],
+    "R": [" r ", "rstudio", "ggplot"],
+    "Ruby": ["ruby", "rails"],
+    "HTML/CSS": ["html", "webpage", "responsive"],
+    "Java": ["jvm", "spring", "maven"]
+}
+
+# Words that switch on optional tech_details flags for each language
+DETAIL_TRIGGERS = {
+    "Python": ["csv", RULES.python_database_words[0], RULES.python_web_words[0], RULES.python_error_words[0]],
+    "SQL": [RULES.sql_join_words[0], RULES.sql_aggregation_words[0], RULES.sql_modification_words[0]],
+    "Bash": [RULES.bash_automation_words[0]],
+    "R": [RULES.r_data_words[0]],
+    "Ruby": ["sinatra"],
+    "JavaScript": ["vue"],
+}
+
+
+def _filler(rng, length):
+    words = []
+    size = 0
+    while size < length:
+        word = rng.choice(FILLER_WORDS)
+        words.append(word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def _pad(rng, core, length):
+    """Pad a core prompt to roughly ``length`` characters, never above 5000"""
+    if len(core) >= length:
+        return core[:5000]
+    filler = _filler(rng, length - len(core))
+    split = rng.randint(0, len(filler))
+    return (filler[:split] + " " + core + " " + filler[split:])[:max(length, len(core))].strip()
+
+
+def generate_corpus(seed=0, lengths=PROMPT_LENGTHS):
+    """
+    Build the benchmark corpus.
+
+    Args:
+        seed (int): Random seed; the same seed always yields the same corpus
+        lengths (tuple): Target prompt lengths to generate for each combination
+
+    Returns:
+        list: Prompt strings (original case, as a client would send them)
+    """
+    rng = random.Random(seed)
+    cores = []
+
+    for context_type, keywords in RULES.context_keywords.items():
+        for tech, triggers in TECH_TRIGGERS.items():
+            words = [rng.choice(keywords)] + triggers
+            cores.append(words)
+            # Same combination with detail flags, enhancements and multi-step markers
+            detailed = words + DETAIL_TRIGGERS.get(tech, [])
+            detailed += rng.sample(RULES.enhancement_words, 2)
+            detailed += [rng.choice(RULES.multi_step_indicators)] + rng.sample(RULES.operation_indicators, 2)
+            if rng.random() < 0.5:
+                detailed.append(rng.choice(RULES.sequence_indicators))
+            cores.append(detailed)
+
+    # Professional writing with each detail trigger
+    for keyword in RULES.professional_writing_words:
+        cores.append([keyword] + rng.sample(RULES.professional_detail_words, 2))
+
+    # Prompts that match nothing and fall back to the defaults
+    cores.append(["hello", "there"])
+
+    corpus = []
+    for words in cores:
+        core = " ".join(words).strip()
+        core = core[0].upper() + core[1:]
+        for length in lengths:
+            corpus.append(_pad(rng, core, length))
+    return corpus
+
+
+def corpus_coverage(corpus):
+    """
+    Summarize which outputs a corpus reaches.
+
+    Args:
+        corpus (list): Prompt strings
+
+    Returns:
+        dict: Sets of distinct contexts, output formats and tech-detail keys seen
+    """
+    from utils import detect_context, detect_language
+
+    contexts, formats, details = set(), set(), set()
+    for prompt in corpus:
+        prompt_lower = prompt.lower()
+        contexts.add(detect_context(prompt_lower))
+        output_format, tech_details = detect_language(prompt_lower)
+        formats.add(output_format)
+        details.update(tech_details)
+    return {"contexts": contexts, "output_formats": formats, "tech_details": details}
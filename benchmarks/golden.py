@@ -0,0 +1,356 @@
+"""
+Golden corpus for engine equivalence
+
+Usage:
+    python -m benchmarks.golden                      # check the current engine
+    python -m benchmarks.golden --engine batch       # check a candidate ('reference', 'batch', 'module:function')
+    python -m benchmarks.golden --coverage           # detector lines the corpus never reaches
+    python -m benchmarks.golden --write              # regenerate after an intended rule change
+
+benchmarks/golden.json freezes the ``context``, ``expected_solution`` and
+``output_format`` the current engine gives for a generated set of prompts
+under the shipped rules. Prompts are built from the rule tables so that
+every branch of detect_context, detect_language and build_expected_solution
+is taken: every keyword alone, context and language ties, exclude words,
+each special case with and without an explanation word, every tech-detail
+and professional-writing trigger, multi-step combinations, and seeded
+random keyword mixes with case changes and keywords embedded in other words.
+
+A candidate engine passes only when all three strings are identical for
+every prompt. The file keeps one case per line, so a rule change shows up
+as a readable diff.
+"""
+
+import argparse
+import inspect
+import itertools
+import json
+import os
+import random
+import sys
+import types
+
+from utils import context_detector, language_detector, solution_builder
+from utils.rules import load_rules
+from utils.shadow import diverging_keys, load_engine, reference_engine
+from benchmarks.corpus import generate_corpus
+
+DEFAULT_GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden.json')
+GOLDEN_FORMAT = 1
+RANDOM_MIXES = 1500
+
+# Neutral words between keywords; none of them contains a rule keyword
+SPACERS = ["please", "lorem", "quux", "zeta", "kappa"]
+
+
+def _join(rng, words):
+    """Join keywords with neutral words so adjacent keywords do not form new ones"""
+    parts = []
+    for word in words:
+        parts.append(word)
+        parts.append(rng.choice(SPACERS))
+    return " ".join(parts[:-1])
+
+
+def _first(words):
+    return sorted(words)[0]
+
+
+def golden_prompts(rules, seed=0):
+    """
+    Build the golden prompt set for a rule set.
+
+    Args:
+        rules (RuleSet): Rules whose tables drive the generation
+        seed (int): Random seed; the same seed always yields the same prompts
+
+    Returns:
+        list: Distinct prompt strings in generation order
+    """
+    rng = random.Random(seed)
+    prompts = []
+
+    def add(*words):
+        prompts.append(_join(rng, [word for word in words if word]))
+
+    contexts = list(rules.context_keywords)
+    languages = list(rules.language_patterns)
+    explanation = _first(rules.explanation_words)
+    api_word, api_action = _first(rules.api_words), _first(rules.api_action_words)
+    api_language = _first(rules.api_language_words)
+
+    # The benchmark corpus at its shortest length
+    prompts.extend(generate_corpus(seed, lengths=(40,)))
+
+    # Every keyword alone, inside a sentence, upper-cased and embedded in a longer word
+    for keyword in rules.matcher.patterns:
+        add(keyword)
+        prompts.append(f"Could you {keyword} for me?")
+        prompts.append(keyword.upper())
+        prompts.append(f"x{keyword.strip()}s")
+    prompts.append("hello there")
+    prompts.append("   ")
+
+    # Context ties and majorities, in both orders
+    for first, second in itertools.permutations(contexts, 2):
+        first_words, second_words = rules.context_keywords[first], rules.context_keywords[second]
+        add(first_words[0], second_words[0])
+        add(first_words[0], *second_words[:2])
+
+    # Language scoring: ties, majorities and exclude words
+    for first, second in itertools.permutations(languages, 2):
+        first_pattern, second_pattern = rules.language_patterns[first], rules.language_patterns[second]
+        add(first_pattern["keywords"][0], second_pattern["keywords"][0])
+        add(first_pattern["keywords"][0], *second_pattern["context_words"][:2])
+    for language, pattern in rules.language_patterns.items():
+        for exclude_word in pattern["exclude_words"]:
+            add(pattern["keywords"][0], exclude_word)
+            add(*pattern["keywords"][:2], *pattern["context_words"][:1], exclude_word)
+
+    # Special cases with and without an explanation word, and against each language
+    special_cases = [
+        ["react"], ["vue"], ["docker"], ["docker", "compose"],
+        [api_word, api_action], [api_word, api_action, "rest"], [api_word, api_action, "graphql"],
+        [api_word, api_action, api_language], [api_word], [api_action],
+    ]
+    for triggers in special_cases:
+        for language in [None] + languages:
+            language_words = rules.language_patterns[language]["keywords"][:2] if language else []
+            add(*triggers, *language_words)
+            add(explanation, *triggers, *language_words)
+
+    # Every tech-detail trigger for each language, alone and all together
+    detail_words = {
+        "Python": ["csv"] + list(rules.python_database_words) + list(rules.python_web_words)
+                  + list(rules.python_error_words),
+        "SQL": list(rules.sql_join_words) + list(rules.sql_aggregation_words) + list(rules.sql_modification_words),
+        "JavaScript": ["react", "vue", "node"],
+        "Bash": list(rules.bash_automation_words),
+        "R": list(rules.r_data_words),
+        "Ruby": ["rails", "sinatra"],
+        "HTML/CSS": ["html", "responsive"],
+        "Java": ["spring"],
+    }
+    for language, words in detail_words.items():
+        keywords = rules.language_patterns[language]["keywords"][:2]
+        for word in words:
+            add(*keywords, word)
+            add(explanation, *keywords, word)
+        add(*keywords, *words)
+
+    # Every base solution with each enhancement and professional-writing trigger
+    enhancements = ["error", "exception", "test", "documentation", "comment", "security", "performance"]
+    for context in contexts:
+        keyword = rules.context_keywords[context][0]
+        for word in enhancements:
+            add(keyword, word)
+        for writing in rules.professional_writing_words:
+            add(keyword, writing)
+            for detail in rules.professional_detail_words:
+                add(keyword, writing, detail)
+    for writing in rules.professional_writing_words:
+        add(writing, *rules.professional_detail_words)
+
+    # Multi-step: indicators with 0-3 operations, with and without sequence words and many details
+    operations = list(rules.operation_indicators)
+    for indicator in rules.multi_step_indicators:
+        for count in range(4):
+            chosen = rng.sample(operations, count)
+            add(indicator, *chosen)
+            add(indicator, *chosen, _first(rules.sequence_indicators))
+            add("python", "csv", "error", "test", "security", indicator, *chosen)
+    for sequence in rules.sequence_indicators:
+        add(sequence, *operations[:2])
+
+    # Seeded random mixes of any keywords
+    patterns = list(rules.matcher.patterns)
+    for _ in range(RANDOM_MIXES):
+        words = rng.sample(patterns, rng.randint(1, 7))
+        prompt = _join(rng, words)
+        if rng.random() < 0.3:
+            prompt = prompt.title()
+        prompts.append(prompt)
+
+    return list(dict.fromkeys(prompts))
+
+
+def build_golden(rules, engine, seed=0):
+    """
+    Record an engine's outputs for the golden prompts.
+
+    Returns:
+        dict: Golden document (rules version, string table, cases)
+    """
+    strings, index, cases = [], {}, []
+    for prompt in golden_prompts(rules, seed):
+        result = engine(prompt, rules)
+        case = [prompt]
+        for key in ("context", "expected_solution", "output_format"):
+            value = result[key]
+            if value not in index:
+                index[value] = len(strings)
+                strings.append(value)
+            case.append(index[value])
+        cases.append(case)
+    return {"format": GOLDEN_FORMAT, "rules_version": rules.version, "seed": seed,
+            "strings": strings, "cases": cases}
+
+
+def write_golden(document, path):
+    """Write a golden document with one string and one case per line"""
+    def lines(items):
+        return ",\n".join("    " + json.dumps(item, ensure_ascii=False) for item in items)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{\n')
+        for key in ("format", "rules_version", "seed"):
+            f.write(f'  "{key}": {json.dumps(document[key])},\n')
+        f.write(f'  "strings": [\n{lines(document["strings"])}\n  ],\n')
+        f.write(f'  "cases": [\n{lines(document["cases"])}\n  ]\n')
+        f.write('}\n')
+
+
+def load_golden(path=DEFAULT_GOLDEN):
+    """
+    Read a golden file.
+
+    Returns:
+        tuple: (rules_version, list of (prompt, expected result dict))
+    """
+    with open(path, encoding='utf-8') as f:
+        document = json.load(f)
+    if document.get("format") != GOLDEN_FORMAT:
+        raise ValueError("Unsupported golden file format")
+    strings = document["strings"]
+    cases = [
+        (prompt, {"context": strings[context], "expected_solution": strings[solution],
+                  "output_format": strings[output_format]})
+        for prompt, context, solution, output_format in document["cases"]
+    ]
+    return document["rules_version"], cases
+
+
+def check_engine(engine, rules, cases):
+    """
+    Run an engine over golden cases.
+
+    Returns:
+        list: (prompt, diverging keys, expected, actual) for every failing case
+    """
+    failures = []
+    for prompt, expected in cases:
+        actual = engine(prompt, rules)
+        keys = diverging_keys(expected, actual)
+        if keys:
+            failures.append((prompt, keys, expected, actual))
+    return failures
+
+
+def _executable_lines(module):
+    """Line numbers with bytecode in the module's functions, excluding def lines"""
+    lines = set()
+    pending = [value.__code__ for value in vars(module).values()
+               if isinstance(value, types.FunctionType) and value.__module__ == module.__name__]
+    while pending:
+        code = pending.pop()
+        lines.update(line for _, _, line in code.co_lines() if line and line != code.co_firstlineno)
+        pending.extend(const for const in code.co_consts if isinstance(const, types.CodeType))
+    return lines
+
+
+def detector_coverage(prompts):
+    """
+    Trace the detectors over prompts and report the lines never executed.
+
+    The detectors are called on the lowercased prompt, as the public
+    functions are, so their own scanning paths are traced too.
+
+    Returns:
+        dict: module -> (executed line count, total, sorted missed lines)
+    """
+    modules = (context_detector, language_detector, solution_builder)
+    files = {module.__file__: module for module in modules}
+    executed = {module.__file__: set() for module in modules}
+
+    def tracer(frame, event, arg):
+        lines = executed.get(frame.f_code.co_filename)
+        if lines is None:
+            return None
+
+        def local(frame, event, arg):
+            if event == 'line':
+                lines.add(frame.f_lineno)
+            return local
+        return local
+
+    sys.settrace(tracer)
+    try:
+        for prompt in prompts:
+            prompt_lower = prompt.lower()
+            context = context_detector.detect_context(prompt_lower)
+            _, tech_details = language_detector.detect_language(prompt_lower)
+            solution_builder.build_expected_solution(context, tech_details, prompt_lower)
+    finally:
+        sys.settrace(None)
+
+    report = {}
+    for filename, module in files.items():
+        lines = _executable_lines(module)
+        hit = executed[filename] & lines
+        report[module] = (len(hit), len(lines), sorted(lines - hit))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--golden', default=DEFAULT_GOLDEN, help="golden file path")
+    parser.add_argument('--engine', default='current',
+                        help="engine to check: 'current', 'reference', 'batch' or 'module:function'")
+    parser.add_argument('--write', action='store_true', help="regenerate the golden file with the reference engine")
+    parser.add_argument('--coverage', action='store_true', help="report detector lines the golden prompts miss")
+    parser.add_argument('--seed', type=int, default=0, help="generation seed (with --write)")
+    parser.add_argument('--show', type=int, default=5, help="failing cases to print")
+    args = parser.parse_args(argv)
+
+    rules = load_rules()
+
+    if args.write:
+        document = build_golden(rules, reference_engine, args.seed)
+        write_golden(document, args.golden)
+        print(f"Wrote {len(document['cases'])} cases ({len(document['strings'])} distinct strings) "
+              f"for rules {rules.version} to {args.golden}")
+        return 0
+
+    rules_version, cases = load_golden(args.golden)
+
+    if args.coverage:
+        # Missed lines are printed for review: some branches cannot be reached by any
+        # prompt (e.g. an elif shadowed by an earlier one), so they are not an error
+        for module, (hit, total, missed) in detector_coverage([prompt for prompt, _ in cases]).items():
+            print(f"{os.path.basename(module.__file__):<22} {hit}/{total} lines")
+            source = inspect.getsourcelines(module)[0]
+            for line in missed:
+                print(f"    missed {line}: {source[line - 1].strip()}")
+        return 0
+
+    if rules_version != rules.version:
+        print(f"Golden file was written for rules {rules_version}, shipped rules are {rules.version}; "
+              "regenerate it with --write if the rule change is intended")
+        return 1
+    try:
+        engine = load_engine(args.engine)
+    except ValueError as e:
+        print(e)
+        return 2
+
+    failures = check_engine(engine, rules, cases)
+    for prompt, keys, expected, actual in failures[:args.show]:
+        print(f"\n{prompt!r}")
+        for key in keys:
+            print(f"  {key}:\n    expected {expected.get(key)!r}\n    actual   {actual.get(key)!r}")
+    print(f"\n{args.engine}: {len(cases) - len(failures)}/{len(cases)} cases identical")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
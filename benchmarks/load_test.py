@@ -0,0 +1,347 @@
+"""
+HTTP load generator and replay harness for the transform endpoints
+
+Usage:
+    # Closed loop: 16 concurrent clients for 30 seconds against a running server
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --concurrency 16 --duration 30
+
+    # Open loop: Poisson arrivals at 200 req/s, 80% cache hits, replaying a capture
+    python -m benchmarks.load_test --corpus capture.jsonl --rate 200 --hit-ratio 0.8
+
+    # Mixed endpoints
+    python -m benchmarks.load_test --endpoint transform --endpoint custom --endpoint batch
+
+    # Start gunicorn with each worker setup in turn and compare them
+    python -m benchmarks.load_test --compare-workers sync:4 gthread:4x8 uvicorn:4 --rate 300
+
+Latency is measured from each request's scheduled send time, so in open-loop
+mode queueing inside the server (or the client pool) shows up in the tail
+instead of being hidden by coordinated omission.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+ENDPOINT_PATHS = {
+    "transform": "/transform",
+    "custom": "/transform/custom",
+    "batch": "/transform/batch",
+}
+
+
+def load_corpus(path=None, seed=0):
+    """
+    Load prompts to replay.
+
+    Accepts JSONL whose records are strings or objects with a 'prompt' field
+    (a 'body' field is used as a fallback, e.g. for requests.jsonl). Without a
+    path, the benchmark corpus is generated.
+
+    Returns:
+        list: Prompt strings
+    """
+    if path is None:
+        from benchmarks.corpus import generate_corpus
+        return generate_corpus(seed)
+
+    prompts = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                prompts.append(record)
+            elif isinstance(record, dict):
+                prompt = record.get('prompt') or record.get('body') or record.get('title')
+                if prompt:
+                    prompts.append(prompt[:5000])
+    return prompts
+
+
+class RequestMix:
+    """Produces request bodies with a target cache-hit ratio and endpoint mix"""
+
+    def __init__(self, prompts, endpoints, hit_ratio, batch_size, hot_set_size, seed):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.endpoints = endpoints
+        self.hit_ratio = hit_ratio
+        self.batch_size = batch_size
+        self.hot = prompts[:hot_set_size]
+        self.cold = prompts
+        self.counter = itertools.count()
+
+    def _prompt(self):
+        if self.rng.random() < self.hit_ratio:
+            return self.rng.choice(self.hot)
+        # A unique suffix guarantees a cache miss
+        return f"{self.rng.choice(self.cold)[:4980]} #{next(self.counter)}"
+
+    def next_request(self):
+        """Return (endpoint name, path, JSON body bytes)"""
+        with self.lock:
+            endpoint = self.rng.choice(self.endpoints)
+            if endpoint == "batch":
+                body = {"prompts": [self._prompt() for _ in range(self.batch_size)]}
+            elif endpoint == "custom":
+                body = {"prompt": self._prompt(),
+                        "include_keys": ["context", "output_format"],
+                        "output_style": self.rng.choice(["short", "detailed"])}
+            else:
+                body = {"prompt": self._prompt()}
+        return endpoint, ENDPOINT_PATHS[endpoint], json.dumps(body).encode()
+
+
+class Recorder:
+    """Collects per-request latencies and outcomes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = 0
+
+    def record(self, endpoint, latency, status):
+        with self.lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if not isinstance(status, int) or status >= 400:
+                self.errors += 1
+
+    def summary(self, elapsed):
+        def stats(values):
+            values = sorted(values)
+            if not values:
+                return {}
+
+            def pct(fraction):
+                return round(values[min(len(values) - 1, int(fraction * len(values)))] * 1000, 3)
+            return {"count": len(values), "p50_ms": pct(0.50), "p95_ms": pct(0.95),
+                    "p99_ms": pct(0.99), "max_ms": round(values[-1] * 1000, 3)}
+
+        with self.lock:
+            all_latencies = [value for values in self.latencies.values() for value in values]
+            total = len(all_latencies)
+            return {
+                "requests": total,
+                "elapsed_s": round(elapsed, 3),
+                "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+                "error_rate": round(self.errors / total, 4) if total else 0.0,
+                "statuses": {str(k): v for k, v in sorted(self.statuses.items(), key=str)},
+                "latency": stats(all_latencies),
+                "by_endpoint": {name: stats(values) for name, values in sorted(self.latencies.items())},
+            }
+
+
+class Client:
+    """Keep-alive HTTP client owned by one load thread"""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.conn = None
+
+    def post(self, path, body):
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self.conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+                response = self.conn.getresponse()
+                response.read()
+                if response.getheader("Connection", "").lower() == "close":
+                    self.conn.close()
+                    self.conn = None
+                return response.status
+            except (http.client.HTTPException, OSError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+
+def run_load(base_url, mix, concurrency, duration, total_requests, rate, timeout, seed=0):
+    """
+    Drive load against a server and return the summary.
+
+    Closed loop (rate None): each of ``concurrency`` threads sends back to back.
+    Open loop: a Poisson schedule at ``rate`` req/s is shared by the threads,
+    and latency counts from the scheduled send time.
+    """
+    recorder = Recorder()
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+    issued = itertools.count()
+    schedule_lock = threading.Lock()
+    schedule_rng = random.Random(seed)
+    next_send = [started]
+
+    def next_slot():
+        """Return the next scheduled send time, or None when the run is over"""
+        if total_requests is not None and next(issued) >= total_requests:
+            return None
+        if rate is None:
+            now = time.perf_counter()
+            return None if deadline and now >= deadline else now
+        with schedule_lock:
+            slot = next_send[0]
+            next_send[0] += schedule_rng.expovariate(rate)
+        return None if deadline and slot >= deadline else slot
+
+    def worker():
+        client = Client(base_url, timeout)
+        while True:
+            slot = next_slot()
+            if slot is None:
+                return
+            delay = slot - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            endpoint, path, body = mix.next_request()
+            try:
+                status = client.post(path, body)
+            except Exception as e:
+                status = type(e).__name__
+            recorder.record(endpoint, time.perf_counter() - slot, status)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.summary(time.perf_counter() - started)
+
+
+def warm_up(base_url, prompts, timeout):
+    """Send the hot set once so later requests for it are cache hits"""
+    client = Client(base_url, timeout)
+    for prompt in prompts:
+        try:
+            client.post("/transform", json.dumps({"prompt": prompt}).encode())
+        except Exception:
+            pass
+
+
+def wait_for_server(base_url, timeout=30):
+    parts = urlsplit(base_url)
+    end = time.time() + timeout
+    while time.time() < end:
+        try:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def parse_worker_spec(spec):
+    """Parse 'sync:4', 'gthread:4x8' or 'uvicorn:4' into (worker class, workers, threads)"""
+    worker_class, _, count = spec.partition(':')
+    workers, _, threads = (count or '1').partition('x')
+    return worker_class, int(workers), int(threads or 1)
+
+
+def start_gunicorn(spec, port, extra_env=None):
+    """
+    Launch gunicorn like the Dockerfile does, with the given worker setup.
+
+    The 'uvicorn' worker class serves the async app (asgi_app.py).
+    """
+    worker_class, workers, threads = parse_worker_spec(spec)
+    target = "app:app"
+    if worker_class == "uvicorn":
+        worker_class, target = "uvicorn.workers.UvicornWorker", "asgi_app:app"
+    command = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}",
+               "--workers", str(workers), "--worker-class", worker_class,
+               "--threads", str(threads), "--worker-connections", "1000",
+               "--timeout", "30", "--keep-alive", "2", "--preload", target]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, **(extra_env or {}))
+    return subprocess.Popen(command, cwd=root, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def print_summary(label, summary):
+    latency = summary["latency"]
+    print(f"{label}: {summary['requests']} requests in {summary['elapsed_s']}s, "
+          f"{summary['throughput_rps']} req/s, error rate {summary['error_rate']:.2%}")
+    if latency:
+        print(f"  latency ms  p50 {latency['p50_ms']}  p95 {latency['p95_ms']}  "
+              f"p99 {latency['p99_ms']}  max {latency['max_ms']}")
+    for endpoint, stats in summary["by_endpoint"].items():
+        print(f"  {endpoint:<10} n={stats['count']:<7} p50 {stats['p50_ms']}  p99 {stats['p99_ms']}  max {stats['max_ms']}")
+    print(f"  statuses {summary['statuses']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help="server base URL")
+    parser.add_argument('--corpus', help="JSONL prompts to replay (default: generated corpus)")
+    parser.add_argument('--endpoint', action='append', choices=sorted(ENDPOINT_PATHS),
+                        help="endpoint(s) to exercise; repeat to mix (default: transform)")
+    parser.add_argument('--concurrency', type=int, default=8, help="client threads / max in-flight requests")
+    parser.add_argument('--rate', type=float, help="open-loop arrival rate in req/s (default: closed loop)")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds to run")
+    parser.add_argument('--requests', type=int, help="stop after this many requests")
+    parser.add_argument('--hit-ratio', type=float, default=0.5, help="fraction of requests drawn from the hot set")
+    parser.add_argument('--hot-set', type=int, default=100, help="number of distinct hot prompts")
+    parser.add_argument('--batch-size', type=int, default=50, help="prompts per /transform/batch request")
+    parser.add_argument('--timeout', type=float, default=35.0, help="per-request timeout in seconds")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--compare-workers', nargs='+', metavar='CLASS:N[xT]',
+                        help="start gunicorn per worker setup (e.g. sync:4 gthread:4x8 uvicorn:4) and compare")
+    parser.add_argument('--port', type=int, default=5099, help="port for --compare-workers servers")
+    parser.add_argument('--json', help="write summaries to this JSON file")
+    args = parser.parse_args(argv)
+
+    prompts = load_corpus(args.corpus, args.seed)
+    endpoints = args.endpoint or ["transform"]
+
+    def one_run(base_url):
+        mix = RequestMix(prompts, endpoints, args.hit_ratio, args.batch_size, args.hot_set, args.seed)
+        warm_up(base_url, mix.hot, args.timeout)
+        return run_load(base_url, mix, args.concurrency, args.duration, args.requests,
+                        args.rate, args.timeout, args.seed)
+
+    summaries = {}
+    if args.compare_workers:
+        base_url = f"http://127.0.0.1:{args.port}"
+        for spec in args.compare_workers:
+            server = start_gunicorn(spec, args.port)
+            try:
+                if not wait_for_server(base_url):
+                    print(f"{spec}: server did not start", file=sys.stderr)
+                    continue
+                summaries[spec] = one_run(base_url)
+                print_summary(spec, summaries[spec])
+            finally:
+                os.killpg(server.pid, signal.SIGTERM)
+                server.wait()
+    else:
+        summaries[args.url] = one_run(args.url)
+        print_summary(args.url, summaries[args.url])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summaries, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Micro-benchmarks for the utils pipeline with regression gates
+
+Usage:
+    python -m benchmarks.run_benchmarks                      # run and compare to baseline
+    python -m benchmarks.run_benchmarks --save-baseline      # record a new baseline
+    python -m benchmarks.run_benchmarks --threshold 0.1 --output results.json
+
+Each benchmark times every call individually over the generated corpus and
+reports p50/p99/mean in microseconds. A run fails (exit code 1) when a
+benchmark's p50 or p99 exceeds the baseline by more than the threshold.
+
+Every measurement also times a fixed reference workload that does not use
+this repository's code, and the run keeps the fastest reference timing, like
+the benchmarks themselves. Baseline timings are scaled by how much faster or
+slower the reference ran, so the gate compares ratios rather than absolute
+times from another machine. A baseline recorded over a different corpus is
+refused (exit code 2); one from another Python or architecture only warns.
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+
+from utils import (
+    validate_prompt, get_cache_key, detect_context, detect_language,
+    build_expected_solution, transform_prompt_to_json
+)
+from utils.prompt_analyzer import fingerprint_cache
+from utils.batch_scorer import HAS_NUMPY, transform_batch
+from benchmarks.corpus import generate_corpus, PROMPT_LENGTHS
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+BATCH_SIZE = 64
+# Reference workload input: fixed text, independent of the corpus and the rules
+REFERENCE_TEXTS = tuple(
+    " ".join(f"Running Test{j} of Module{(i * j) % 17} while loading data" for j in range(i % 7 + 3))
+    for i in range(40))
+REFERENCE_PATTERN = re.compile(r"\b(\w+)ing\b")
+# Meta fields that change what is measured, and ones that only change the machine
+WORKLOAD_META = ("corpus_size", "seed")
+ENVIRONMENT_META = ("python", "implementation", "machine")
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _reference():
+    """Fixed string, regex, dict and sort work that baselines are scaled by"""
+    counts = {}
+    for text in REFERENCE_TEXTS:
+        text = text.lower()
+        for word in text.split():
+            counts[word] = counts.get(word, 0) + 1
+        REFERENCE_PATTERN.findall(text)
+    return sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+def _reference_p50(calls=20):
+    """p50 of the reference workload in nanoseconds"""
+    perf_counter_ns = time.perf_counter_ns
+    samples = []
+    for _ in range(calls):
+        started = perf_counter_ns()
+        _reference()
+        samples.append(perf_counter_ns() - started)
+    samples.sort()
+    return _percentile(samples, 0.50)
+
+
+def _time_calls(function, inputs, rounds, repeat, before_call=None):
+    """
+    Time each call of ``function(*args)`` for every args tuple in inputs.
+
+    The measurement is repeated ``repeat`` times and the lowest value of each
+    statistic is kept, which filters out interference from other processes.
+    ``reference_us`` is the reference workload's p50, timed before and after
+    each measurement.
+    """
+    # One untimed pass warms caches and the regex engine
+    for args in inputs:
+        if before_call:
+            before_call()
+        function(*args)
+
+    best = None
+    perf_counter_ns = time.perf_counter_ns
+    for _ in range(repeat):
+        reference = _reference_p50()
+        samples = []
+        for _ in range(rounds):
+            for args in inputs:
+                if before_call:
+                    before_call()
+                started = perf_counter_ns()
+                function(*args)
+                samples.append(perf_counter_ns() - started)
+
+        reference = min(reference, _reference_p50())
+        samples.sort()
+        stats = {
+            "p50_us": round(_percentile(samples, 0.50) / 1000, 3),
+            "p99_us": round(_percentile(samples, 0.99) / 1000, 3),
+            "mean_us": round(sum(samples) / len(samples) / 1000, 3),
+            "samples": len(samples),
+            "reference_us": round(reference / 1000, 3)
+        }
+        best = stats if best is None else {key: min(best[key], value) for key, value in stats.items()}
+    return best
+
+
+def check_meta(meta, baseline_meta):
+    """
+    Check that a baseline was recorded under comparable conditions.
+
+    Returns:
+        tuple: (problems that make the comparison meaningless,
+            differences that only make it less reliable)
+    """
+    errors = [f"{key} {baseline_meta.get(key)!r} != {meta[key]!r}"
+              for key in WORKLOAD_META if baseline_meta.get(key) != meta[key]]
+    warnings = [f"{key} {baseline_meta.get(key)!r} != {meta[key]!r}"
+                for key in ENVIRONMENT_META if baseline_meta.get(key) != meta[key]]
+    return errors, warnings
+
+
+def _validate_and_key(prompt):
+    if validate_prompt(prompt)[0]:
+        get_cache_key(prompt)
+
+
+def run_benchmarks(rounds=2, repeat=3, seed=0):
+    """
+    Run every benchmark over the generated corpus.
+
+    Args:
+        rounds (int): Timed passes over the corpus per measurement
+        repeat (int): Independent measurements per benchmark (best is kept)
+        seed (int): Corpus seed
+
+    Returns:
+        dict: Benchmark name -> statistics
+    """
+    corpus = generate_corpus(seed)
+    lowered = [(prompt.lower(),) for prompt in corpus]
+    solution_inputs = []
+    for (prompt_lower,) in lowered:
+        output_format, tech_details = detect_language(prompt_lower)
+        solution_inputs.append((detect_context(prompt_lower), tech_details, prompt_lower))
+
+    results = {
+        "detect_context": _time_calls(detect_context, lowered, rounds, repeat),
+        "detect_language": _time_calls(detect_language, lowered, rounds, repeat),
+        "build_expected_solution": _time_calls(build_expected_solution, solution_inputs, rounds, repeat),
+        "validate_prompt+get_cache_key": _time_calls(_validate_and_key, [(p,) for p in corpus], rounds, repeat),
+        # Cold: fingerprint memo cleared before every call, so the full rule engine runs
+        "transform_prompt_to_json[cold]": _time_calls(
+            transform_prompt_to_json, [(p,) for p in corpus], rounds, repeat, before_call=fingerprint_cache.clear),
+        "transform_prompt_to_json[warm]": _time_calls(
+            transform_prompt_to_json, [(p,) for p in corpus], rounds, repeat),
+    }
+
+    # Vectorized batch path against the per-prompt loop, both timed per batch of BATCH_SIZE prompts
+    batches = [(corpus[i:i + BATCH_SIZE],) for i in range(0, len(corpus), BATCH_SIZE)]
+    results[f"transform_loop[cold,{BATCH_SIZE}]"] = _time_calls(
+        _transform_each, batches, rounds, repeat, before_call=fingerprint_cache.clear)
+    if HAS_NUMPY:
+        results[f"transform_batch[cold,{BATCH_SIZE}]"] = _time_calls(
+            transform_batch, batches, rounds, repeat, before_call=fingerprint_cache.clear)
+
+    # End-to-end cost by prompt length
+    for length in PROMPT_LENGTHS:
+        subset = [(p,) for p in corpus if abs(len(p) - length) <= max(10, length // 20)]
+        if subset:
+            results[f"transform_prompt_to_json[cold,len~{length}]"] = _time_calls(
+                transform_prompt_to_json, subset, rounds, repeat, before_call=fingerprint_cache.clear)
+
+    return results, len(corpus)
+
+
+def _transform_each(prompts):
+    return [transform_prompt_to_json(prompt) for prompt in prompts]
+
+
+def reference_timing(results):
+    """
+    Return the run's reference timing: the fastest one taken by any benchmark.
+
+    Returns:
+        float: Reference workload p50 in microseconds
+    """
+    return min(stats["reference_us"] for stats in results.values())
+
+
+def compare(results, baseline, threshold, p99_threshold, scale=1.0):
+    """
+    Compare results against a baseline.
+
+    Args:
+        scale (float): Factor applied to baseline timings first: this run's
+            reference timing over the baseline's
+
+    Returns:
+        list: (name, metric, scaled baseline value, current value, ratio) for each regression
+    """
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric, limit in (("p50_us", threshold), ("p99_us", p99_threshold)):
+            expected = base[metric] * scale
+            if expected > 0 and stats[metric] > expected * (1 + limit):
+                regressions.append((name, metric, expected, stats[metric], stats[metric] / expected))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=2, help="timed passes over the corpus per measurement")
+    parser.add_argument('--repeat', type=int, default=3, help="measurements per benchmark; the best is kept")
+    parser.add_argument('--seed', type=int, default=0, help="corpus seed")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument('--save-baseline', action='store_true', help="write results as the new baseline")
+    parser.add_argument('--output', help="also write results JSON to this file")
+    parser.add_argument('--threshold', type=float, default=0.25, help="allowed p50 slowdown (0.25 = 25%%)")
+    parser.add_argument('--p99-threshold', type=float, default=0.5, help="allowed p99 slowdown")
+    args = parser.parse_args(argv)
+
+    results, corpus_size = run_benchmarks(args.rounds, args.repeat, args.seed)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "corpus_size": corpus_size,
+            "rounds": args.rounds,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "reference_us": reference_timing(results),
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        },
+        "results": results
+    }
+
+    width = max(len(name) for name in results)
+    print(f"{'benchmark':<{width}}  {'p50 us':>10}  {'p99 us':>10}  {'mean us':>10}")
+    for name, stats in results.items():
+        print(f"{name:<{width}}  {stats['p50_us']:>10.2f}  {stats['p99_us']:>10.2f}  {stats['mean_us']:>10.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    errors, warnings = check_meta(report["meta"], baseline.get("meta", {}))
+    if errors:
+        print(f"\nBaseline {args.baseline} measured a different workload ({'; '.join(errors)}); "
+              "run with matching options or record a new baseline")
+        return 2
+    if warnings:
+        print(f"\nWarning: baseline recorded in another environment ({'; '.join(warnings)})")
+
+    baseline_reference = baseline.get("meta", {}).get("reference_us")
+    scale = 1.0
+    if baseline_reference:
+        scale = report["meta"]["reference_us"] / baseline_reference
+        print(f"\nReference workload: {baseline_reference:.2f} -> {report['meta']['reference_us']:.2f} us; "
+              f"baseline timings scaled by {scale:.2f}")
+    else:
+        print("\nWarning: baseline has no reference timing; comparing absolute timings")
+
+    regressions = compare(results, baseline["results"], args.threshold, args.p99_threshold, scale)
+    if regressions:
+        print("\nRegressions against baseline:")
+        for name, metric, base, current, ratio in regressions:
+            print(f"  {name} {metric}: {base:.2f} -> {current:.2f} us ({ratio:.2f}x)")
+        return 1
+
+    print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,363 @@
+"""
+Offline bulk transformation for large JSONL or CSV files
+Runs transform_prompt_to_json across all cores without starting Flask
+
+Usage:
+    python bulk_transform.py prompts.jsonl -o results.jsonl
+    python bulk_transform.py prompts.csv -o results.jsonl --column prompt --unordered
+    python bulk_transform.py prompts.jsonl -o results.jsonl --checkpoint run.ckpt
+    python bulk_transform.py prompts.jsonl -o results.jsonl --rules my_rules.json
+"""
+
+import argparse
+import csv
+import io
+import json
+import mmap
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from utils import validate_prompt
+from utils.batch import transform_many
+from utils.validators import MAX_PROMPT_LENGTH
+from utils.customizer import DEFAULT_INCLUDE_KEYS, apply_output_options, validate_output_options
+from utils.rules import DEFAULT_RULES_PATH, load_rules, use_rules
+
+
+def plan_shards(path, shard_size, data_start=0):
+    """
+    Split a file into byte ranges that start and end on line boundaries.
+
+    The split depends only on the file contents and shard_size, so a resumed
+    run sees the same shards as the original one.
+
+    Args:
+        path (str): Input file
+        shard_size (int): Target bytes per shard
+        data_start (int): Offset of the first data line (after a CSV header)
+
+    Returns:
+        list: (start, end) byte ranges covering [data_start, file size)
+    """
+    size = os.path.getsize(path)
+    if size <= data_start:
+        return []
+
+    shards = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = data_start
+        while start < size:
+            end = data.find(b'\n', min(start + shard_size, size) - 1)
+            end = size if end == -1 else end + 1
+            shards.append((start, end))
+            start = end
+    return shards
+
+
+def read_csv_header(path):
+    """
+    Return (column names, offset of the first data line) for a CSV file.
+
+    Shards are split on newlines, so CSV records must not contain embedded
+    line breaks.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+    columns = next(csv.reader([header.decode('utf-8-sig')]), [])
+    return columns, len(header)
+
+
+def _parse_records(lines, input_format, csv_columns, prompt_column):
+    """Yield (prompt, include_keys, output_style) or an error string per line"""
+    if input_format == 'csv':
+        for row in csv.reader(io.StringIO(lines)):
+            if not row:
+                yield None
+                continue
+            record = dict(zip(csv_columns, row))
+            if prompt_column not in record:
+                yield f"Missing '{prompt_column}' column"
+            else:
+                yield record[prompt_column], DEFAULT_INCLUDE_KEYS, 'detailed'
+        return
+
+    # Shards are cut on b'\n' only: str.splitlines() would also split on
+    # U+2028, U+0085 and other separators that may appear raw inside JSON strings
+    for line in lines.split('\n'):
+        line = line[:-1] if line.endswith('\r') else line
+        if not line.strip():
+            yield None
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield "Invalid JSON"
+            continue
+        if isinstance(record, str):
+            yield record, DEFAULT_INCLUDE_KEYS, 'detailed'
+        elif isinstance(record, dict) and 'prompt' in record:
+            yield (record['prompt'],
+                   record.get('include_keys', DEFAULT_INCLUDE_KEYS),
+                   record.get('output_style', 'detailed'))
+        else:
+            yield "Missing 'prompt' field in record"
+
+
+def process_shard(path, start, end, input_format='jsonl', csv_columns=None,
+                  prompt_column='prompt', include_offsets=False, max_length=MAX_PROMPT_LENGTH):
+    """
+    Transform every record in one byte range of the input file.
+
+    Runs in a pool process; the file is memory-mapped so only the shard's
+    pages are read. Valid records are transformed together with
+    transform_many(), which scores them in one vectorized pass when NumPy
+    is installed.
+
+    Returns:
+        tuple: (start, end, output bytes, record count, error count)
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        lines = data[start:end].decode('utf-8', errors='replace')
+
+    # Validate every record first, then transform the valid ones as one batch
+    rows = []
+    prompts = []
+    for index, parsed in enumerate(_parse_records(lines, input_format, csv_columns, prompt_column)):
+        if parsed is None:
+            continue
+
+        if isinstance(parsed, str):
+            rows.append((index, {"error": parsed}, None))
+            continue
+        prompt, include_keys, output_style = parsed
+        is_valid, error_message = validate_prompt(prompt, max_length)
+        if is_valid:
+            is_valid, error_message = validate_output_options(include_keys, output_style)
+        if not is_valid:
+            rows.append((index, {"error": error_message}, None))
+        else:
+            rows.append((index, None, (len(prompts), include_keys, output_style)))
+            prompts.append(prompt)
+
+    outcomes = transform_many(prompts)
+
+    out = []
+    records = errors = 0
+    for index, result, pending in rows:
+        records += 1
+        if pending is not None:
+            position, include_keys, output_style = pending
+            transformed, error = outcomes[position]
+            if error is not None:
+                result = {"error": error}
+            else:
+                try:
+                    result = apply_output_options(transformed, include_keys, output_style)
+                except Exception as e:
+                    result = {"error": str(e)}
+
+        if "error" in result:
+            errors += 1
+        if include_offsets or "error" in result:
+            result["shard_offset"] = start
+            result["record"] = index
+        out.append(json.dumps(result, separators=(',', ':')))
+
+    body = ('\n'.join(out) + '\n').encode() if out else b''
+    return start, end, body, records, errors
+
+
+class Checkpoint:
+    """
+    Tracks completed shards on disk so an interrupted run can resume.
+
+    The output length after each marked shard is saved too: a run that
+    stopped after writing a shard but before marking it left bytes that
+    resume() truncates, so the shard is not written twice.
+    """
+
+    def __init__(self, path, input_path, shard_size):
+        self.path = path
+        self.identity = {
+            "input": os.path.abspath(input_path),
+            "size": os.path.getsize(input_path),
+            "mtime": os.path.getmtime(input_path),
+            "shard_size": shard_size
+        }
+        self.completed = set()
+        self.output_bytes = 0
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("identity") != self.identity:
+                raise SystemExit(f"Checkpoint {path} belongs to a different input or shard size")
+            self.completed = {tuple(shard) for shard in saved.get("completed", [])}
+            # Checkpoints from before output lengths were recorded resume at the end
+            self.output_bytes = saved.get("output_bytes")
+
+    def resume(self, output_path):
+        """
+        Open the output for a resumed run, cut back to the last marked shard.
+
+        Raises:
+            SystemExit: If the output is shorter than the checkpoint records
+        """
+        size = os.path.getsize(output_path) if os.path.exists(output_path) else 0
+        if self.output_bytes is None:
+            self.output_bytes = size
+        if size < self.output_bytes:
+            raise SystemExit(f"Output {output_path} is shorter than checkpoint {self.path} records")
+        output = open(output_path, 'r+b')
+        output.truncate(self.output_bytes)
+        output.seek(self.output_bytes)
+        return output
+
+    def mark(self, shard, nbytes):
+        """Record a shard whose ``nbytes`` of output are written, and persist atomically"""
+        self.completed.add(shard)
+        self.output_bytes += nbytes
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({"identity": self.identity, "completed": sorted(self.completed),
+                       "output_bytes": self.output_bytes}, f)
+        os.replace(tmp_path, self.path)
+
+
+class ThroughputReporter:
+    """Prints progress and throughput to stderr at a fixed interval"""
+
+    def __init__(self, total_bytes, interval):
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.records = self.errors = self.bytes = 0
+
+    def add(self, records, errors, nbytes):
+        self.records += records
+        self.errors += errors
+        self.bytes += nbytes
+        now = time.monotonic()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self.report()
+
+    def report(self, final=False):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        percent = 100.0 * self.bytes / self.total_bytes if self.total_bytes else 100.0
+        print(f"{'done' if final else 'progress'}: {self.records} records "
+              f"({self.errors} errors), {percent:.1f}% of input, "
+              f"{self.records / elapsed:,.0f} records/s, "
+              f"{self.bytes / elapsed / 1e6:.1f} MB/s, {elapsed:.1f}s elapsed",
+              file=sys.stderr, flush=True)
+
+
+def run(args):
+    """Plan shards, fan them out to the pool and write results"""
+    input_format = args.format or ('csv' if args.input.lower().endswith('.csv') else 'jsonl')
+    csv_columns, data_start = (read_csv_header(args.input) if input_format == 'csv' else (None, 0))
+
+    shards = plan_shards(args.input, args.shard_size, data_start)
+    checkpoint = Checkpoint(args.checkpoint, args.input, args.shard_size)
+    pending = [shard for shard in shards if shard not in checkpoint.completed]
+
+    # Resuming continues the existing output after its last marked shard; a fresh run truncates it
+    if args.output == '-':
+        output = sys.stdout.buffer
+    elif checkpoint.completed:
+        output = checkpoint.resume(args.output)
+    else:
+        output = open(args.output, 'wb')
+    reporter = ThroughputReporter(sum(end - start for start, end in pending), args.report_interval)
+
+    if len(pending) < len(shards):
+        print(f"resuming: {len(shards) - len(pending)} of {len(shards)} shards already done",
+              file=sys.stderr, flush=True)
+
+    def write(start, end, body, records, errors):
+        output.write(body)
+        output.flush()
+        checkpoint.mark((start, end), len(body))
+        reporter.add(records, errors, end - start)
+
+    options = dict(input_format=input_format, csv_columns=csv_columns,
+                   prompt_column=args.column, include_offsets=args.unordered,
+                   max_length=args.max_length)
+
+    try:
+        # Every pool process applies the same rules for the whole run (no hot reload)
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=use_rules,
+                                 initargs=(args.rules, 0)) as executor:
+            # Keep a bounded window of shards in flight so memory stays flat
+            window = args.workers * 2
+            queue = iter(pending)
+            in_flight = {}
+            next_index = 0
+            ready = {}
+            order = {shard: index for index, shard in enumerate(pending)}
+
+            def submit_next():
+                shard = next(queue, None)
+                if shard is not None:
+                    in_flight[executor.submit(process_shard, args.input, *shard, **options)] = shard
+
+            for _ in range(window):
+                submit_next()
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    del in_flight[future]
+                    start, end, body, records, errors = future.result()
+                    if args.unordered:
+                        write(start, end, body, records, errors)
+                    else:
+                        # Hold out-of-order shards until their predecessors finish
+                        ready[order[(start, end)]] = (start, end, body, records, errors)
+                        while next_index in ready:
+                            write(*ready.pop(next_index))
+                            next_index += 1
+                    submit_next()
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+
+    reporter.report(final=True)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help="JSONL file of {\"prompt\": ...} records, or a CSV file")
+    parser.add_argument('-o', '--output', default='-', help="output JSONL file (default: stdout)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="input format (default: by extension)")
+    parser.add_argument('--column', default='prompt', help="CSV column holding the prompt")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument('--shard-size', type=int, default=4 * 1024 * 1024, help="target bytes per shard")
+    parser.add_argument('--unordered', action='store_true',
+                        help="write shards as they finish; records carry shard_offset/record")
+    parser.add_argument('--checkpoint', help="file recording completed shards, used to resume")
+    parser.add_argument('--report-interval', type=float, default=5.0, help="seconds between progress lines")
+    parser.add_argument('--rules', default=DEFAULT_RULES_PATH, help="JSON rule file")
+    parser.add_argument('--max-length', type=int, default=MAX_PROMPT_LENGTH, help="longest accepted prompt in characters")
+    args = parser.parse_args(argv)
+
+    if args.checkpoint and args.output == '-':
+        parser.error("--checkpoint requires --output")
+
+    # Fail fast on a bad rule file instead of in every pool process
+    try:
+        print(f"rules {load_rules(args.rules).version} from {args.rules}", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        parser.error(f"invalid rule file {args.rules}: {e}")
+
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
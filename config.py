@@ -0,0 +1,118 @@
+"""
+Configuration for the Prompt-to-JSON Enhancer
+Values are read from environment variables with production-safe defaults
+"""
+
+import os
+import tempfile
+
+
+def _env_int(name, default):
+    """Read an integer setting from the environment"""
+    return int(os.environ.get(name, default))
+
+
+def _env_float(name, default):
+    """Read a float setting from the environment"""
+    return float(os.environ.get(name, default))
+
+
+class Config:
+    """Application settings loaded into Flask's app.config"""
+
+    # Rule file, re-read when it changes (checked at most every interval; 0 disables)
+    RULES_PATH = os.environ.get(
+        'RULES_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'utils', 'rules.json'))
+    RULES_RELOAD_INTERVAL_SECONDS = _env_float('RULES_RELOAD_INTERVAL_SECONDS', 2)
+
+    # Longest accepted prompt in characters; prompts are scanned in chunks, so megabytes are fine
+    MAX_PROMPT_LENGTH = _env_int('MAX_PROMPT_LENGTH', 5000)
+
+    # Transformation cache (0 disables the byte limit / TTL)
+    # 'memory' is per worker; 'sqlite' is shared by all workers on the host
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_SQLITE_PATH = os.environ.get(
+        'CACHE_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'prompt-to-json-cache.sqlite3'))
+    CACHE_MAX_ENTRIES = _env_int('CACHE_MAX_ENTRIES', 1000)
+    CACHE_MAX_BYTES = _env_int('CACHE_MAX_BYTES', 32 * 1024 * 1024)
+    CACHE_TTL_SECONDS = _env_float('CACHE_TTL_SECONDS', 0)
+    # Memory backend: store results as interned string-table indices plus the problem text
+    CACHE_COMPACT = os.environ.get('CACHE_COMPACT', '1') != '0'
+
+    # Memory backend: serialized /transform cache-hit responses, kept for reuse
+    # (0 entries disables); bodies of at least RESPONSE_GZIP_MIN_BYTES are also kept gzipped
+    RESPONSE_CACHE_MAX_ENTRIES = _env_int('RESPONSE_CACHE_MAX_ENTRIES', 1000)
+    RESPONSE_CACHE_MAX_BYTES = _env_int('RESPONSE_CACHE_MAX_BYTES', 16 * 1024 * 1024)
+    RESPONSE_GZIP_MIN_BYTES = _env_int('RESPONSE_GZIP_MIN_BYTES', 1024)
+
+    # Memory-backend snapshots for warm restarts: restored on boot, saved every
+    # interval and on worker shutdown (empty path disables; interval 0 saves only on shutdown)
+    CACHE_SNAPSHOT_PATH = os.environ.get(
+        'CACHE_SNAPSHOT_PATH', os.path.join(tempfile.gettempdir(), 'prompt-to-json-cache.snapshot.gz'))
+    CACHE_SNAPSHOT_INTERVAL_SECONDS = _env_float('CACHE_SNAPSHOT_INTERVAL_SECONDS', 60)
+
+    # Concurrent misses for one prompt share a computation; followers wait at most this long
+    SINGLE_FLIGHT_TIMEOUT_SECONDS = _env_float('SINGLE_FLIGHT_TIMEOUT_SECONDS', 5)
+
+    # Admission control for /transform and /transform/custom (per worker): cache misses
+    # share ADMISSION_MAX_IN_FLIGHT slots, up to ADMISSION_MAX_QUEUE more wait at most
+    # ADMISSION_QUEUE_TIMEOUT_SECONDS, and the rest get an immediate 503; cache hits skip the queue
+    ADMISSION_MAX_IN_FLIGHT = _env_int('ADMISSION_MAX_IN_FLIGHT', 4)
+    ADMISSION_MAX_QUEUE = _env_int('ADMISSION_MAX_QUEUE', 64)
+    ADMISSION_QUEUE_TIMEOUT_SECONDS = _env_float('ADMISSION_QUEUE_TIMEOUT_SECONDS', 2)
+    ADMISSION_RETRY_AFTER_SECONDS = _env_int('ADMISSION_RETRY_AFTER_SECONDS', 1)
+
+    # Per-client token bucket on the same endpoints (0 disables); clients are told
+    # apart by RATE_LIMIT_CLIENT_HEADER (e.g. X-Forwarded-For) or the peer address
+    RATE_LIMIT_PER_SECOND = _env_float('RATE_LIMIT_PER_SECOND', 0)
+    RATE_LIMIT_BURST = _env_int('RATE_LIMIT_BURST', 20)
+    RATE_LIMIT_CLIENT_HEADER = os.environ.get('RATE_LIMIT_CLIENT_HEADER', '')
+
+    # Batch transformation
+    BATCH_MAX_ITEMS = _env_int('BATCH_MAX_ITEMS', 1000)
+    BATCH_PARALLEL_THRESHOLD = _env_int('BATCH_PARALLEL_THRESHOLD', 64)
+    BATCH_WORKERS = _env_int('BATCH_WORKERS', os.cpu_count() or 1)
+    # A batch can occupy the whole BATCH_WORKERS pool, so besides a transform slot
+    # it needs one of BATCH_MAX_IN_FLIGHT batch slots (per worker), with its own queue
+    BATCH_MAX_IN_FLIGHT = _env_int('BATCH_MAX_IN_FLIGHT', 1)
+    BATCH_MAX_QUEUE = _env_int('BATCH_MAX_QUEUE', 4)
+
+    # Streaming NDJSON transformation
+    STREAM_MAX_LINE_BYTES = _env_int('STREAM_MAX_LINE_BYTES', 1024 * 1024)
+
+    # Incremental sessions for live typing (/transform/session): at most
+    # SESSION_MAX_ENTRIES sessions of SESSION_MAX_BYTES in total (0 disables the byte
+    # limit), each dropped after SESSION_IDLE_SECONDS without an edit. 'memory' keeps
+    # them per worker (edits need sticky routing); 'sqlite' shares them per host
+    SESSION_BACKEND = os.environ.get('SESSION_BACKEND', CACHE_BACKEND)
+    SESSION_SQLITE_PATH = os.environ.get(
+        'SESSION_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'prompt-to-json-sessions.sqlite3'))
+    SESSION_MAX_ENTRIES = _env_int('SESSION_MAX_ENTRIES', 1000)
+    SESSION_MAX_BYTES = _env_int('SESSION_MAX_BYTES', 16 * 1024 * 1024)
+    SESSION_IDLE_SECONDS = _env_float('SESSION_IDLE_SECONDS', 300)
+
+    # Requests to the transform endpoints slower than this write a structured entry
+    # to the 'prompt_enhancer.slow' logger (0 disables)
+    SLOW_REQUEST_THRESHOLD_MS = _env_float('SLOW_REQUEST_THRESHOLD_MS', 250)
+
+    # Async serving mode (asgi_app.py): threads running transformations off the event loop
+    ASGI_EXECUTOR_WORKERS = _env_int('ASGI_EXECUTOR_WORKERS', (os.cpu_count() or 1) + 4)
+
+    # Directory shared by all workers of one server, through which /metrics reports
+    # totals across workers (empty: this process only). gunicorn.conf.py sets and
+    # clears it at startup; each worker writes its metrics there every interval
+    METRICS_MULTIPROC_DIR = os.environ.get('METRICS_MULTIPROC_DIR', '')
+    METRICS_FLUSH_INTERVAL_SECONDS = _env_float('METRICS_FLUSH_INTERVAL_SECONDS', 5)
+
+    # Admin-only debug endpoints (/debug/profile); requests must send
+    # "Authorization: Bearer <ADMIN_TOKEN>". Empty disables them entirely
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+    # Longest profiling window accepted by /debug/profile
+    PROFILE_MAX_SECONDS = _env_float('PROFILE_MAX_SECONDS', 60)
+
+    # Shadow mode: re-run SHADOW_SAMPLE_RATE of computed transformations through a
+    # candidate engine ('reference', 'batch' or 'module:function') on a background
+    # thread, recording divergences and timings at /debug/shadow (empty disables)
+    SHADOW_ENGINE = os.environ.get('SHADOW_ENGINE', '')
+    SHADOW_SAMPLE_RATE = _env_float('SHADOW_SAMPLE_RATE', 0.01)
+    SHADOW_MAX_PENDING = _env_int('SHADOW_MAX_PENDING', 100)
@@ -0,0 +1,90 @@
+"""
+Gunicorn settings shared by both serving modes
+
+SERVER_MODE=wsgi (default) serves the Flask app with threaded (gthread) workers;
+SERVER_MODE=asgi serves asgi_app with uvicorn workers.
+"""
+
+import os
+import sys
+import tempfile
+
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'asgi_app:app'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+elif SERVER_MODE == 'wsgi':
+    wsgi_app = 'app:app'
+    worker_class = 'gthread'
+else:
+    raise ValueError(f"SERVER_MODE must be 'wsgi' or 'asgi', got {SERVER_MODE!r}")
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5000')}"
+
+# Workers share their metrics through this directory so /metrics reports totals
+# across workers; set before the app is imported, emptied in on_starting
+os.environ.setdefault('METRICS_MULTIPROC_DIR', os.path.join(
+    tempfile.gettempdir(), f"prompt-to-json-metrics-{os.environ.get('PORT', '5000')}"))
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+# Admission control only queues and sheds inside a worker when the worker has
+# more threads than ADMISSION_MAX_IN_FLIGHT slots (default 4); a smaller
+# backlog refuses excess connections at the socket instead of letting them
+# wait for a worker
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+backlog = int(os.environ.get('GUNICORN_BACKLOG', 2048))
+worker_connections = 1000
+max_requests = 1000
+max_requests_jitter = 100
+timeout = 30
+keepalive = 2
+preload_app = True
+accesslog = '-'
+errorlog = '-'
+
+
+def _cache_snapshotter():
+    """The app's snapshotter, once the app module has been imported"""
+    app_module = sys.modules.get('app')
+    return getattr(app_module, 'cache_snapshotter', None)
+
+
+def on_starting(server):
+    # Counts from a previous run of this server must not carry over
+    from utils.metrics import MultiProcessMetrics
+    MultiProcessMetrics.clear_directory(os.environ['METRICS_MULTIPROC_DIR'])
+
+
+def when_ready(server):
+    if SERVER_MODE == 'wsgi':
+        from config import Config
+        if threads <= Config.ADMISSION_MAX_IN_FLIGHT:
+            server.log.warning(
+                "GUNICORN_THREADS=%d does not exceed ADMISSION_MAX_IN_FLIGHT=%d, so admission control "
+                "never queues or sheds; raise GUNICORN_THREADS or lower ADMISSION_MAX_IN_FLIGHT",
+                threads, Config.ADMISSION_MAX_IN_FLIGHT)
+    snapshotter = _cache_snapshotter()
+    if snapshotter is not None:
+        stats = snapshotter.stats()
+        server.log.info("Restored %d cache entries from %s in %.1f ms",
+                        stats["restored"], stats["path"], stats["restore_seconds"] * 1000)
+
+
+def post_fork(server, worker):
+    # Workers recycled by max_requests pick up snapshots written since the master booted
+    snapshotter = _cache_snapshotter()
+    if snapshotter is not None:
+        restored, seconds = snapshotter.restore()
+        if restored:
+            server.log.info("Worker %s restored %d cache entries in %.1f ms", worker.pid, restored, seconds * 1000)
+
+
+def worker_exit(server, worker):
+    metrics_store = getattr(sys.modules.get('app'), 'metrics_store', None)
+    if metrics_store is not None:
+        metrics_store.stop()
+    snapshotter = _cache_snapshotter()
+    if snapshotter is not None:
+        saved = snapshotter.stop()
+        if saved is not None:
+            server.log.info("Worker %s flushed %d cache entries to %s", worker.pid, saved, snapshotter.path)
@@ -35,6 +35,20 @@ class PromptEnhancer {
 
     // Initialize current settings
     this.currentOutputStyle = "detailed";
+
+    // Results already received from /transform, keyed by prompt, so the
+    // server can confirm them with a 304 instead of sending them again
+    this.heldResults = new Map();
+    this.maxHeldResults = 50;
+
+    // Live mode: edits are sent against a server-side session instead of
+    // the whole prompt; one request is in flight at a time
+    this.liveToggle = document.getElementById("live-toggle");
+    this.liveSession = null; // { id, revision, text }
+    this.liveTimer = null;
+    this.liveDelay = 250;
+    this.liveInFlight = false;
+    this.livePending = false;
   }
 
   bindEvents() {
@@ -81,8 +95,21 @@ class PromptEnhancer {
     this.promptInput.addEventListener("input", () => {
       this.promptInput.style.height = "auto";
       this.promptInput.style.height = this.promptInput.scrollHeight + "px";
+      this.scheduleLiveUpdate();
     });
 
+    // Live results while typing
+    if (this.liveToggle) {
+      this.liveToggle.addEventListener("change", () => {
+        if (this.liveToggle.checked) {
+          this.scheduleLiveUpdate();
+        } else {
+          this.closeLiveSession();
+        }
+      });
+      window.addEventListener("pagehide", () => this.closeLiveSession());
+    }
+
     // Close panel on Escape key
     document.addEventListener("keydown", (e) => {
       if (e.key === "Escape" && this.floatingPanel.classList.contains("show")) {
@@ -119,20 +146,36 @@ class PromptEnhancer {
         requestBody.output_style = this.currentOutputStyle;
       }
 
+      const headers = {
+        "Content-Type": "application/json",
+      };
+      const held = hasCustomOptions ? null : this.heldResults.get(prompt);
+      if (held) {
+        headers["If-None-Match"] = held.etag;
+      }
+
       const response = await fetch(endpoint, {
         method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-        },
+        headers,
         body: JSON.stringify(requestBody),
       });
 
+      if (response.status === 304 && held) {
+        this.displayResult({ ...held.data, cached: true });
+        return;
+      }
+
       const data = await response.json();
 
       if (!response.ok) {
         throw new Error(data.error || "Failed to transform prompt");
       }
 
+      const etag = response.headers.get("ETag");
+      if (!hasCustomOptions && etag) {
+        this.holdResult(prompt, etag, data);
+      }
+
       this.displayResult(data);
     } catch (error) {
       console.error("Error transforming prompt:", error);
@@ -144,6 +187,104 @@ class PromptEnhancer {
     }
   }
 
+  scheduleLiveUpdate() {
+    if (!this.liveToggle || !this.liveToggle.checked) {
+      return;
+    }
+    clearTimeout(this.liveTimer);
+    this.liveTimer = setTimeout(() => this.liveUpdate(), this.liveDelay);
+  }
+
+  liveOptions() {
+    return {
+      include_keys: Array.from(this.includeKeysCheckboxes)
+        .filter((checkbox) => checkbox.checked)
+        .map((checkbox) => checkbox.value),
+      output_style: this.currentOutputStyle,
+    };
+  }
+
+  async liveUpdate() {
+    if (this.liveInFlight) {
+      this.livePending = true;
+      return;
+    }
+    this.liveInFlight = true;
+
+    try {
+      const text = this.promptInput.value;
+      const options = this.liveOptions();
+      let response = null;
+
+      if (this.liveSession) {
+        const edit = diffEdit(this.liveSession.text, text);
+        response = await this.postJSON(
+          `/transform/session/${encodeURIComponent(this.liveSession.id)}`,
+          { revision: this.liveSession.revision, edits: edit ? [edit] : [], ...options }
+        );
+        // Expired, evicted, served by another worker or overtaken: start over
+        if (response.status === 404 || response.status === 409) {
+          this.liveSession = null;
+          response = null;
+        }
+      }
+      if (!response) {
+        response = await this.postJSON("/transform/session", { prompt: text, ...options });
+      }
+
+      const data = await response.json();
+      if (!response.ok) {
+        throw new Error(data.error || "Failed to transform prompt");
+      }
+
+      this.liveSession = { id: data.session, revision: data.revision, text };
+      this.hideError();
+      if (data.result) {
+        this.displayResult(data.result);
+      } else {
+        // Too short to analyze yet; not worth an error while typing
+        this.hideOutput();
+      }
+    } catch (error) {
+      console.error("Error updating live result:", error);
+      this.showError(error.message || "An unexpected error occurred.");
+    } finally {
+      this.liveInFlight = false;
+      if (this.livePending) {
+        this.livePending = false;
+        this.liveUpdate();
+      }
+    }
+  }
+
+  closeLiveSession() {
+    clearTimeout(this.liveTimer);
+    if (this.liveSession) {
+      fetch(`/transform/session/${encodeURIComponent(this.liveSession.id)}`, {
+        method: "DELETE",
+        keepalive: true,
+      }).catch(() => {});
+      this.liveSession = null;
+    }
+  }
+
+  postJSON(url, body) {
+    return fetch(url, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(body),
+    });
+  }
+
+  holdResult(prompt, etag, data) {
+    // Re-insert so the Map's order is least recently used first
+    this.heldResults.delete(prompt);
+    this.heldResults.set(prompt, { etag, data });
+    if (this.heldResults.size > this.maxHeldResults) {
+      this.heldResults.delete(this.heldResults.keys().next().value);
+    }
+  }
+
   displayResult(data) {
     // Format JSON with proper indentation
     const formattedJson = JSON.stringify(data, null, 2);
@@ -356,6 +497,67 @@ class PromptEnhancer {
   }
 }
 
+/**
+ * Describe the change from one text to another as a single replacement.
+ * The server counts positions in code points, while JavaScript strings
+ * index UTF-16 units, so the common prefix and suffix never end inside a
+ * surrogate pair and offsets are converted before sending.
+ * Returns null when the texts are equal.
+ */
+function diffEdit(before, after) {
+  if (before === after) {
+    return null;
+  }
+  const limit = Math.min(before.length, after.length);
+  let prefix = 0;
+  while (prefix < limit && before[prefix] === after[prefix]) {
+    prefix++;
+  }
+  if (prefix > 0 && isHighSurrogate(before.charCodeAt(prefix - 1))) {
+    prefix--;
+  }
+  let suffix = 0;
+  while (
+    suffix < limit - prefix &&
+    before[before.length - 1 - suffix] === after[after.length - 1 - suffix]
+  ) {
+    suffix++;
+  }
+  if (suffix > 0 && isLowSurrogate(before.charCodeAt(before.length - suffix))) {
+    suffix--;
+  }
+
+  const start = codePointLength(before, 0, prefix);
+  return {
+    start,
+    end: start + codePointLength(before, prefix, before.length - suffix),
+    text: after.slice(prefix, after.length - suffix),
+  };
+}
+
+function isHighSurrogate(code) {
+  return code >= 0xd800 && code <= 0xdbff;
+}
+
+function isLowSurrogate(code) {
+  return code >= 0xdc00 && code <= 0xdfff;
+}
+
+function codePointLength(text, from, to) {
+  let count = 0;
+  for (let i = from; i < to; i++) {
+    // The low half of a pair was counted with its high half
+    const pairedLow =
+      i > from &&
+      isLowSurrogate(text.charCodeAt(i)) &&
+      isHighSurrogate(text.charCodeAt(i - 1));
+    if (!pairedLow) {
+      count++;
+    }
+  }
+  return count;
+}
+
 // Initialize the application when DOM is loaded
 document.addEventListener("DOMContentLoaded", () => {
   const app = new PromptEnhancer();
@@ -0,0 +1,12 @@
+"""
+Test settings, applied before the app modules are imported
+"""
+
+import os
+import tempfile
+
+# Keep tests away from the snapshot and metrics files of a local server
+os.environ.setdefault('CACHE_SNAPSHOT_PATH', '')
+os.environ.setdefault('METRICS_MULTIPROC_DIR', '')
+os.environ.setdefault('CACHE_BACKEND', 'memory')
+os.environ.setdefault('CACHE_SQLITE_PATH', os.path.join(tempfile.mkdtemp(), 'cache.sqlite3'))
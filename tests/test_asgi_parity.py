@@ -0,0 +1,226 @@
+"""
+The ASGI app must answer every request exactly like the Flask app.
+
+Each case is sent to Flask's test client and to Starlette's TestClient
+with empty caches, and the status, body and relevant headers are compared.
+"""
+
+import json
+
+import pytest
+from starlette.testclient import TestClient
+
+import app as wsgi
+import asgi_app
+from benchmarks.corpus import generate_corpus
+
+REQUEST_ID = {'X-Request-ID': 'parity-test'}
+
+# Headers that are part of the contract (Server-Timing values differ run to run)
+COMPARED_HEADERS = ('content-type', 'etag', 'retry-after', 'cache-control', 'content-encoding',
+                    'x-request-id', 'x-profile-worker')
+
+PROMPTS = generate_corpus()[:200:20] + [
+    "Build a REST API in Python with Flask and PostgreSQL",
+    "x" * 4999,
+    "  Debug this React component that re-renders twice  ",
+]
+
+POST_CASES = [
+    *[('/transform', {'json': {'prompt': prompt}}) for prompt in PROMPTS],
+    *[('/transform/custom', {'json': {'prompt': prompt, 'include_keys': ['context', 'problem'],
+                                      'output_style': 'short'}}) for prompt in PROMPTS],
+    ('/transform', {'json': {}}),
+    ('/transform', {'json': {'prompt': ''}}),
+    ('/transform', {'json': {'prompt': 5}}),
+    ('/transform', {'json': {'prompt': 'x' * 6000}}),
+    ('/transform', {'json': [1]}),
+    ('/transform', {'json': 7}),
+    ('/transform', {'data': 'x', 'headers': {'Content-Type': 'text/plain'}}),
+    ('/transform', {'data': '{bad', 'headers': {'Content-Type': 'application/json'}}),
+    ('/transform/custom', {'json': {'prompt': 'hello world', 'include_keys': 'context'}}),
+    ('/transform/custom', {'json': {'prompt': 'hello world', 'output_style': 'verbose'}}),
+    ('/transform/custom', {'json': {'prompt': 'x' * 6000}}),
+    ('/transform/batch', {'json': {'prompts': PROMPTS + ['', 5, {'prompt': 'sql query', 'output_style': 'short'}]}}),
+    ('/transform/batch', {'json': {'prompts': PROMPTS, 'include_keys': ['context']}}),
+    ('/transform/batch', {'json': {}}),
+    ('/transform/batch', {'json': [1, 2]}),
+    ('/transform/batch', {'json': 7}),
+    ('/transform/batch', {'json': {'prompts': ['a'] * (wsgi.app.config['BATCH_MAX_ITEMS'] + 1)}}),
+    ('/transform/batch', {'data': 'x', 'headers': {'Content-Type': 'text/plain'}}),
+    ('/transform/stream', {'data': '\n'.join(json.dumps({'prompt': prompt}) for prompt in PROMPTS)
+                           + '\n\n{bad\n{"text": 1}\n"a string"\n{"prompt": "ab"}\n'}),
+    ('/transform/stream', {'data': '{"prompt": "' + 'y' * (wsgi.app.config['STREAM_MAX_LINE_BYTES'] + 10)
+                           + '"}\n{"prompt": "write a sql query"}'}),
+    ('/transform/session', {'json': {'prompt': 'Build a python web api'}}),
+    ('/transform/session', {'json': {'prompt': 'ab'}}),
+    ('/transform/session', {'json': {'prompt': 'Build a python web api', 'output_style': 'verbose'}}),
+    ('/transform/session', {'json': {}}),
+    ('/transform/session', {'data': '{"prompt": "Build a python web api"}', 'headers': {'Content-Type': 'text/plain'}}),
+    ('/transform/session/unknown', {'json': {'revision': 0, 'edits': []}}),
+    ('/cache/clear', {}),
+]
+
+
+@pytest.fixture(scope='module')
+def clients():
+    with TestClient(asgi_app.app) as asgi_client:
+        # httpx asks for gzip by default; Flask's test client sends no Accept-Encoding
+        del asgi_client.headers['accept-encoding']
+        yield wsgi.app.test_client(), asgi_client
+
+
+def clear_caches():
+    wsgi.transformation_cache.clear()
+    wsgi.fingerprint_cache.clear()
+    if wsgi.response_cache is not None:
+        wsgi.response_cache.clear()
+
+
+def httpx_options(options):
+    """Flask test client options -> httpx ones (raw bodies are 'content' in httpx)"""
+    options = dict(options)
+    if 'data' in options:
+        options['content'] = options.pop('data')
+    return options
+
+
+def headers_of(response):
+    return {name: response.headers.get(name) for name in COMPARED_HEADERS}
+
+
+def mask_session(body):
+    """Session IDs are random; compare the rest of a session response"""
+    payload = json.loads(body)
+    if isinstance(payload, dict) and 'session' in payload:
+        payload['session'] = '<session>'
+    return payload
+
+
+def assert_same(flask_response, asgi_response, body=lambda raw: raw):
+    assert asgi_response.status_code == flask_response.status_code
+    assert body(asgi_response.content) == body(flask_response.data)
+    assert headers_of(asgi_response) == headers_of(flask_response)
+    assert asgi_response.headers['server-timing'].endswith(tuple('0123456789'))
+    assert 'total;dur=' in flask_response.headers['Server-Timing']
+
+
+@pytest.mark.parametrize('path, options', POST_CASES, ids=lambda value: str(value)[:40])
+def test_post(clients, path, options):
+    flask_client, asgi_client = clients
+    options = dict(options, headers={**options.get('headers', {}), **REQUEST_ID})
+    body = mask_session if path.startswith('/transform/session') else (lambda raw: raw)
+    # The first request misses the cache, the second hits it
+    clear_caches()
+    flask_responses = [flask_client.post(path, buffered=True, **options) for _ in range(2)]
+    clear_caches()
+    asgi_responses = [asgi_client.post(path, **httpx_options(options)) for _ in range(2)]
+    for flask_response, asgi_response in zip(flask_responses, asgi_responses):
+        assert_same(flask_response, asgi_response, body)
+
+def test_conditional_get(clients):
+    flask_client, asgi_client = clients
+    clear_caches()
+    request = {'json': {'prompt': PROMPTS[0]}, 'headers': REQUEST_ID}
+    etag = flask_client.post('/transform', **request).headers['ETag']
+    for headers in ({'If-None-Match': etag}, {'If-None-Match': '"other"'}, {'Accept-Encoding': 'gzip'}):
+        options = dict(request, headers={**REQUEST_ID, **headers})
+        assert_same(flask_client.post('/transform', **options), asgi_client.post('/transform', **options))
+
+
+def test_session_edits(clients):
+    flask_client, asgi_client = clients
+    responses = []
+    for client in clients:
+        opened = client.post('/transform/session', json={'prompt': 'Build a python web api'})
+        session = opened.json['session'] if client is flask_client else opened.json()['session']
+        steps = [
+            {'revision': 0, 'edits': [{'start': 22, 'end': 22, 'text': ' with a react frontend'}]},
+            {'revision': 0, 'edits': []},
+            {'revision': 1, 'edits': [{'start': 0, 'end': 5, 'text': 'Debug'}], 'output_style': 'short'},
+            {'revision': 2, 'edits': [{'start': 0, 'end': 999, 'text': ''}]},
+            {'revision': 2},
+        ]
+        outcome = [client.post(f'/transform/session/{session}', json=step, headers=REQUEST_ID) for step in steps]
+        outcome.append(client.delete(f'/transform/session/{session}', headers=REQUEST_ID))
+        outcome.append(client.delete(f'/transform/session/{session}', headers=REQUEST_ID))
+        outcome.append(client.post(f'/transform/session/{session}', json=steps[0], headers=REQUEST_ID))
+        responses.append(outcome)
+    for flask_response, asgi_response in zip(*responses):
+        assert_same(flask_response, asgi_response, mask_session)
+
+
+def test_rate_limited(clients, monkeypatch):
+    flask_client, asgi_client = clients
+    monkeypatch.setattr(wsgi.rate_limiter, 'rate', 0.001)
+    monkeypatch.setattr(wsgi.rate_limiter, 'burst', 1)
+    for path, options in (('/transform', {'json': {'prompt': PROMPTS[0]}}),
+                          ('/transform/custom', {'json': {'prompt': PROMPTS[0]}}),
+                          ('/transform/session', {'json': {'prompt': PROMPTS[0]}}),
+                          ('/transform/batch', {'json': {'prompts': PROMPTS}}),
+                          ('/transform/stream', {'data': '{"prompt": "write a sql query"}\n'})):
+        responses = []
+        for client in clients:
+            wsgi.rate_limiter._buckets.clear()
+            client_options = options if client is flask_client else httpx_options(options)
+            client.post(path, headers=REQUEST_ID, **client_options)
+            responses.append(client.post(path, headers=REQUEST_ID, **client_options))
+        assert responses[0].status_code == 429
+        assert_same(*responses)
+
+
+@pytest.mark.parametrize('path, options', [
+    ('/transform', {'json': {'prompt': 'Build a REST API in Go'}}),
+    ('/transform/custom', {'json': {'prompt': 'Build a REST API in Go', 'include_keys': ['context']}}),
+    ('/transform/batch', {'json': {'prompts': PROMPTS}}),
+    ('/transform/stream', {'data': '{"prompt": "write a sql query"}\n{"prompt": "ab"}\n'}),
+])
+def test_overloaded(clients, monkeypatch, path, options):
+    flask_client, asgi_client = clients
+    # No slots and no queue: every request that needs a slot is refused
+    monkeypatch.setattr(wsgi.admission, 'max_in_flight', 0)
+    monkeypatch.setattr(wsgi.admission, 'max_queue', 0)
+    clear_caches()
+    flask_response = flask_client.post(path, headers=REQUEST_ID, buffered=True, **options)
+    clear_caches()
+    asgi_response = asgi_client.post(path, headers=REQUEST_ID, **httpx_options(options))
+    assert flask_response.status_code == (200 if path == '/transform/stream' else 503)
+    assert_same(flask_response, asgi_response)
+
+
+@pytest.mark.parametrize('path', ['/health', '/cache/stats'])
+def test_json_reports(clients, path):
+    flask_client, asgi_client = clients
+    flask_response = flask_client.get(path, headers=REQUEST_ID)
+    asgi_response = asgi_client.get(path, headers=REQUEST_ID)
+    assert asgi_response.status_code == flask_response.status_code == 200
+    assert asgi_response.json().keys() == flask_response.json.keys()
+    assert headers_of(asgi_response) == headers_of(flask_response)
+
+
+def test_metrics(clients):
+    flask_client, asgi_client = clients
+    flask_response = flask_client.get('/metrics', headers=REQUEST_ID)
+    asgi_response = asgi_client.get('/metrics', headers=REQUEST_ID)
+    assert asgi_response.status_code == flask_response.status_code == 200
+    assert headers_of(asgi_response) == headers_of(flask_response)
+
+    def declared(text):
+        return [line for line in text.splitlines() if line.startswith('# ')]
+    assert declared(asgi_response.text) == declared(flask_response.get_data(as_text=True))
+
+
+@pytest.mark.parametrize('path', ['/debug/profile', '/debug/shadow'])
+def test_admin_endpoints_hidden_without_token(clients, path):
+    flask_client, asgi_client = clients
+    assert_same(flask_client.get(path, headers=REQUEST_ID), asgi_client.get(path, headers=REQUEST_ID))
+
+
+@pytest.mark.parametrize('path', ['/', '/static/js/app.js', '/static/css/style.css'])
+def test_ui(clients, path):
+    flask_client, asgi_client = clients
+    flask_response = flask_client.get(path)
+    asgi_response = asgi_client.get(path)
+    assert asgi_response.status_code == flask_response.status_code == 200
+    assert asgi_response.content == flask_response.data
+    assert asgi_response.headers['content-type'].split(';')[0] == flask_response.mimetype
@@ -0,0 +1,52 @@
+"""
+Batch transformation across the process pool
+"""
+
+import app as wsgi
+from benchmarks.corpus import generate_corpus
+from utils import batch
+from utils.admission import AdmissionController
+from utils.prompt_analyzer import transform_prompt_to_json
+from utils.rules import get_rules
+
+
+def test_pool_matches_in_process():
+    prompts = generate_corpus()[:80]
+    try:
+        outcomes = batch.transform_many(prompts, max_workers=2, parallel_threshold=1)
+    finally:
+        batch.shutdown_executor()
+    assert outcomes == [(transform_prompt_to_json(prompt), None) for prompt in prompts]
+
+
+def test_chunk_from_other_rules_is_redone(monkeypatch):
+    rules = get_rules()
+    prompts = generate_corpus()[:8]
+    expected = batch._transform_chunk(prompts, rules)
+
+    class Pool:
+        def map(self, function, chunks, versions):
+            return [('other', [(None, 'stale')] * len(chunk)) for chunk in chunks]
+
+    monkeypatch.setattr(batch, '_get_executor', lambda max_workers: Pool())
+    assert batch.transform_many(prompts, max_workers=2, parallel_threshold=1, rules=rules) == expected
+
+
+def test_non_object_body_is_rejected():
+    client = wsgi.app.test_client()
+    for body in ([1, 2], 7, "prompts"):
+        response = client.post('/transform/batch', json=body)
+        assert response.status_code == 400
+        assert response.json == {"error": "Missing 'prompts' list in request body"}
+
+
+def test_batches_have_their_own_slots(monkeypatch):
+    monkeypatch.setattr(wsgi, 'batch_admission', AdmissionController(max_in_flight=1, max_queue=0))
+    client = wsgi.app.test_client()
+    with wsgi.batch_admission.slot():
+        refused = client.post('/transform/batch', json={'prompts': ['write a sql query']})
+        # Single prompts still get the shared slots
+        assert client.post('/transform', json={'prompt': 'write a sql query'}).status_code == 200
+    assert refused.status_code == 503 and refused.headers['Retry-After'] == '1'
+    assert client.post('/transform/batch', json={'prompts': ['write a sql query']}).status_code == 200
+    assert wsgi.admission_health()['batch']['rejected'] == 1
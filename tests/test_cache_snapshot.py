@@ -0,0 +1,28 @@
+"""
+Snapshots shared by several workers
+"""
+
+import threading
+
+from utils.cache import LRUCache
+from utils.cache_snapshot import load_snapshot, save_snapshot
+
+
+def test_concurrent_saves_keep_every_entry(tmp_path):
+    path = str(tmp_path / 'cache.json.gz')
+
+    def worker(number):
+        cache = LRUCache(max_entries=1000)
+        for i in range(50):
+            cache.set(f'v:{number}-{i}', {'i': i})
+        for _ in range(3):
+            save_snapshot(cache, path, 'v')
+
+    threads = [threading.Thread(target=worker, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    restored = LRUCache(max_entries=1000)
+    assert load_snapshot(restored, path, 'v') == 8 * 50
@@ -0,0 +1,50 @@
+"""
+Sessions shared between workers through the SQLite backend
+"""
+
+import pytest
+
+from utils.cache import SQLiteCache
+from utils.rules import get_rules
+from utils.sessions import SessionError, SessionStore
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two stores on one database, like two Gunicorn workers"""
+    path = str(tmp_path / 'sessions.sqlite3')
+    return [SessionStore(states=SQLiteCache(path, ttl=300)) for _ in range(2)]
+
+
+def test_edit_on_another_worker(workers):
+    first, second = workers
+    rules = get_rules()
+    session_id, state = first.open('Build a python web api', rules)
+    state = second.edit(session_id, 0, [{'start': 22, 'end': 22, 'text': ' with a react frontend'}], rules)
+    state = first.edit(session_id, 1, [{'start': 0, 'end': 5, 'text': 'Debug'}], rules)
+    assert state.text == 'Debug a python web api with a react frontend'
+    assert state.revision == 2
+    assert state.counts == dict(rules.matcher.count_longest(state.text.lower()))
+    assert second.close(session_id)
+    with pytest.raises(SessionError) as error:
+        first.edit(session_id, 2, [], rules)
+    assert error.value.status == 404
+
+
+def test_stale_revision_on_another_worker(workers):
+    first, second = workers
+    rules = get_rules()
+    session_id, _ = first.open('Write a sql query', rules)
+    first.edit(session_id, 0, [{'start': 0, 'end': 0, 'text': 'Please '}], rules)
+    with pytest.raises(SessionError) as error:
+        second.edit(session_id, 0, [{'start': 0, 'end': 0, 'text': 'Now '}], rules)
+    assert error.value.status == 409
+
+
+def test_compare_and_set_refuses_changed_state(workers):
+    states = workers[0]._sessions
+    states.set('key', ['a', {'b': 1}, 'v', 0])
+    assert not states.compare_and_set('key', ['a', {'b': 2}, 'v', 0], ['c', {}, 'v', 1])
+    assert states.compare_and_set('key', ['a', {'b': 1}, 'v', 0], ['c', {}, 'v', 1])
+    assert states.get('key') == ['c', {}, 'v', 1]
+    assert not states.compare_and_set('missing', None, ['c', {}, 'v', 1])
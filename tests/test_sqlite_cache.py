@@ -0,0 +1,106 @@
+"""
+The shared SQLite cache backend
+"""
+
+import random
+import sqlite3
+
+from utils.cache import SQLiteCache
+
+
+def real_totals(cache):
+    return cache._connection().execute(
+        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries").fetchone()
+
+
+def test_totals_follow_every_change(tmp_path):
+    clock = [100.0]
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), max_entries=50, max_bytes=2000, ttl=30,
+                        clock=lambda: clock[0])
+    rng = random.Random(0)
+    for _ in range(1500):
+        clock[0] += rng.random()
+        key, action = f'k{rng.randrange(120)}', rng.random()
+        if action < 0.5:
+            cache.set(key, 'v' * rng.randrange(1, 120))
+        elif action < 0.8:
+            cache.get(key)
+        elif action < 0.9:
+            cache.delete(key)
+        else:
+            value = cache.get(key)
+            if value is not None:
+                cache.compare_and_set(key, value, 'w' * rng.randrange(1, 50))
+        entries, size = real_totals(cache)
+        assert (entries, size) == (len(cache), cache.stats()['bytes'])
+        assert entries <= 50 and size <= 2000
+    cache.clear()
+    assert real_totals(cache) == (0, 0) == (len(cache), cache.stats()['bytes'])
+
+
+def test_lookups_do_not_write(tmp_path):
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    cache.set('key', {'a': 1})
+    # Hold the write lock from another connection; reads must still succeed at once
+    writer = sqlite3.connect(cache.path, timeout=0)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        cache.touch_interval = 0
+        assert cache.get('key') == {'a': 1}
+        assert cache.get('missing') is None
+    finally:
+        writer.rollback()
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_recent_hits_survive_eviction(tmp_path):
+    clock = [0.0]
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), max_entries=3, clock=lambda: clock[0],
+                        touch_interval=10)
+    for key in ('a', 'b', 'c'):
+        clock[0] += 1
+        cache.set(key, key)
+    clock[0] += 20
+    assert cache.get('a') == 'a'
+    cache.set('d', 'd')
+    assert cache.get('a') == 'a'
+    assert cache.get('b') is None
+
+
+def test_database_from_before_totals(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE cache_entries (key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                 " size INTEGER NOT NULL, expires_at REAL, last_access REAL NOT NULL)")
+    conn.executemany("INSERT INTO cache_entries VALUES (?, ?, 3, NULL, 0)", [(f'k{i}', '"x"') for i in range(5)])
+    conn.commit()
+    conn.close()
+    cache = SQLiteCache(path)
+    assert len(cache) == 5 and cache.stats()['bytes'] == 15
+    cache.set('k0', 'longer')
+    assert real_totals(cache) == (5, 20)
+    # The rendered-body columns are added, and old rows render from their value
+    cache.renderer = lambda value: (value.encode(), None)
+    assert cache.get_rendered('k1') == (b'x', None)
+
+
+def test_rendered_bodies_are_stored(tmp_path):
+    renders = []
+
+    def renderer(value):
+        renders.append(value)
+        return f'<{value}>'.encode(), b'gz' if len(value) > 3 else None
+
+    cache = SQLiteCache(str(tmp_path / 'cache.sqlite3'), renderer=renderer)
+    cache.set('short', 'abc')
+    cache.set('long', 'abcdef')
+    assert cache.get_rendered('short') == (b'<abc>', None)
+    assert cache.get_rendered('long') == (b'<abcdef>', b'gz')
+    assert cache.get_rendered('missing') is None
+    assert cache.get('long') == 'abcdef'
+    assert renders == ['abc', 'abcdef']
+    assert real_totals(cache) == (2, len('"abc"<abc>') + len('"abcdef"<abcdef>gz'))
+
+    assert cache.compare_and_set('long', 'abcdef', 'xy')
+    assert cache.get_rendered('long') == (b'<xy>', None)
+    assert cache.stats()['hits'] == 4 and cache.stats()['misses'] == 1
@@ -4,6 +4,7 @@ Contains modular components for prompt analysis and transformation
 """
 
 from .validators import validate_prompt, get_cache_key
+from .rules import get_rules, scan_keywords
 from .context_detector import detect_context
 from .language_detector import detect_language
 from .solution_builder import build_expected_solution
@@ -12,6 +13,8 @@ from .prompt_analyzer import transform_prompt_to_json
 __all__ = [
     'validate_prompt',
     'get_cache_key', 
+    'get_rules',
+    'scan_keywords',
     'detect_context',
     'detect_language',
     'build_expected_solution',
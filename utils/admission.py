@@ -0,0 +1,252 @@
+"""
+Admission control and per-client rate limiting for transformations
+"""
+
+import asyncio
+import contextlib
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class Overloaded(Exception):
+    """
+    A request was refused to protect the server.
+
+    Attributes:
+        status (int): HTTP status to answer with (429 or 503)
+        retry_after (int): Seconds the client should wait before retrying
+        reason (str): 'rate_limited', 'queue_full' or 'queue_timeout'
+    """
+
+    def __init__(self, message, status, retry_after, reason):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class _Waiter:
+    """A queued request; release() grants it a slot and calls wake()"""
+
+    __slots__ = ('wake', 'granted')
+
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class AdmissionController:
+    """
+    Bounds concurrent transformations and the queue waiting for them.
+
+    Up to ``max_in_flight`` callers hold a slot at once; up to ``max_queue``
+    more wait in FIFO order, each for at most ``queue_timeout`` seconds.
+    Anyone beyond that is refused immediately with Overloaded, so overload
+    turns into fast 503s instead of long queues. A released slot is handed
+    straight to the oldest waiter.
+
+    ``slot`` serves threaded workers and ``slot_async`` serves event-loop
+    code; both share the same limits and queue.
+    """
+
+    def __init__(self, max_in_flight=4, max_queue=64, queue_timeout=2.0, retry_after=1):
+        """
+        Args:
+            max_in_flight (int): Concurrent slots
+            max_queue (int): Callers allowed to wait for a slot
+            queue_timeout (float): Maximum seconds a caller waits
+            retry_after (int): Retry-After seconds suggested when refusing
+        """
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._waiters = deque()
+        self._in_flight = 0
+        self._admitted = 0
+        self._rejected = 0
+        self._timeouts = 0
+
+    def _enter(self, wake):
+        """Take a slot (returns None) or join the queue (returns the waiter)"""
+        with self._lock:
+            if self._in_flight < self.max_in_flight:
+                self._in_flight += 1
+                self._admitted += 1
+                return None
+            if len(self._waiters) >= self.max_queue:
+                self._rejected += 1
+                raise Overloaded("Server is overloaded; please retry later", 503, self.retry_after, 'queue_full')
+            waiter = _Waiter(wake)
+            self._waiters.append(waiter)
+            return waiter
+
+    def _abandon(self, waiter, timed_out=True):
+        """Leave the queue; returns True if a slot was granted in the meantime"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            if timed_out:
+                self._timeouts += 1
+            return False
+
+    def _timed_out(self):
+        return Overloaded("Server is overloaded; please retry later", 503, self.retry_after, 'queue_timeout')
+
+    def release(self):
+        """Give up a slot, handing it to the oldest waiter if there is one"""
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self._admitted += 1
+                waiter.wake()
+                return
+            self._in_flight -= 1
+
+    @contextlib.contextmanager
+    def slot(self):
+        """
+        Hold a slot for the duration of the block, waiting in the queue if needed.
+
+        Raises:
+            Overloaded: If the queue is full or the wait times out
+        """
+        event = threading.Event()
+        waiter = self._enter(event.set)
+        if waiter is not None and not event.wait(self.queue_timeout) and not self._abandon(waiter):
+            raise self._timed_out()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self):
+        """
+        Async counterpart of slot(); waiting does not block the event loop.
+
+        Raises:
+            Overloaded: If the queue is full or the wait times out
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._enter(wake)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+            except asyncio.TimeoutError:
+                if not self._abandon(waiter):
+                    raise self._timed_out()
+            except asyncio.CancelledError:
+                if self._abandon(waiter, timed_out=False):
+                    self.release()
+                raise
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """
+        Report occupancy and counters.
+
+        ``saturation`` is the share of slots plus queue places in use: 1.0
+        means new misses are being refused.
+
+        Returns:
+            dict: in_flight, queued, limits, saturation, admitted, rejected, timeouts
+        """
+        with self._lock:
+            capacity = self.max_in_flight + self.max_queue
+            used = self._in_flight + len(self._waiters)
+            return {
+                "in_flight": self._in_flight,
+                "queued": len(self._waiters),
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "saturation": round(used / capacity, 4) if capacity else 1.0,
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "timeouts": self._timeouts
+            }
+
+
+class RateLimiter:
+    """
+    Per-client token buckets.
+
+    Each client earns ``rate`` tokens per second up to ``burst``, and every
+    request spends one. Only the ``max_clients`` most recently seen clients
+    are tracked; a forgotten client starts again with a full bucket.
+    """
+
+    def __init__(self, rate, burst, max_clients=10000, clock=time.monotonic):
+        """
+        Args:
+            rate (float): Tokens added per second (0 disables limiting)
+            burst (int): Bucket size
+            max_clients (int): Clients to track
+            clock (callable): Monotonic time source
+        """
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.max_clients = max_clients
+        self._clock = clock
+        self._buckets = OrderedDict()  # client -> [tokens, updated]
+        self._lock = threading.Lock()
+        self._limited = 0
+
+    def check(self, client):
+        """
+        Spend a token for a client's request.
+
+        Args:
+            client (str): Client identity (e.g. its address)
+
+        Raises:
+            Overloaded: With status 429 when the client's bucket is empty
+        """
+        if not self.rate:
+            return
+        now = self._clock()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [float(self.burst), now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return
+            self._limited += 1
+            retry_after = max(1, math.ceil((1 - bucket[0]) / self.rate))
+        raise Overloaded("Rate limit exceeded; please slow down", 429, retry_after, 'rate_limited')
+
+    def stats(self):
+        """
+        Report limiter settings and counters.
+
+        Returns:
+            dict: rate, burst, tracked clients and limited requests
+        """
+        with self._lock:
+            return {
+                "rate_per_second": self.rate,
+                "burst": self.burst,
+                "clients": len(self._buckets),
+                "limited": self._limited
+            }
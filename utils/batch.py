@@ -0,0 +1,129 @@
+"""
+Batch transformation with optional process-pool parallelism
+and vectorized scoring when NumPy is installed
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+
+from .prompt_analyzer import transform_prompt_to_json
+from .batch_scorer import HAS_NUMPY, transform_batch
+from .rules import get_rules, reload_rules_if_changed, use_rules, watched_rules
+
+# Shared pool, created on first use in each worker process that needs it
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+# Pool processes start from a clean interpreter rather than a fork of a
+# threaded server process, which could copy a lock some thread was holding
+_POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def _transform_one(prompt, rules=None):
+    """Transform one prompt, returning (result, error) instead of raising"""
+    try:
+        return transform_prompt_to_json(prompt, rules=rules), None
+    except Exception as e:
+        return None, str(e)
+
+
+def _transform_chunk(prompts, rules=None):
+    """Transform a chunk of prompts with the given rules (default: the active rules)"""
+    if HAS_NUMPY and len(prompts) > 1:
+        try:
+            return [(result, None) for result in transform_batch(prompts, rules)]
+        except Exception:
+            # Redo the chunk one prompt at a time so the error lands on its own item
+            pass
+    return [_transform_one(prompt, rules) for prompt in prompts]
+
+
+def _transform_pool_chunk(prompts, rules_version):
+    """
+    Transform a chunk inside a pool process.
+
+    Returns:
+        tuple: (version of the rules used, outcomes); the version differs from
+            ``rules_version`` when this process could not load the caller's rules
+    """
+    rules = get_rules()
+    if rules.version != rules_version:
+        # The caller saw a rule update this process has not picked up yet
+        reload_rules_if_changed(force=True)
+        rules = get_rules()
+    return rules.version, _transform_chunk(prompts, rules)
+
+
+def _get_executor(max_workers):
+    """Return the shared process pool, recreating it if the size changed"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != max_workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # Pool processes watch the same rule file as this process
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=multiprocessing.get_context(_POOL_START_METHOD),
+                initializer=use_rules, initargs=watched_rules())
+            _executor_workers = max_workers
+        return _executor
+
+
+def shutdown_executor():
+    """Shut down the shared process pool if one was started"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        executor, _executor, _executor_workers = _executor, None, 0
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def transform_many(prompts, max_workers=1, parallel_threshold=64, rules=None):
+    """
+    Transform a list of prompts, preserving order.
+    
+    Small batches run in the calling process; batches of at least
+    ``parallel_threshold`` prompts are split into chunks across a process pool.
+    With NumPy installed, each chunk is scored with one matrix product per
+    classifier (see batch_scorer); otherwise prompts are transformed one by one.
+    
+    Every result is computed with ``rules``. A chunk that a pool process
+    transformed under another rule version (around a hot reload) is redone
+    in the calling process, so callers can cache the results under a key
+    for ``rules.version``.
+    
+    Args:
+        prompts (list): Prompt strings (already validated)
+        max_workers (int): Number of pool processes to use
+        parallel_threshold (int): Minimum batch size worth sending to the pool
+        rules (RuleSet, optional): Rules to apply (default: the active rules)
+        
+    Returns:
+        list: (result: dict or None, error: str or None) per prompt
+    """
+    if rules is None:
+        rules = get_rules()
+    if max_workers <= 1 or len(prompts) < parallel_threshold:
+        return _transform_chunk(prompts, rules)
+    
+    # A few chunks per worker keeps the pool balanced without per-item IPC
+    chunk_size = max(1, -(-len(prompts) // (max_workers * 4)))
+    chunks = [prompts[i:i + chunk_size] for i in range(0, len(prompts), chunk_size)]
+    
+    try:
+        executor = _get_executor(max_workers)
+        outcomes = []
+        for chunk, (version, chunk_outcomes) in zip(
+                chunks, executor.map(_transform_pool_chunk, chunks, repeat(rules.version))):
+            if version != rules.version:
+                chunk_outcomes = _transform_chunk(chunk, rules)
+            outcomes.extend(chunk_outcomes)
+        return outcomes
+    except BrokenProcessPool:
+        # A pool process died; drop the pool and finish in-process
+        shutdown_executor()
+        return _transform_chunk(prompts, rules)
@@ -0,0 +1,193 @@
+"""
+Vectorized context and language scoring for batches of prompts
+
+A batch's keyword hits are unpacked from their fingerprints into a 0/1 hit
+matrix, and one matrix product per classifier replaces the per-prompt loops
+over the rule tables. NumPy is optional: without it HAS_NUMPY is False and
+callers keep using the scalar detectors.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .rules import PATTERN_FIELDS, get_rules
+from .text_chunks import iter_lower_chunks
+from .language_detector import score_language, describe_language
+from .solution_builder import build_expected_solution
+from .prompt_analyzer import fingerprint_cache, RESULT_KEYS
+
+HAS_NUMPY = np is not None
+
+
+class BatchScorer:
+    """
+    Weight matrices compiled from one RuleSet.
+
+    Row i of each matrix belongs to the matcher's i-th pattern (bit i of a
+    fingerprint) and column j to the j-th context or language in rule order.
+    A context cell counts how often the pattern appears in that context's
+    keyword list; a language cell sums the rule weight of every list the
+    pattern appears in, exclude penalties included. Multiplying a hit
+    matrix by them gives exactly the scores the scalar detectors add up,
+    and np.argmax returns the first maximum, which is the dict-order
+    tie-break that ``max()`` applies to the scalar score dicts.
+    """
+
+    def __init__(self, rules):
+        """
+        Args:
+            rules (RuleSet): Rules to compile
+        """
+        self.rules = rules
+        self.width = len(rules.matcher.patterns)
+        index = {pattern: i for i, pattern in enumerate(rules.matcher.patterns)}
+
+        self.contexts = list(rules.context_keywords)
+        self.context_weights = np.zeros((self.width, len(self.contexts)), dtype=np.int64)
+        for column, keywords in enumerate(rules.context_keywords.values()):
+            for keyword in keywords:
+                self.context_weights[index[keyword], column] += 1
+
+        # Integer sums are exact in any order; float weights could round
+        # differently from the scalar loop and flip a tie, so they stay scalar
+        weights = rules.language_weights
+        self.exact_language = all(isinstance(weight, int) for weight in weights.values())
+        self.languages = list(rules.language_patterns)
+        self.language_weights = np.zeros((self.width, len(self.languages)), dtype=np.int64)
+        if self.exact_language:
+            for column, pattern in enumerate(rules.language_patterns.values()):
+                for field in PATTERN_FIELDS:
+                    for word in pattern[field]:
+                        self.language_weights[index[word], column] += weights[field]
+
+    def hit_matrix(self, masks):
+        """
+        Unpack fingerprints into a hit matrix.
+
+        Args:
+            masks (list): Fingerprints from the rule set's matcher
+
+        Returns:
+            numpy.ndarray: uint8 array of shape (len(masks), patterns)
+        """
+        nbytes = max(1, -(-self.width // 8))
+        packed = np.frombuffer(b''.join(mask.to_bytes(nbytes, 'little') for mask in masks), dtype=np.uint8)
+        return np.unpackbits(packed.reshape(len(masks), nbytes), axis=1, count=self.width, bitorder='little')
+
+    @staticmethod
+    def _best(scores, names):
+        """Name of the first highest-scoring column per row, or None if no score is positive"""
+        best = scores.argmax(axis=1)
+        positive = scores[np.arange(len(best)), best] > 0
+        return [names[column] if found else None for column, found in zip(best.tolist(), positive.tolist())]
+
+    def classify(self, masks, hit_sets):
+        """
+        Score a batch of hit sets.
+
+        Args:
+            masks (list): Fingerprints of the hit sets
+            hit_sets (list): The hit sets themselves, in the same order
+
+        Returns:
+            tuple: (contexts: list of str, languages: list of str or None),
+                   equal to detect_context() and score_language() per hit set
+        """
+        if not masks:
+            return [], []
+        rules = self.rules
+        hits = self.hit_matrix(masks)
+
+        contexts = [
+            rules.context_descriptions[name] if name is not None else rules.default_context
+            for name in self._best(hits @ self.context_weights, self.contexts)
+        ]
+        if self.exact_language:
+            languages = self._best(hits @ self.language_weights, self.languages)
+        else:
+            languages = [score_language(hit_set, rules) for hit_set in hit_sets]
+        return contexts, languages
+
+
+# Scorer for the most recently used rule set
+_scorer = None
+
+
+def get_scorer(rules):
+    """
+    Return the BatchScorer compiled from a rule set, building it on first use.
+
+    Args:
+        rules (RuleSet): Rules to score with
+
+    Returns:
+        BatchScorer: Scorer for those rules
+    """
+    global _scorer
+    scorer = _scorer
+    if scorer is None or scorer.rules is not rules:
+        scorer = _scorer = BatchScorer(rules)
+    return scorer
+
+
+def transform_batch(prompts, rules=None, memoize=True):
+    """
+    Transform a list of prompts with vectorized scoring.
+
+    Gives the same results as calling transform_prompt_to_json() on each
+    prompt. Each distinct keyword combination is looked up in, and added
+    to, the shared fingerprint cache once; the remaining ones are scored
+    together.
+
+    Args:
+        prompts (list): Prompt strings (already validated)
+        rules (RuleSet, optional): Rules to apply (default: the active rules)
+        memoize (bool): Use the fingerprint cache; False scores every
+            combination afresh (for equivalence checks)
+
+    Returns:
+        list: Result dict per prompt, in order
+
+    Raises:
+        RuntimeError: If NumPy is not installed
+    """
+    if not HAS_NUMPY:
+        raise RuntimeError("transform_batch requires NumPy")
+    if rules is None:
+        rules = get_rules()
+    matcher = rules.matcher
+
+    masks = []
+    derived = {}
+    pending = {}
+    for prompt in prompts:
+        hits = matcher.scan_chunks(iter_lower_chunks(prompt))
+        mask = matcher.fingerprint(hits)
+        masks.append(mask)
+        if mask not in derived and mask not in pending:
+            cached = fingerprint_cache.get((rules.version, mask)) if memoize else None
+            if cached is not None:
+                derived[mask] = cached
+            else:
+                pending[mask] = hits
+
+    pending_masks = list(pending)
+    contexts, languages = get_scorer(rules).classify(pending_masks, list(pending.values()))
+    for mask, context, language in zip(pending_masks, contexts, languages):
+        hits = pending[mask]
+        output_format, tech_details = describe_language(hits, language, rules)
+        derived[mask] = {
+            "context": context,
+            "expected_solution": build_expected_solution(context, tech_details, None, hits, rules),
+            "output_format": output_format
+        }
+        if memoize:
+            fingerprint_cache.set((rules.version, mask), derived[mask])
+
+    results = []
+    for prompt, mask in zip(prompts, masks):
+        result = dict(derived[mask], problem=prompt.strip())
+        results.append({key: result[key] for key in RESULT_KEYS})
+    return results
@@ -0,0 +1,603 @@
+"""
+Bounded, thread-safe cache for transformation results
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """
+    Estimate the memory footprint of a cached value in bytes.
+
+    Counts the container plus its keys and values one level deep, which is
+    accurate for the flat dicts of strings produced by the transformer.
+
+    Args:
+        value: The value to measure
+
+    Returns:
+        int: Approximate size in bytes
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class LRUCache:
+    """
+    Least-recently-used cache with optional TTL and memory limit.
+
+    Stored values are treated as immutable: callers must copy a value before
+    changing it. All operations take a single lock, so one instance can be
+    shared between threads.
+
+    An optional codec stores values in another form: it provides
+    ``encode(value)``, ``decode(stored)``, ``size(stored, estimate_size)``
+    and ``stats()``, and get() returns decoded values.
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=None, ttl=None, clock=time.monotonic, codec=None):
+        """
+        Args:
+            max_entries (int): Maximum number of entries to keep
+            max_bytes (int, optional): Maximum estimated size of all values
+            ttl (float, optional): Seconds an entry stays valid after insertion
+            clock (callable): Monotonic time source
+            codec (optional): Converts values to and from their stored form
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes or None
+        self.ttl = ttl or None
+        self._clock = clock
+        self._codec = codec
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key):
+        """
+        Return the cached value for a key and mark it recently used.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            The cached value, or None on a miss or expired entry
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                self._remove(key, size)
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+        return value if self._codec is None else self._codec.decode(value)
+
+    def set(self, key, value):
+        """
+        Store a value, evicting least-recently-used entries as needed.
+
+        Args:
+            key (str): Cache key
+            value: Value to store (must not be mutated afterwards)
+        """
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        self._store(key, value, expires_at)
+
+    def _encode(self, value):
+        """Return (stored form, size) of a value"""
+        if self._codec is None:
+            return value, estimate_size(value)
+        value = self._codec.encode(value)
+        return value, self._codec.size(value, estimate_size)
+
+    def _store(self, key, value, expires_at):
+        value, size = self._encode(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        with self._lock:
+            self._insert(key, value, size, expires_at)
+
+    def _insert(self, key, value, size, expires_at):
+        """Add an encoded entry and evict as needed; the caller holds the lock"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+
+        self._entries[key] = (value, size, expires_at)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes):
+            oldest_key, (_, oldest_size, _) = next(iter(self._entries.items()))
+            self._remove(oldest_key, oldest_size)
+            self._evictions += 1
+
+    def compare_and_set(self, key, expected, value):
+        """
+        Replace an entry only if it still holds a value equal to ``expected``.
+
+        A replacement too large for the cache removes the entry instead.
+
+        Args:
+            key (str): Cache key
+            expected: Value the entry must hold
+            value: Value to store (must not be mutated afterwards)
+
+        Returns:
+            bool: False if the entry is missing, expired or holds another value
+        """
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        stored, size = self._encode(value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[2] is not None and entry[2] <= self._clock()):
+                return False
+            current = entry[0] if self._codec is None else self._codec.decode(entry[0])
+            if current != expected:
+                return False
+            if self.max_bytes is not None and size > self.max_bytes:
+                self._remove(key, entry[1])
+            else:
+                self._insert(key, stored, size, expires_at)
+            return True
+
+    def delete(self, key):
+        """
+        Remove an entry.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            bool: True if the key was present
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            self._remove(key, entry[1])
+            return True
+
+    def _remove(self, key, size):
+        del self._entries[key]
+        self._bytes -= size
+
+    def snapshot(self):
+        """
+        Return the live entries, least recently used first.
+
+        Returns:
+            list: (key, value, seconds_left) tuples; seconds_left is None without a TTL
+        """
+        with self._lock:
+            entries = list(self._entries.items())
+        now = self._clock()
+        decode = (lambda value: value) if self._codec is None else self._codec.decode
+        return [
+            (key, decode(value), None if expires_at is None else expires_at - now)
+            for key, (value, _, expires_at) in entries
+            if expires_at is None or expires_at > now
+        ]
+
+    def restore(self, entries):
+        """
+        Insert entries produced by snapshot(), keeping their order and remaining TTL.
+
+        Args:
+            entries (iterable): (key, value, seconds_left) tuples, least recently used first
+
+        Returns:
+            int: Number of entries inserted
+        """
+        now = self._clock()
+        restored = 0
+        for key, value, seconds_left in entries:
+            if seconds_left is not None and seconds_left <= 0:
+                continue
+            if self.ttl is not None:
+                seconds_left = self.ttl if seconds_left is None else min(seconds_left, self.ttl)
+            self._store(key, value, None if seconds_left is None else now + seconds_left)
+            restored += 1
+        return restored
+
+    def clear(self):
+        """Remove all entries; counters are kept"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Return cache counters and occupancy.
+
+        Returns:
+            dict: Entry/byte counts, limits, and hit/miss/eviction counters
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "bytes_per_entry": round(self._bytes / len(self._entries), 1) if self._entries else 0.0,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0
+            }
+        if self._codec is not None:
+            # Strings shared by all entries, not included in "bytes"
+            stats["interned"] = self._codec.stats()
+        return stats
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    LRU cache stored in a SQLite file shared by every worker on a host.
+
+    Gunicorn workers (and recycled replacements) open the same database, so
+    entries survive --max-requests restarts and clear() empties the cache for
+    all of them. Values must be JSON-serializable.
+
+    Lookups only read, so they run concurrently in WAL mode and never wait
+    for SQLite's write lock:
+
+    - Recency is coarse. A hit on an entry not touched for ``touch_interval``
+      seconds is remembered in this process, and its last_access is written
+      by the next set(), just before evicting.
+    - Hit, miss, eviction and expiration counters are kept per process
+      (``/metrics`` sums lookups across workers).
+    - Entry count and total size live in a one-row totals table kept up to
+      date by triggers, so set() does not count the table to decide whether
+      to evict.
+
+    With a ``renderer``, set() also stores the bytes a hit is served as
+    (and their gzipped form), and get_rendered() returns them without
+    decoding the value.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS cache_entries ("
+        " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+        " expires_at REAL, last_access REAL NOT NULL, body BLOB, gzipped BLOB)",
+        "CREATE INDEX IF NOT EXISTS cache_entries_lru ON cache_entries (last_access)",
+        "CREATE TABLE IF NOT EXISTS cache_totals ("
+        " id INTEGER PRIMARY KEY CHECK (id = 0), entries INTEGER NOT NULL, bytes INTEGER NOT NULL)",
+        # Databases created before the totals table start from a full count
+        "INSERT OR IGNORE INTO cache_totals"
+        " SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries",
+        "CREATE TRIGGER IF NOT EXISTS cache_entries_insert AFTER INSERT ON cache_entries BEGIN"
+        " UPDATE cache_totals SET entries = entries + 1, bytes = bytes + NEW.size; END",
+        "CREATE TRIGGER IF NOT EXISTS cache_entries_delete AFTER DELETE ON cache_entries BEGIN"
+        " UPDATE cache_totals SET entries = entries - 1, bytes = bytes - OLD.size; END",
+        "CREATE TRIGGER IF NOT EXISTS cache_entries_resize AFTER UPDATE OF size ON cache_entries BEGIN"
+        " UPDATE cache_totals SET bytes = bytes - OLD.size + NEW.size; END",
+    )
+    # Columns added since the table was first created, for older databases
+    _ADDED_COLUMNS = (("body", "BLOB"), ("gzipped", "BLOB"))
+    _COUNTERS = ("hits", "misses", "evictions", "expirations")
+    # Hits remembered for the next set(); beyond this many, the oldest are dropped
+    _MAX_PENDING_TOUCHES = 10000
+
+    def __init__(self, path, max_entries=1000, max_bytes=None, ttl=None, clock=time.time, touch_interval=10.0,
+                 renderer=None):
+        """
+        Args:
+            path (str): Database file shared by all workers
+            max_entries (int): Maximum number of entries to keep
+            max_bytes (int, optional): Maximum total size of serialized values
+                and rendered bodies
+            ttl (float, optional): Seconds an entry stays valid after insertion
+            clock (callable): Wall-clock time source (shared across processes)
+            touch_interval (float): Seconds before a hit refreshes an entry's recency
+            renderer (callable, optional): Maps a value to the (body, gzipped)
+                bytes stored with it; gzipped may be None
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes or None
+        self.ttl = ttl or None
+        self.touch_interval = touch_interval
+        self.renderer = renderer
+        self._clock = clock
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._touches = OrderedDict()  # key -> time of the hit, not yet written
+        self._counters = dict.fromkeys(self._COUNTERS, 0)
+
+    def _connection(self):
+        """Return this thread's connection, reopening after a fork"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                for statement in self._SCHEMA:
+                    conn.execute(statement)
+            self._add_columns(conn)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _add_columns(self, conn):
+        present = {row[1] for row in conn.execute("PRAGMA table_info(cache_entries)")}
+        for name, kind in self._ADDED_COLUMNS:
+            if name in present:
+                continue
+            try:
+                with conn:
+                    conn.execute(f"ALTER TABLE cache_entries ADD COLUMN {name} {kind}")
+            except sqlite3.OperationalError as e:
+                # Another worker added it first
+                if "duplicate column" not in str(e):
+                    raise
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _lookup(self, key, columns):
+        """Return the given columns of a live entry, counting the lookup"""
+        now = self._clock()
+        row = self._connection().execute(
+            f"SELECT {columns}, expires_at, last_access FROM cache_entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+
+        expires_at, last_access = row[-2:]
+        if expires_at is not None and expires_at <= now:
+            # Left for set() to overwrite or evict, so lookups never write
+            with self._lock:
+                self._counters["expirations"] += 1
+                self._counters["misses"] += 1
+            return None
+
+        with self._lock:
+            self._counters["hits"] += 1
+            if now - last_access >= self.touch_interval:
+                self._touches[key] = now
+                self._touches.move_to_end(key)
+                if len(self._touches) > self._MAX_PENDING_TOUCHES:
+                    self._touches.popitem(last=False)
+        return row[:-2]
+
+    def get(self, key):
+        """
+        Return the cached value for a key.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            The cached value, or None on a miss or expired entry
+        """
+        row = self._lookup(key, "value")
+        return None if row is None else json.loads(row[0])
+
+    def get_rendered(self, key):
+        """
+        Return the bytes the renderer stored for a key.
+
+        Entries written without them (before a renderer was configured) are
+        rendered from their value on each hit.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            tuple: (body, gzipped), or None on a miss or expired entry
+        """
+        row = self._lookup(key, "body, gzipped, CASE WHEN body IS NULL THEN value END")
+        if row is None:
+            return None
+        body, gzipped, value = row
+        if body is None:
+            return self.renderer(json.loads(value))
+        return body, gzipped
+
+    def _encode(self, value):
+        """Return the columns stored for a value: (payload, body, gzipped, size)"""
+        payload = json.dumps(value, separators=(',', ':'))
+        body = gzipped = None
+        if self.renderer is not None:
+            body, gzipped = self.renderer(value)
+        size = len(payload) + len(body or b'') + len(gzipped or b'')
+        return payload, body, gzipped, size
+
+    def _flush_touches(self, conn):
+        """Write the recency of entries hit since the last set()"""
+        with self._lock:
+            touches, self._touches = self._touches, OrderedDict()
+        if touches:
+            conn.executemany("UPDATE cache_entries SET last_access = ? WHERE key = ? AND last_access < ?",
+                             [(when, key, when) for key, when in touches.items()])
+
+    def set(self, key, value):
+        """
+        Store a value, evicting least-recently-used entries as needed.
+
+        Args:
+            key (str): Cache key
+            value: JSON-serializable value to store
+        """
+        payload, body, gzipped, size = self._encode(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        conn = self._connection()
+        now = self._clock()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with conn:
+            # An upsert (not INSERT OR REPLACE) so the totals triggers see a resize
+            conn.execute(
+                "INSERT INTO cache_entries (key, value, size, expires_at, last_access, body, gzipped)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET"
+                " value = excluded.value, size = excluded.size, expires_at = excluded.expires_at,"
+                " last_access = excluded.last_access, body = excluded.body, gzipped = excluded.gzipped",
+                (key, payload, size, expires_at, now, body, gzipped))
+            self._flush_touches(conn)
+            self._evict(conn)
+
+    def compare_and_set(self, key, expected, value):
+        """
+        Replace an entry only if it still holds a value equal to ``expected``.
+
+        The check and the write are one UPDATE, so concurrent callers in
+        any worker cannot both succeed. Values are compared in their JSON
+        form. A replacement too large for the cache removes the entry instead.
+
+        Args:
+            key (str): Cache key
+            expected: JSON-serializable value the entry must hold
+            value: JSON-serializable value to store
+
+        Returns:
+            bool: False if the entry is missing, expired or holds another value
+        """
+        current = json.dumps(expected, separators=(',', ':'))
+        payload, body, gzipped, size = self._encode(value)
+        conn = self._connection()
+        now = self._clock()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        unexpired = "key = ? AND value = ? AND (expires_at IS NULL OR expires_at > ?)"
+        with conn:
+            if self.max_bytes is not None and size > self.max_bytes:
+                return conn.execute(f"DELETE FROM cache_entries WHERE {unexpired}",
+                                    (key, current, now)).rowcount == 1
+            replaced = conn.execute(
+                "UPDATE cache_entries SET value = ?, size = ?, expires_at = ?, last_access = ?,"
+                f" body = ?, gzipped = ? WHERE {unexpired}",
+                (payload, size, expires_at, now, body, gzipped, key, current, now)).rowcount == 1
+            if replaced:
+                self._evict(conn)
+        return replaced
+
+    def delete(self, key):
+        """
+        Remove an entry for every worker.
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            bool: True if the key was present
+        """
+        conn = self._connection()
+        with conn:
+            return conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,)).rowcount == 1
+
+    def _totals(self, conn):
+        return conn.execute("SELECT entries, bytes FROM cache_totals").fetchone()
+
+    def _evict(self, conn):
+        count, total = self._totals(conn)
+        if count <= self.max_entries and (self.max_bytes is None or total <= self.max_bytes):
+            return
+
+        # Expired entries are never touched, so they age out here too
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM cache_entries ORDER BY last_access"):
+            if count <= self.max_entries and (self.max_bytes is None or total <= self.max_bytes):
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        conn.executemany("DELETE FROM cache_entries WHERE key = ?", victims)
+        self._count("evictions", len(victims))
+
+    def clear(self):
+        """Remove all entries for every worker; counters are kept"""
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM cache_entries")
+        with self._lock:
+            self._touches.clear()
+
+    def stats(self):
+        """
+        Return host-wide occupancy and this process's counters.
+
+        Returns:
+            dict: Entry/byte counts, limits, and hit/miss/eviction counters
+        """
+        count, total = self._totals(self._connection())
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "entries": count,
+            "bytes": total,
+            "bytes_per_entry": round(total / count, 1) if count else 0.0,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": counters["hits"],
+            "misses": counters["misses"],
+            "evictions": counters["evictions"],
+            "expirations": counters["expirations"],
+            "hit_ratio": round(counters["hits"] / lookups, 4) if lookups else 0.0
+        }
+
+    def __len__(self):
+        return self._totals(self._connection())[0]
+
+
+def create_cache(backend='memory', path=None, max_entries=1000, max_bytes=None, ttl=None, codec=None,
+                 renderer=None):
+    """
+    Create a transformation cache for the configured backend.
+
+    Args:
+        backend (str): 'memory' (per-worker) or 'sqlite' (shared per host)
+        path (str, optional): Database file for the sqlite backend
+        max_entries (int): Maximum number of entries to keep
+        max_bytes (int, optional): Maximum estimated size of all values
+        ttl (float, optional): Seconds an entry stays valid after insertion
+        codec (optional): Compact stored form for the memory backend
+            (the sqlite backend always stores JSON)
+        renderer (callable, optional): Bytes to store with each value in the
+            sqlite backend (see SQLiteCache)
+
+    Returns:
+        LRUCache or SQLiteCache
+    """
+    if backend == 'memory':
+        return LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl, codec=codec)
+    if backend == 'sqlite':
+        return SQLiteCache(path, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl, renderer=renderer)
+    raise ValueError(f"Unknown cache backend: {backend!r}")
@@ -0,0 +1,281 @@
+"""
+On-disk snapshots of the in-memory transformation cache
+
+A snapshot is a gzip-compressed JSON document holding the live entries in
+LRU order with their remaining TTL, tagged with the rule version they were
+computed under. Cache keys start with "<rule version>:", so only entries for
+the current rules are written, and a snapshot taken under other rules is
+discarded on load.
+"""
+
+import fcntl
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+def _read_document(path):
+    """Parse a snapshot file, or return None if there is none"""
+    try:
+        f = gzip.open(path, 'rt', encoding='utf-8')
+    except FileNotFoundError:
+        return None
+    with f:
+        try:
+            document = json.load(f)
+        except (EOFError, gzip.BadGzipFile) as e:
+            raise ValueError(f"Corrupt snapshot: {e}")
+    if not isinstance(document, dict) or document.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("Unsupported snapshot format")
+    return document
+
+
+def save_snapshot(cache, path, version, max_entries=None):
+    """
+    Write the cache's entries for one rule version to a snapshot file.
+
+    Entries already in the file for the same version are kept ahead of the
+    cache's own (which count as more recent), so workers sharing one file
+    build up a host-wide snapshot instead of overwriting each other. Saves
+    hold an exclusive lock on ``<path>.lock`` from reading the file to
+    replacing it, so concurrent saves cannot drop each other's entries. The
+    file is written under a temporary name and renamed into place, so
+    readers never see a partial snapshot.
+
+    Args:
+        cache (LRUCache): Cache to snapshot
+        path (str): Snapshot file
+        version (str): Rule version whose entries are kept
+        max_entries (int, optional): Keep at most this many of the most recent entries
+
+    Returns:
+        int: Number of entries written
+    """
+    with open(f"{path}.lock", 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return _merge_and_write(cache, path, version, max_entries)
+
+
+def _merge_and_write(cache, path, version, max_entries):
+    """Merge the cache into the snapshot file; the caller holds the lock"""
+    prefix = f"{version}:"
+    merged = {}
+    try:
+        previous = _read_document(path)
+    except (OSError, ValueError):
+        previous = None  # An unreadable snapshot is simply overwritten
+    if previous is not None and previous.get("rules_version") == version:
+        saved_at = previous.get("saved_at") or time.time()
+        elapsed = max(0.0, time.time() - saved_at)
+        for key, value, seconds_left in previous["entries"]:
+            if seconds_left is not None:
+                seconds_left -= elapsed
+                if seconds_left <= 0:
+                    continue
+            merged[key] = [key, value, seconds_left]
+    for key, value, seconds_left in cache.snapshot():
+        if key.startswith(prefix):
+            merged.pop(key, None)
+            merged[key] = [key, value, seconds_left]
+
+    entries = list(merged.values())
+    if max_entries is not None:
+        entries = entries[-max_entries:]
+    document = {
+        "format": SNAPSHOT_FORMAT,
+        "rules_version": version,
+        "saved_at": time.time(),
+        "entries": entries
+    }
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=1) as f:
+            json.dump(document, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(entries)
+
+
+def load_snapshot(cache, path, version):
+    """
+    Restore entries from a snapshot file into a cache.
+
+    Args:
+        cache (LRUCache): Cache to fill
+        path (str): Snapshot file
+        version (str): Active rule version; a snapshot for another version is ignored
+
+    Returns:
+        int: Number of entries restored (0 if the file is missing or stale)
+
+    Raises:
+        OSError: If the file exists but cannot be read
+        ValueError: If it is not a valid snapshot
+    """
+    document = _read_document(path)
+    if document is None:
+        return 0
+    if document.get("rules_version") != version:
+        logger.info("Discarding cache snapshot %s for rules %s (active: %s)",
+                    path, document.get("rules_version"), version)
+        return 0
+
+    prefix = f"{version}:"
+    return cache.restore(
+        (key, value, seconds_left) for key, value, seconds_left in document["entries"]
+        if key.startswith(prefix)
+    )
+
+
+def _file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+class CacheSnapshotter:
+    """
+    Periodically snapshots a cache and restores it on boot.
+
+    The background thread belongs to the process that started it: after a
+    fork, ensure_started() starts a new one in the child, and stop() only
+    flushes in a process that has been serving (so a preloading master
+    never overwrites its workers' snapshots with its boot-time cache).
+    """
+
+    def __init__(self, cache, path, interval, version):
+        """
+        Args:
+            cache (LRUCache): Cache to snapshot
+            path (str): Snapshot file
+            interval (float): Seconds between snapshots (0 saves only on stop)
+            version (callable): Returns the active rule version
+        """
+        self.cache = cache
+        self.path = path
+        self.interval = interval
+        self._version = version
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._owner_pid = None
+        self._stamp = None  # File state last restored from or written
+        self._stats = {
+            "restored": 0, "restore_seconds": 0.0,
+            "saves": 0, "saved_entries": 0, "last_save_seconds": 0.0, "last_saved_at": None,
+            "errors": 0
+        }
+
+    def restore(self):
+        """
+        Load the snapshot file unless this process already has its contents.
+
+        Errors are logged, counted and otherwise ignored, so a bad snapshot
+        only means a cold start.
+
+        Returns:
+            tuple: (entries restored, seconds taken)
+        """
+        with self._lock:
+            stamp = _file_stamp(self.path)
+            if stamp is None or stamp == self._stamp:
+                return 0, 0.0
+            started = time.perf_counter()
+            try:
+                restored = load_snapshot(self.cache, self.path, self._version())
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring cache snapshot %s: %s", self.path, e)
+                self._stats["errors"] += 1
+                return 0, 0.0
+            seconds = time.perf_counter() - started
+            self._stamp = stamp
+            self._stats["restored"] += restored
+            self._stats["restore_seconds"] += seconds
+        logger.info("Restored %d cache entries from %s in %.1f ms", restored, self.path, seconds * 1000)
+        return restored, seconds
+
+    def save(self):
+        """
+        Write a snapshot now.
+
+        Returns:
+            int: Number of entries written, or None if writing failed
+        """
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                saved = save_snapshot(self.cache, self.path, self._version(),
+                                      getattr(self.cache, 'max_entries', None))
+            except OSError as e:
+                logger.warning("Cannot write cache snapshot %s: %s", self.path, e)
+                self._stats["errors"] += 1
+                return None
+            self._stamp = _file_stamp(self.path)
+            self._stats.update(
+                saves=self._stats["saves"] + 1, saved_entries=saved,
+                last_save_seconds=round(time.perf_counter() - started, 6), last_saved_at=time.time())
+        return saved
+
+    def ensure_started(self):
+        """Start the periodic snapshot thread in this process if it is not running"""
+        if self._owner_pid == os.getpid():
+            return
+        with self._lock:
+            if self._owner_pid == os.getpid():
+                return
+            self._owner_pid = os.getpid()
+            self._stop = threading.Event()
+            if self.interval > 0:
+                self._thread = threading.Thread(target=self._run, name='cache-snapshot', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        stop = self._stop
+        while not stop.wait(self.interval):
+            self.save()
+
+    def stop(self):
+        """
+        Stop the snapshot thread and flush a final snapshot.
+
+        Does nothing in a process that never served requests.
+
+        Returns:
+            int: Number of entries flushed, or None if nothing was written
+        """
+        if self._owner_pid != os.getpid():
+            return None
+        self._owner_pid = None
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+        saved = self.save()
+        if saved is not None:
+            logger.info("Flushed %d cache entries to %s", saved, self.path)
+        return saved
+
+    def stats(self):
+        """
+        Return snapshot settings and counters.
+
+        Returns:
+            dict: Path, interval, restored entries/time and save counters
+        """
+        with self._lock:
+            stats = dict(self._stats, path=self.path, interval_seconds=self.interval)
+        stats["restore_seconds"] = round(stats["restore_seconds"], 6)
+        return stats
@@ -0,0 +1,170 @@
+"""
+Compact in-memory form of transformation results
+
+A result's context, expected_solution and output_format come from a small
+set of rule-derived strings, while only the problem text is unique per
+prompt. Cached results are therefore stored as a CompactResult holding
+string-table indices plus the problem, and expanded back into a dict when
+they are read.
+"""
+
+import sys
+import threading
+
+from .prompt_analyzer import RESULT_KEYS
+
+
+class StringTable:
+    """
+    Append-only table assigning each distinct string a small integer.
+
+    Lookups by index are lock-free; only adding a new string takes the lock.
+    The table stops growing at max_strings, after which new strings are
+    returned unchanged and stored inline by the caller.
+    """
+
+    def __init__(self, max_strings=65536):
+        """
+        Args:
+            max_strings (int): Most strings to intern
+        """
+        self.max_strings = max_strings
+        self._strings = []
+        self._index = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def intern(self, text):
+        """
+        Return the index of a string, adding it if needed.
+
+        Args:
+            text (str): String to intern
+
+        Returns:
+            int or str: Its index, or the string itself when the table is full
+        """
+        index = self._index.get(text)
+        if index is not None:
+            return index
+        with self._lock:
+            index = self._index.get(text)
+            if index is None:
+                if len(self._strings) >= self.max_strings:
+                    return text
+                index = len(self._strings)
+                self._strings.append(text)
+                self._index[text] = index
+                self._bytes += sys.getsizeof(text)
+        return index
+
+    def lookup(self, value):
+        """Return the string for a value from intern()"""
+        return self._strings[value] if type(value) is int else value
+
+    def stats(self):
+        """
+        Return the table's size.
+
+        Returns:
+            dict: Number of strings, their total size in bytes, and the limit
+        """
+        return {"strings": len(self._strings), "bytes": self._bytes, "max_strings": self.max_strings}
+
+    def __len__(self):
+        return len(self._strings)
+
+
+class CompactResult:
+    """A cached result: string-table indices for the derived fields plus the problem text"""
+
+    __slots__ = ('context', 'expected_solution', 'output_format', 'problem')
+
+    def __init__(self, context, expected_solution, output_format, problem):
+        self.context = context
+        self.expected_solution = expected_solution
+        self.output_format = output_format
+        self.problem = problem
+
+
+class ResultCodec:
+    """
+    Converts full transformation results to and from CompactResult.
+
+    Plug into LRUCache(codec=...). Values that are not full results, with
+    exactly RESULT_KEYS in order, are stored unchanged.
+    """
+
+    def __init__(self, max_strings=65536):
+        """
+        Args:
+            max_strings (int): Most distinct strings to intern
+        """
+        self.strings = StringTable(max_strings)
+
+    def encode(self, value):
+        """
+        Return the compact form of a result.
+
+        Args:
+            value: Value passed to the cache
+
+        Returns:
+            CompactResult, or the value itself if it is not a full result
+        """
+        if type(value) is not dict or tuple(value) != RESULT_KEYS:
+            return value
+        intern = self.strings.intern
+        return CompactResult(intern(value["context"]), intern(value["expected_solution"]),
+                             intern(value["output_format"]), value["problem"])
+
+    def decode(self, stored):
+        """
+        Expand a stored value back into the result dict.
+
+        Args:
+            stored: Value returned by encode()
+
+        Returns:
+            The original value (a new dict for compact results)
+        """
+        if type(stored) is not CompactResult:
+            return stored
+        lookup = self.strings.lookup
+        return {
+            "context": lookup(stored.context),
+            "problem": stored.problem,
+            "expected_solution": lookup(stored.expected_solution),
+            "output_format": lookup(stored.output_format)
+        }
+
+    def size(self, stored, estimate):
+        """
+        Return the bytes a stored value holds on its own.
+
+        Interned strings are shared by all entries and are reported by
+        stats() instead.
+
+        Args:
+            stored: Value returned by encode()
+            estimate (callable): Size function for values that are not compact
+
+        Returns:
+            int: Approximate size in bytes
+        """
+        if type(stored) is not CompactResult:
+            return estimate(stored)
+        size = sys.getsizeof(stored) + sys.getsizeof(stored.problem)
+        for value in (stored.context, stored.expected_solution, stored.output_format):
+            if type(value) is not int:
+                size += sys.getsizeof(value)
+        return size
+
+    def stats(self):
+        """
+        Return the shared string table's size.
+
+        Returns:
+            dict: Output of StringTable.stats()
+        """
+        return self.strings.stats()
@@ -0,0 +1,52 @@
+"""
+Output customization for transformation results
+"""
+
+from .prompt_analyzer import RESULT_KEYS
+
+DEFAULT_INCLUDE_KEYS = list(RESULT_KEYS)
+OUTPUT_STYLES = ('short', 'detailed')
+
+
+def apply_output_options(result, include_keys=None, output_style='detailed'):
+    """
+    Apply output style and key filtering to a transformation result.
+    
+    Args:
+        result (dict): Full result from transform_prompt_to_json
+        include_keys (list, optional): Keys to keep, in output order
+        output_style (str): 'short' or 'detailed'
+        
+    Returns:
+        dict: A new dict containing only the requested keys
+    """
+    if include_keys is None:
+        include_keys = DEFAULT_INCLUDE_KEYS
+    
+    filtered_result = {key: result[key] for key in include_keys if key in result}
+    
+    # Short style keeps only the first sentence of the expected solution
+    if output_style == 'short' and 'expected_solution' in filtered_result:
+        filtered_result['expected_solution'] = filtered_result['expected_solution'].split('.')[0] + '.'
+    
+    return filtered_result
+
+
+def validate_output_options(include_keys, output_style):
+    """
+    Validate customization options supplied by a client.
+    
+    Args:
+        include_keys: Requested keys (list of str)
+        output_style: Requested output style
+        
+    Returns:
+        tuple: (is_valid: bool, error_message: str or None)
+    """
+    if not isinstance(include_keys, list) or not all(isinstance(key, str) for key in include_keys):
+        return False, "'include_keys' must be a list of strings"
+    
+    if output_style not in OUTPUT_STYLES:
+        return False, f"'output_style' must be one of: {', '.join(OUTPUT_STYLES)}"
+    
+    return True, None
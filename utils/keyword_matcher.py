@@ -0,0 +1,146 @@
+"""
+Compiled multi-pattern keyword matcher shared by all detectors
+"""
+
+import re
+from collections import Counter
+
+
+class KeywordMatcher:
+    """
+    Find which of a fixed set of substrings occur in a text with one scan.
+
+    The patterns are compiled into a single trie-shaped regular expression
+    wrapped in a lookahead, so the regex engine visits every position once
+    and reports the longest pattern starting there. Any shorter pattern that
+    occurs inside a reported match is implied by it, which makes the hit set
+    identical to testing each pattern with ``in``.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(dict.fromkeys(patterns))
+        self.max_length = max((len(p) for p in self.patterns), default=0)
+        self._regex = re.compile(f"(?=({self._trie_regex(self.patterns)}))", re.DOTALL)
+        # One bit per pattern for compact hit-set fingerprints
+        self._bits = {pattern: 1 << index for index, pattern in enumerate(self.patterns)}
+        # Every pattern implies itself and all patterns it contains
+        self._implied = {
+            pattern: frozenset(other for other in self.patterns if other in pattern)
+            for pattern in self.patterns
+        }
+
+    @staticmethod
+    def _trie_regex(patterns):
+        trie = {}
+        for pattern in patterns:
+            node = trie
+            for char in pattern:
+                node = node.setdefault(char, {})
+            node[""] = {}
+        return KeywordMatcher._node_regex(trie)
+
+    @staticmethod
+    def _node_regex(node):
+        terminal = "" in node
+        branches = [re.escape(char) + KeywordMatcher._node_regex(child)
+                    for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # Optional tails are greedy, so the longest pattern wins at each position
+        return f"(?:{body})?" if terminal else body
+
+    def scan(self, text):
+        """
+        Scan a text once and return every pattern found in it.
+
+        Args:
+            text (str): Text to scan (already lowercased by the caller)
+
+        Returns:
+            frozenset: Patterns that occur as substrings of the text
+        """
+        return self._expand(set(self._regex.findall(text)))
+
+    def scan_chunks(self, chunks):
+        """
+        Scan a text supplied as consecutive pieces and return every pattern found.
+
+        Each piece is scanned together with the last ``max_length - 1``
+        characters of the previous one, so patterns spanning a boundary are
+        found while only one piece is held at a time.
+
+        Args:
+            chunks (iterable): Consecutive pieces of the text (already lowercased)
+
+        Returns:
+            frozenset: Patterns that occur as substrings of the joined text
+        """
+        findall = self._regex.findall
+        overlap = self.max_length - 1
+        longest = set()
+        tail = ""
+        for chunk in chunks:
+            window = tail + chunk if tail else chunk
+            longest.update(findall(window))
+            if overlap:
+                tail = window[-overlap:]
+        return self._expand(longest)
+
+    def count_longest(self, text, start=0, stop=None):
+        """
+        Count the longest pattern starting at each position in a range.
+
+        The longest match at a position depends only on the ``max_length``
+        characters from there, so after an edit only positions within
+        ``max_length - 1`` before the edited span need counting again.
+
+        Args:
+            text (str): Text to scan (already lowercased by the caller)
+            start (int): First start position to count
+            stop (int, optional): Position after the last one to count (default: len(text))
+
+        Returns:
+            Counter: Pattern -> number of positions where it is the longest match
+        """
+        if stop is None:
+            stop = len(text)
+        end = min(len(text), stop + self.max_length - 1)
+        return Counter(match.group(1) for match in self._regex.finditer(text, start, end)
+                       if match.start() < stop)
+
+    def hits_from_counts(self, counts):
+        """
+        Build the hit set from count_longest() totals.
+
+        Args:
+            counts (dict): Pattern -> positive count of longest matches
+
+        Returns:
+            frozenset: Patterns that occur in the text, as scan() returns them
+        """
+        return self._expand(set(counts))
+
+    def _expand(self, longest):
+        """Add every pattern implied by the longest matches"""
+        if not longest:
+            return frozenset()
+        implied = self._implied
+        return frozenset().union(*(implied[match] for match in longest))
+
+    def fingerprint(self, hits):
+        """
+        Encode a hit set as a bitmask over all patterns.
+
+        Args:
+            hits (frozenset): Patterns returned by scan()
+
+        Returns:
+            int: Bitmask with one bit set per matched pattern
+        """
+        bits = self._bits
+        mask = 0
+        for pattern in hits:
+            mask |= bits[pattern]
+        return mask
+
@@ -0,0 +1,381 @@
+"""
+In-process metrics with Prometheus text exposition
+
+Each process keeps its own metrics. MultiProcessMetrics aggregates the
+workers of one server through a shared directory, so every scrape sees
+the same totals whichever worker answers it.
+"""
+
+import fcntl
+import json
+import math
+import os
+import threading
+import time
+import uuid
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PROMPT_LENGTH_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 5000, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonically increasing count, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def state(self):
+        """Current values as JSON-serializable [label values, value] pairs"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    @staticmethod
+    def merge(states):
+        """Sum the states of several processes; returns {label values: value}"""
+        merged = {}
+        for state in states:
+            for key, value in state:
+                merged[tuple(key)] = merged.get(tuple(key), 0) + value
+        return merged
+
+    def samples(self, values=None):
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        return [(self.name, _format_labels(self.labelnames, key), value)
+                for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}  # labels -> [bucket counts..., sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * len(self.buckets) + [0.0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+                    break
+            series[-1] += value
+
+    def state(self):
+        """Current series as JSON-serializable [label values, bucket counts + sum] pairs"""
+        with self._lock:
+            return [[list(key), list(series)] for key, series in self._values.items()]
+
+    @staticmethod
+    def merge(states):
+        """Add up the series of several processes; returns {label values: series}"""
+        merged = {}
+        for state in states:
+            for key, series in state:
+                total = merged.setdefault(tuple(key), [0] * len(series))
+                for index, value in enumerate(series):
+                    total[index] += value
+        return merged
+
+    def samples(self, values=None):
+        if values is None:
+            with self._lock:
+                values = {key: list(series) for key, series in self._values.items()}
+        samples = []
+        for key, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+                samples.append((self.name + '_bucket', labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((self.name + '_sum', labels, series[-1]))
+            samples.append((self.name + '_count', labels, cumulative))
+        return samples
+
+
+class Gauge:
+    """Value read from a callback at scrape time"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, function):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = ()
+        self._function = function
+
+    def state(self):
+        """The callback's current value"""
+        return self._function()
+
+    def samples(self, values=None):
+        """One sample, or with ``values`` ({worker: value}) one per worker"""
+        if values is None:
+            return [(self.name, '', self._function())]
+        return [(self.name, _format_labels(('worker',), (worker,)), value)
+                for worker, value in sorted(values.items())]
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together for a /metrics endpoint"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, function):
+        return self._register(Gauge(name, documentation, function))
+
+    @property
+    def metrics(self):
+        return list(self._metrics)
+
+    def state(self):
+        """
+        Snapshot every metric's values for another process to merge.
+
+        Returns:
+            dict: Metric name -> state (JSON-serializable)
+        """
+        return {metric.name: metric.state() for metric in self._metrics}
+
+    def render(self, values=None):
+        """
+        Render all metrics in the Prometheus text exposition format.
+
+        Args:
+            values (dict, optional): Metric name -> merged values to render
+                instead of this process's own (see MultiProcessMetrics)
+
+        Returns:
+            str: Exposition text ending with a newline
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            samples = metric.samples() if values is None else metric.samples(values.get(metric.name, {}))
+            for name, labels, value in samples:
+                lines.append(f'{name}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class MultiProcessMetrics:
+    """
+    Aggregates a registry's metrics across the worker processes of a server.
+
+    Each worker writes its registry's state to its own file in a shared
+    directory every ``interval`` seconds, on exit, and just before it
+    answers a scrape. render() sums counters and histograms over all files,
+    so totals never go backwards whichever worker is scraped. Gauges are
+    reported per live worker with a ``worker`` label. Files of exited
+    workers (e.g. recycled by max_requests) are folded into one archive
+    file, keeping their counts while the directory stays small.
+
+    The directory must be emptied when the server starts
+    (clear_directory()), otherwise counts from the last run carry over.
+    """
+
+    ARCHIVE = 'archive.json'
+
+    def __init__(self, registry, directory, interval=5.0):
+        """
+        Args:
+            registry (MetricsRegistry): This process's metrics
+            directory (str): Directory shared by all workers of the server
+            interval (float): Seconds between writes of this worker's file
+        """
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._owner_pid = None
+        self._path = None
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def clear_directory(directory):
+        """Remove all worker files; call once when the server starts"""
+        if not os.path.isdir(directory):
+            return
+        for name in os.listdir(directory):
+            if name.endswith('.json'):
+                os.remove(os.path.join(directory, name))
+
+    def ensure_started(self):
+        """Start the periodic writer in this process if it is not running"""
+        if self._owner_pid == os.getpid():
+            return
+        with self._lock:
+            if self._owner_pid == os.getpid():
+                return
+            self._owner_pid = os.getpid()
+            # A random suffix keeps a reused pid from overwriting an exited worker's counts
+            self._path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.json")
+            if self.interval > 0:
+                threading.Thread(target=self._run, name='metrics-writer', daemon=True).start()
+
+    def _run(self):
+        owner = os.getpid()
+        while self._owner_pid == owner:
+            time.sleep(self.interval)
+            self.write()
+
+    def write(self):
+        """Write this worker's current state to its file"""
+        if self._owner_pid != os.getpid():
+            return
+        payload = {"pid": os.getpid(), "metrics": self.registry.state()}
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(payload, f, separators=(',', ':'))
+        os.replace(tmp_path, self._path)
+
+    def stop(self):
+        """Write the final state of a worker that has been serving"""
+        self.write()
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.directory, name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def collect(self):
+        """
+        Merge the states of all workers, archiving files of exited ones.
+
+        Returns:
+            dict: Metric name -> merged values for MetricsRegistry.render()
+        """
+        self.ensure_started()
+        self.write()
+        with open(os.path.join(self.directory, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive = self._read(self.ARCHIVE) or {"metrics": {}}
+            live = []
+            exited = []
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith('.json') or name == self.ARCHIVE:
+                    continue
+                payload = self._read(name)
+                if payload is None:
+                    continue
+                (live if _process_alive(payload["pid"]) else exited).append((name, payload))
+
+            if exited:
+                archive = {"metrics": self._merge([archive] + [payload for _, payload in exited],
+                                                  serializable=True)}
+                tmp_path = os.path.join(self.directory, self.ARCHIVE + '.tmp')
+                with open(tmp_path, 'w') as f:
+                    json.dump(archive, f, separators=(',', ':'))
+                os.replace(tmp_path, os.path.join(self.directory, self.ARCHIVE))
+                for name, _ in exited:
+                    os.remove(os.path.join(self.directory, name))
+
+        values = self._merge([archive] + [payload for _, payload in live])
+        for metric in self.registry.metrics:
+            if metric.kind == 'gauge':
+                values[metric.name] = {str(payload["pid"]): payload["metrics"][metric.name]
+                                       for _, payload in live if metric.name in payload["metrics"]}
+        return values
+
+    def _merge(self, payloads, serializable=False):
+        """Sum counters and histograms over payloads; gauges are left out"""
+        merged = {}
+        for metric in self.registry.metrics:
+            if metric.kind == 'gauge':
+                continue
+            values = metric.merge([payload["metrics"].get(metric.name, []) for payload in payloads])
+            merged[metric.name] = ([[list(key), value] for key, value in values.items()]
+                                   if serializable else values)
+        return merged
+
+    def render(self):
+        """Render the metrics of all workers in the Prometheus text format"""
+        return self.registry.render(self.collect())
+
+
+class StageTimer:
+    """
+    Context manager that adds elapsed seconds to ``timings[stage]``.
+
+    A None ``timings`` dict turns it into a no-op, so callers can time stages
+    unconditionally.
+    """
+
+    __slots__ = ('timings', 'stage', 'started')
+
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        if self.timings is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            elapsed = time.perf_counter() - self.started
+            self.timings[self.stage] = self.timings.get(self.stage, 0.0) + elapsed
+        return False
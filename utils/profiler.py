@@ -0,0 +1,192 @@
+"""
+In-process sampling profiler for live workers
+
+A background thread samples the stacks of all other threads at a fixed
+interval and counts them in the collapsed ("folded") format read by
+flamegraph.pl, speedscope and similar tools. Samples are wall-clock: a
+request waiting on a lock counts as much as one computing. Only stacks
+passing through this project's code are kept and daemon threads
+(housekeeping such as cache snapshots) are skipped, so idle server threads
+drop out and the time is attributed to app.py handlers and utils functions.
+
+The sampler needs the GIL to read other threads' stacks, and a busy thread
+only gives it up every sys.getswitchinterval() (5 ms by default), so
+requests shorter than that would never be caught mid-computation. The
+switch interval is therefore shortened to SWITCH_INTERVAL while a window
+runs; it only costs anything when the sampler is actually waiting.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# GIL switch interval in force during a profiling window
+SWITCH_INTERVAL = 0.0002
+
+
+def _frame_label(code, labels):
+    """'path:function', with paths relative to the project or the last two components elsewhere"""
+    label = labels.get(code)
+    if label is None:
+        filename = code.co_filename
+        if filename.startswith(PROJECT_ROOT + os.sep):
+            path = os.path.relpath(filename, PROJECT_ROOT)
+        else:
+            path = '/'.join(filename.replace(os.sep, '/').split('/')[-2:])
+        label = labels[code] = f"{path}:{code.co_name}"
+    return label
+
+
+class SamplingProfiler:
+    """
+    One profiling window at a time: start(), then read collapsed() or summary().
+
+    A window ends after ``seconds`` or after ``max_requests`` requests have
+    finished (reported through request_finished()), whichever comes first.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._done = threading.Event()
+        self._done.set()
+        self._stacks = Counter()
+        self._samples = 0
+        self._requests = 0
+        self._max_requests = None
+        self._started = None
+        self._finished = None
+        self._interval = None
+
+    @property
+    def running(self):
+        """True while a window is being sampled"""
+        return not self._done.is_set()
+
+    def start(self, seconds=10.0, max_requests=None, interval=0.01):
+        """
+        Start a profiling window in the background.
+
+        Args:
+            seconds (float): Maximum length of the window
+            max_requests (int, optional): Stop after this many requests finish
+            interval (float): Seconds between samples
+
+        Raises:
+            RuntimeError: If a window is already running
+        """
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A profile is already running")
+            self._stacks = Counter()
+            self._samples = 0
+            self._requests = 0
+            self._max_requests = max_requests
+            self._interval = interval
+            self._started = time.time()
+            self._finished = None
+            self._done.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(seconds, interval), name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+    def request_finished(self):
+        """Count a finished request towards max_requests"""
+        if not self.running:
+            return
+        with self._lock:
+            self._requests += 1
+            if self._max_requests is not None and self._requests >= self._max_requests:
+                self._done.set()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the current window to end.
+
+        Returns:
+            bool: True if no window is running any more
+        """
+        return self._done.wait(timeout)
+
+    def _run(self, seconds, interval):
+        me = threading.get_ident()
+        labels = {}
+        deadline = time.monotonic() + seconds
+        stacks = Counter()
+        samples = 0
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, SWITCH_INTERVAL))
+        try:
+            while not self._done.wait(interval) and time.monotonic() < deadline:
+                samples += 1
+                daemons = {thread.ident for thread in threading.enumerate() if thread.daemon}
+                for ident, frame in sys._current_frames().items():
+                    if ident == me or ident in daemons:
+                        continue
+                    names = []
+                    in_project = False
+                    while frame is not None:
+                        code = frame.f_code
+                        in_project = in_project or code.co_filename.startswith(PROJECT_ROOT)
+                        names.append(_frame_label(code, labels))
+                        frame = frame.f_back
+                    if in_project:
+                        names.reverse()
+                        stacks[';'.join(names)] += 1
+        finally:
+            sys.setswitchinterval(switch_interval)
+            with self._lock:
+                self._stacks = stacks
+                self._samples = samples
+                self._finished = time.time()
+                self._done.set()
+
+    def collapsed(self):
+        """
+        Return the last window's stacks in collapsed format.
+
+        Returns:
+            str: One "frame;frame;... count" line per distinct stack, root first
+        """
+        with self._lock:
+            stacks = self._stacks
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+    def summary(self, top=20):
+        """
+        Return window metadata and the functions with the most samples.
+
+        Args:
+            top (int): Number of functions to list
+
+        Returns:
+            dict: Window bounds and counts, plus "top" entries with the samples
+                  where a function was on the stack ("total") or running ("self")
+        """
+        with self._lock:
+            stacks = self._stacks
+            info = {
+                "running": self.running,
+                "started_at": self._started,
+                "finished_at": self._finished,
+                "interval_seconds": self._interval,
+                "samples": self._samples,
+                "requests": self._requests,
+                "pid": os.getpid()
+            }
+        total, self_time = Counter(), Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            self_time[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        info["stack_samples"] = sum(stacks.values())
+        info["top"] = [
+            {"function": frame, "total": count, "self": self_time[frame]}
+            for frame, count in total.most_common(top)
+        ]
+        return info
@@ -2,35 +2,118 @@
 Main prompt analyzer that orchestrates the transformation process
 """
 
+from .cache import LRUCache
+from .metrics import StageTimer
+from .rules import get_rules
+from .text_chunks import iter_lower_chunks
 from .context_detector import detect_context
 from .language_detector import detect_language
 from .solution_builder import build_expected_solution
 
+# Keys produced by a full transformation, in output order
+RESULT_KEYS = ('context', 'problem', 'expected_solution', 'output_format')
+DERIVED_KEYS = ('context', 'expected_solution', 'output_format')
 
-def transform_prompt_to_json(prompt):
+# Everything except "problem" depends only on which rule keywords matched, so
+# derived fields are memoized by rule version and hit-set fingerprint. Traffic
+# draws on a small set of keyword combinations, so this table stays small and hot.
+fingerprint_cache = LRUCache(max_entries=4096)
+
+
+def transform_prompt_to_json(prompt, include_keys=None, timings=None, rules=None):
     """
     Transform a plain text prompt into structured JSON using enhanced rule-based logic.
     
+    When ``include_keys`` is given, only the stages needed for those keys run:
+    ``output_format`` needs language detection only, ``context`` needs context
+    detection only, and ``expected_solution`` needs both plus the solution builder.
+    Derived fields are served from ``fingerprint_cache`` whenever another prompt
+    with the same keyword hits was seen before. The prompt is lowercased and
+    scanned in chunks, so time is linear in its length and working memory is
+    bounded by the chunk size.
+    
     Args:
         prompt (str): The input prompt text
+        include_keys (iterable, optional): Subset of RESULT_KEYS to compute
+        timings (dict, optional): Receives seconds spent per stage
+            ('scan', 'context', 'language', 'solution')
+        rules (RuleSet, optional): Rules to apply (default: the active rules)
         
     Returns:
         dict: Structured JSON with context, problem, expected_solution, output_format
+              (restricted to include_keys when given)
     """
-    prompt_lower = prompt.lower()
+    wanted = set(RESULT_KEYS) if include_keys is None else set(include_keys)
+    need_solution = 'expected_solution' in wanted
+    need_context = need_solution or 'context' in wanted
+    need_language = need_solution or 'output_format' in wanted
     
-    # Detect context
-    context = detect_context(prompt_lower)
+    result = {}
+    if need_context or need_language:
+        # One rule set for the whole transformation, even if a reload happens meanwhile
+        if rules is None:
+            rules = get_rules()
+        
+        # Scan the prompt once, lowercasing it chunk by chunk; every stage
+        # reads from the same hit set, so no whole lowercase copy is needed
+        with StageTimer(timings, 'scan'):
+            hits = rules.matcher.scan_chunks(iter_lower_chunks(prompt))
+            fingerprint = (rules.version, rules.matcher.fingerprint(hits))
+            derived = fingerprint_cache.get(fingerprint)
+        
+        if derived is not None:
+            result.update(derived)
+        else:
+            # Detect context
+            if need_context:
+                with StageTimer(timings, 'context'):
+                    result["context"] = detect_context(None, hits, rules)
+            
+            # Detect language and technology
+            if need_language:
+                with StageTimer(timings, 'language'):
+                    output_format, tech_details = detect_language(None, hits, rules)
+                result["output_format"] = output_format
+            
+            # Build expected solution
+            if need_solution:
+                with StageTimer(timings, 'solution'):
+                    result["expected_solution"] = build_expected_solution(
+                        result["context"], tech_details, None, hits, rules)
+                fingerprint_cache.set(fingerprint, {key: result[key] for key in DERIVED_KEYS})
     
-    # Detect language and technology
-    output_format, tech_details = detect_language(prompt_lower)
+    result["problem"] = prompt.strip()
+    return {key: result[key] for key in RESULT_KEYS if key in wanted}
+
+
+def transform_hits(prompt, hits, rules, timings=None):
+    """
+    Build the full result for a prompt whose keyword hits are already known.
     
-    # Build expected solution
-    expected_solution = build_expected_solution(context, tech_details, prompt_lower)
+    Gives the same result as transform_prompt_to_json(prompt, rules=rules)
+    when ``hits`` is the prompt's hit set, sharing the fingerprint cache, but
+    skips the scan; incremental sessions maintain the hits themselves.
+    
+    Args:
+        prompt (str): The input prompt text
+        hits (frozenset): Keywords matched in the lowercased prompt
+        rules (RuleSet): Rules the hits were found with
+        timings (dict, optional): Receives seconds spent per stage
+        
+    Returns:
+        dict: Structured JSON with context, problem, expected_solution, output_format
+    """
+    fingerprint = (rules.version, rules.matcher.fingerprint(hits))
+    derived = fingerprint_cache.get(fingerprint)
+    if derived is None:
+        with StageTimer(timings, 'context'):
+            context = detect_context(None, hits, rules)
+        with StageTimer(timings, 'language'):
+            output_format, tech_details = detect_language(None, hits, rules)
+        with StageTimer(timings, 'solution'):
+            expected_solution = build_expected_solution(context, tech_details, None, hits, rules)
+        derived = {"context": context, "expected_solution": expected_solution, "output_format": output_format}
+        fingerprint_cache.set(fingerprint, derived)
     
-    return {
-        "context": context,
-        "problem": prompt.strip(),
-        "expected_solution": expected_solution,
-        "output_format": output_format
-    }
+    result = dict(derived, problem=prompt.strip())
+    return {key: result[key] for key in RESULT_KEYS}
@@ -0,0 +1,132 @@
+"""
+Pre-serialized JSON responses and HTTP validators for cached results
+
+A cache hit on /transform always produces the same bytes, so they are
+serialized (and gzipped when large enough) once and reused. Each response
+carries a weak ETag built from the cache key, which already contains the
+rule version, so a client that holds a result can revalidate it with
+If-None-Match.
+"""
+
+import gzip
+import json
+from collections import namedtuple
+
+# body: JSON bytes; gzipped: compressed body or None; etag: validator for both
+PreparedResponse = namedtuple('PreparedResponse', ('body', 'gzipped', 'etag'))
+
+
+def serialize_json(payload):
+    """
+    Serialize like Flask's jsonify(): sorted keys, compact, trailing newline.
+
+    Args:
+        payload: JSON-serializable value
+
+    Returns:
+        bytes: Response body
+    """
+    return (json.dumps(payload, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def make_etag(cache_key):
+    """
+    Build the ETag for a result.
+
+    The validator is weak because the ``cached`` flag differs between the
+    first response and later ones while the result itself is the same.
+
+    Args:
+        cache_key (str): Cache key ("<rule version>:<prompt hash>")
+
+    Returns:
+        str: ETag header value
+    """
+    return f'W/"{cache_key}"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Check an If-None-Match header against an ETag (weak comparison).
+
+    Args:
+        if_none_match (str or None): Request header value
+        etag (str): Current ETag
+
+    Returns:
+        bool: True if the client's copy is current
+    """
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding):
+    """
+    Check whether an Accept-Encoding header allows gzip.
+
+    Args:
+        accept_encoding (str or None): Request header value
+
+    Returns:
+        bool: True unless gzip is absent or has q=0
+    """
+    for coding in (accept_encoding or '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() not in ('gzip', '*'):
+            continue
+        quality = params.strip().lower()
+        if quality.startswith('q='):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def prepare_response(payload, etag, gzip_min_bytes=1024):
+    """
+    Serialize a response body once for reuse.
+
+    Args:
+        payload: JSON-serializable response
+        etag (str): ETag for the response
+        gzip_min_bytes (int): Also keep a gzipped body when the JSON is at
+            least this long (0 disables compression)
+
+    Returns:
+        PreparedResponse: Body, optional gzipped body and ETag
+    """
+    body = serialize_json(payload)
+    gzipped = None
+    if gzip_min_bytes and len(body) >= gzip_min_bytes:
+        gzipped = gzip.compress(body, compresslevel=6, mtime=0)
+    return PreparedResponse(body, gzipped, etag)
+
+
+def select_body(prepared, accept_encoding):
+    """
+    Pick the body to send for a request.
+
+    Args:
+        prepared (PreparedResponse): Serialized response
+        accept_encoding (str or None): Request Accept-Encoding header
+
+    Returns:
+        tuple: (body: bytes, headers: dict)
+    """
+    headers = {'ETag': prepared.etag, 'Vary': 'Accept-Encoding'}
+    if prepared.gzipped is not None and accepts_gzip(accept_encoding):
+        headers['Content-Encoding'] = 'gzip'
+        return prepared.gzipped, headers
+    return prepared.body, headers
@@ -0,0 +1,333 @@
+"""
+Rule tables shared by the context, language and solution detectors
+
+The tables live in a JSON rule file (rules.json by default). A file is
+validated and compiled once into a RuleSet, which holds the tables and the
+keyword matcher built from every literal in them. The active RuleSet is
+swapped atomically when the file changes, and its version (a hash of the
+rules) lets caches keep results from different rule versions apart.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from .keyword_matcher import KeywordMatcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules.json')
+
+# Contexts and languages the detector and solution builder have branches for
+REQUIRED_CONTEXTS = ("generate_code", "debug_fix", "explain", "professional_writing", "optimize", "analyze", "design")
+PATTERN_FIELDS = ("keywords", "context_words", "exclude_words")
+
+# (section, key) pairs that must hold a list of keywords
+WORD_LISTS = (
+    ("special_cases", "explanation_words"), ("special_cases", "api_words"),
+    ("special_cases", "api_action_words"), ("special_cases", "api_language_words"),
+    ("tech_details", "python_database_words"), ("tech_details", "python_web_words"),
+    ("tech_details", "python_error_words"), ("tech_details", "sql_join_words"),
+    ("tech_details", "sql_aggregation_words"), ("tech_details", "sql_modification_words"),
+    ("tech_details", "bash_automation_words"), ("tech_details", "r_data_words"),
+    ("tech_details", "flag_words"),
+    ("solution", "multi_step_indicators"), ("solution", "sequence_indicators"),
+    ("solution", "operation_indicators"), ("solution", "professional_detail_words"),
+    ("solution", "enhancement_words"),
+)
+
+
+def _check_words(words, where):
+    if not isinstance(words, list) or not words:
+        raise ValueError(f"{where} must be a non-empty list of keywords")
+    for word in words:
+        # Prompts are lowercased before matching, so other keywords never match
+        if not isinstance(word, str) or not word or word != word.lower():
+            raise ValueError(f"{where} contains {word!r}; keywords must be non-empty lowercase strings")
+
+
+def _check_section(data, name):
+    section = data.get(name)
+    if not isinstance(section, dict):
+        raise ValueError(f"Missing '{name}' section")
+    return section
+
+
+def validate_rules(data):
+    """
+    Check that rule data has every table the detectors use.
+
+    Args:
+        data (dict): Parsed rule file
+
+    Raises:
+        ValueError: Describing the first problem found
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Rule file must contain a JSON object")
+
+    context = _check_section(data, "context")
+    keywords = context.get("keywords")
+    descriptions = context.get("descriptions")
+    if not isinstance(keywords, dict) or not isinstance(descriptions, dict):
+        raise ValueError("context.keywords and context.descriptions must be objects")
+    for name in REQUIRED_CONTEXTS:
+        if name not in keywords:
+            raise ValueError(f"context.keywords is missing '{name}'")
+    for name, words in keywords.items():
+        _check_words(words, f"context.keywords.{name}")
+        if not isinstance(descriptions.get(name), str):
+            raise ValueError(f"context.descriptions is missing '{name}'")
+    if not isinstance(context.get("default"), str):
+        raise ValueError("context.default must be a string")
+
+    language = _check_section(data, "language")
+    weights = language.get("weights")
+    if not isinstance(weights, dict) or any(
+            not isinstance(weights.get(field), (int, float)) for field in PATTERN_FIELDS):
+        raise ValueError(f"language.weights must give a number for each of {', '.join(PATTERN_FIELDS)}")
+    patterns = language.get("patterns")
+    if not isinstance(patterns, dict) or not patterns:
+        raise ValueError("language.patterns must be a non-empty object")
+    for name, pattern in patterns.items():
+        if not isinstance(pattern, dict):
+            raise ValueError(f"language.patterns.{name} must be an object")
+        for field in PATTERN_FIELDS:
+            _check_words(pattern.get(field), f"language.patterns.{name}.{field}")
+
+    for section, key in WORD_LISTS:
+        _check_words(_check_section(data, section).get(key), f"{section}.{key}")
+
+    base = _check_section(data, "solution").get("base")
+    if not isinstance(base, dict) or any(not isinstance(base.get(name), str) for name in REQUIRED_CONTEXTS):
+        raise ValueError(f"solution.base must give a string for each of {', '.join(REQUIRED_CONTEXTS)}")
+
+
+def _freeze(words):
+    return tuple(words)
+
+
+class RuleSet:
+    """
+    Validated rule tables plus the keyword matcher compiled from them.
+
+    Instances are never modified after construction; a rule update builds a
+    new RuleSet, so a transformation that holds one sees consistent rules.
+    """
+
+    def __init__(self, data, source=None):
+        """
+        Args:
+            data (dict): Parsed rule file
+            source (str, optional): Path the rules were loaded from
+
+        Raises:
+            ValueError: If the data fails validation
+        """
+        validate_rules(data)
+        canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+        self.version = hashlib.sha256(canonical.encode()).hexdigest()[:12]
+        self.source = source
+
+        context = data["context"]
+        self.context_keywords = {name: _freeze(words) for name, words in context["keywords"].items()}
+        self.context_descriptions = dict(context["descriptions"])
+        self.default_context = context["default"]
+
+        language = data["language"]
+        self.language_weights = {field: language["weights"][field] for field in PATTERN_FIELDS}
+        self.language_patterns = {
+            name: {field: _freeze(pattern[field]) for field in PATTERN_FIELDS}
+            for name, pattern in language["patterns"].items()
+        }
+
+        special = data["special_cases"]
+        self.explanation_words = _freeze(special["explanation_words"])
+        self.api_words = _freeze(special["api_words"])
+        self.api_action_words = _freeze(special["api_action_words"])
+        self.api_language_words = _freeze(special["api_language_words"])
+
+        tech = data["tech_details"]
+        self.python_database_words = _freeze(tech["python_database_words"])
+        self.python_web_words = _freeze(tech["python_web_words"])
+        self.python_error_words = _freeze(tech["python_error_words"])
+        self.sql_join_words = _freeze(tech["sql_join_words"])
+        self.sql_aggregation_words = _freeze(tech["sql_aggregation_words"])
+        self.sql_modification_words = _freeze(tech["sql_modification_words"])
+        self.bash_automation_words = _freeze(tech["bash_automation_words"])
+        self.r_data_words = _freeze(tech["r_data_words"])
+        self.tech_flag_words = _freeze(tech["flag_words"])
+
+        solution = data["solution"]
+        self.base_solutions = dict(solution["base"])
+        self.professional_writing_words = self.context_keywords["professional_writing"]
+        self.multi_step_indicators = _freeze(solution["multi_step_indicators"])
+        self.sequence_indicators = _freeze(solution["sequence_indicators"])
+        self.operation_indicators = _freeze(solution["operation_indicators"])
+        self.professional_detail_words = _freeze(solution["professional_detail_words"])
+        self.enhancement_words = _freeze(solution["enhancement_words"])
+
+        self.matcher = KeywordMatcher(self.all_patterns())
+        # detect_context() called without hits needs only the context keywords
+        self.context_matcher = KeywordMatcher(
+            word for words in self.context_keywords.values() for word in words)
+
+    def all_patterns(self):
+        """
+        Collect every literal the detectors look for, in first-seen order.
+
+        Returns:
+            list: Unique patterns across all rule tables
+        """
+        groups = list(self.context_keywords.values())
+        for pattern in self.language_patterns.values():
+            groups.extend(pattern[field] for field in PATTERN_FIELDS)
+        groups.extend([
+            self.explanation_words, self.api_words, self.api_action_words, self.api_language_words,
+            self.python_database_words, self.python_web_words, self.python_error_words,
+            self.sql_join_words, self.sql_aggregation_words, self.sql_modification_words,
+            self.bash_automation_words, self.r_data_words, self.tech_flag_words,
+            self.professional_writing_words, self.multi_step_indicators, self.sequence_indicators,
+            self.operation_indicators, self.professional_detail_words, self.enhancement_words
+        ])
+        return list(dict.fromkeys(word for group in groups for word in group))
+
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    """
+    Read, validate and compile a rule file.
+
+    Args:
+        path (str): JSON rule file
+
+    Returns:
+        RuleSet: The compiled rules
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError: If it is not valid JSON or fails validation
+    """
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return RuleSet(data, source=path)
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+# Active rules and the file they are reloaded from
+_active = load_rules(DEFAULT_RULES_PATH)
+_watch = {"path": DEFAULT_RULES_PATH, "stamp": _file_stamp(DEFAULT_RULES_PATH),
+          "interval": 2.0, "checked": time.monotonic()}
+_reload_lock = threading.Lock()
+
+
+def get_rules():
+    """
+    Return the active rule set.
+
+    Callers should fetch it once per transformation and pass it along, so a
+    concurrent reload cannot mix two rule versions in one result.
+
+    Returns:
+        RuleSet: The active rules
+    """
+    return _active
+
+
+def watched_rules():
+    """
+    Return the rule file being watched and its reload interval.
+
+    Returns:
+        tuple: (path, reload_interval), the arguments to use_rules() that
+            make another process follow the same file
+    """
+    return _watch["path"], _watch["interval"]
+
+
+def use_rules(path, reload_interval=2.0):
+    """
+    Load a rule file, make it active and watch it for changes.
+
+    Args:
+        path (str): JSON rule file
+        reload_interval (float): Minimum seconds between file change checks
+            (0 disables hot reload)
+
+    Returns:
+        RuleSet: The newly active rules
+    """
+    global _active
+    with _reload_lock:
+        stamp = _file_stamp(path)
+        _active = load_rules(path)
+        _watch.update(path=path, stamp=stamp, interval=reload_interval, checked=time.monotonic())
+    return _active
+
+
+def reload_rules_if_changed(force=False):
+    """
+    Reload the watched rule file if it changed since it was loaded.
+
+    Checks the file at most once per reload interval. An invalid file is
+    logged and skipped, and the current rules stay active until the file
+    changes again. The swap is a single reference assignment, so readers
+    see either the old or the new RuleSet.
+
+    Args:
+        force (bool): Check now, ignoring the interval
+
+    Returns:
+        bool: True if new rules were activated
+    """
+    global _active
+    now = time.monotonic()
+    if not force and (not _watch["interval"] or now - _watch["checked"] < _watch["interval"]):
+        return False
+    if not _reload_lock.acquire(blocking=False):
+        return False  # Another thread is already checking
+    try:
+        _watch["checked"] = now
+        path = _watch["path"]
+        try:
+            stamp = _file_stamp(path)
+        except OSError as e:
+            logger.warning("Cannot stat rule file %s: %s", path, e)
+            return False
+        if stamp == _watch["stamp"]:
+            return False
+
+        _watch["stamp"] = stamp
+        try:
+            rules = load_rules(path)
+        except (OSError, ValueError) as e:
+            logger.warning("Keeping rules %s; %s is invalid: %s", _active.version, path, e)
+            return False
+        if rules.version == _active.version:
+            return False
+
+        logger.info("Loaded rules %s from %s (was %s)", rules.version, path, _active.version)
+        _active = rules
+        return True
+    finally:
+        _reload_lock.release()
+
+
+def scan_keywords(prompt_lower, rules=None):
+    """
+    Return the set of rule keywords present in a lowercased prompt.
+
+    Args:
+        prompt_lower (str): Lowercase version of the prompt
+        rules (RuleSet, optional): Rules to match (default: the active rules)
+
+    Returns:
+        frozenset: Matched rule keywords
+    """
+    return (rules or _active).matcher.scan(prompt_lower)
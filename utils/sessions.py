@@ -0,0 +1,234 @@
+"""
+Incremental analysis sessions for live-typing clients
+
+A session keeps a prompt's text and, for every keyword, the number of
+positions where it is the longest match (KeywordMatcher.count_longest).
+The longest match at a position only depends on the next ``max_length``
+characters, so an edit is applied by recounting the positions within
+``max_length - 1`` characters before the edited span and along the
+inserted text; the rest of the prompt is not scanned again. The hit set,
+and from it the result, is rebuilt from the counts.
+
+Texts containing a capital sigma (whose lowercase depends on its
+neighbours) or a dotted capital I (whose lowercase is two characters) are
+rescanned whole after each edit, as are sessions opened under older rules.
+"""
+
+import secrets
+import threading
+from collections import Counter, namedtuple
+
+from .cache import LRUCache
+
+# text: current prompt; counts: {keyword: positions where it is the longest match}
+SessionState = namedtuple('SessionState', ('text', 'counts', 'rules_version', 'revision'))
+
+_FULL_SCAN_CHARACTERS = ('Σ', 'İ')
+
+
+class SessionError(Exception):
+    """
+    A session request that cannot be applied.
+
+    Attributes:
+        status (int): HTTP status to answer with (404 unknown or expired
+            session, 409 stale revision)
+    """
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def _needs_full_scan(text):
+    return any(char in text for char in _FULL_SCAN_CHARACTERS)
+
+
+def _validate_edit(edit, length):
+    """Return (start, end, text) for one edit against a text of ``length`` characters"""
+    if not isinstance(edit, dict):
+        raise ValueError("Each edit must be an object with 'start', 'end' and 'text'")
+    start, end, text = edit.get('start'), edit.get('end', edit.get('start')), edit.get('text', '')
+    for name, value in (('start', start), ('end', end)):
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise ValueError(f"Edit '{name}' must be an integer")
+    if not 0 <= start <= end <= length:
+        raise ValueError(f"Edit range {start}-{end} is outside the {length}-character prompt")
+    if not isinstance(text, str):
+        raise ValueError("Edit 'text' must be a string")
+    return start, end, text
+
+
+class SessionStore:
+    """
+    Incremental analysis sessions.
+
+    States are immutable and kept in a cache, which bounds the number of
+    sessions and their total size and drops sessions idle for longer than
+    ``idle_seconds``. The default LRUCache keeps sessions per worker; a
+    SQLiteCache shares them between all workers on a host, so an edit can
+    be served by any worker. Edits carry the revision they were made
+    against; a request based on an outdated revision is refused, and the
+    new state is stored with compare_and_set(), so two overlapping requests
+    cannot both apply their edits.
+    """
+
+    def __init__(self, max_sessions=1000, max_bytes=None, idle_seconds=300, max_length=5000, states=None):
+        """
+        Args:
+            max_sessions (int): Sessions kept at once
+            max_bytes (int, optional): Maximum estimated size of all sessions
+            idle_seconds (float): Seconds a session survives without an edit
+            max_length (int): Longest prompt a session may hold
+            states (optional): Cache holding the session states, e.g. from
+                create_cache(); replaces the per-worker LRUCache built from
+                the limits above
+        """
+        self.max_length = max_length
+        self._sessions = states if states is not None else LRUCache(
+            max_entries=max_sessions, max_bytes=max_bytes, ttl=idle_seconds)
+        self._lock = threading.Lock()
+        self._counters = Counter()
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _load(self, session_id):
+        """Return a session's state, or None (the SQLite cache returns it as a JSON list)"""
+        value = self._sessions.get(session_id)
+        return None if value is None else SessionState(*value)
+
+    def _full_state(self, text, rules, revision):
+        self._count("full_scans")
+        self._count("scanned_chars", len(text))
+        counts = rules.matcher.count_longest(text.lower())
+        return SessionState(text, dict(counts), rules.version, revision)
+
+    def _apply_edit(self, text, counts, matcher, start, end, inserted):
+        """Apply one edit to text and counts in place of a full scan; returns the new text"""
+        reach = matcher.max_length - 1
+        low = max(0, start - reach)
+        new_text = text[:start] + inserted + text[end:]
+        removed = matcher.count_longest(text[low:end + reach].lower(), 0, end - low)
+        added = matcher.count_longest(new_text[low:start + len(inserted) + reach].lower(),
+                                      0, start + len(inserted) - low)
+        for keyword, count in removed.items():
+            remaining = counts[keyword] - count
+            if remaining:
+                counts[keyword] = remaining
+            else:
+                del counts[keyword]
+        for keyword, count in added.items():
+            counts[keyword] = counts.get(keyword, 0) + count
+        self._count("scanned_chars", min(len(text), end + reach) - low
+                    + min(len(new_text), start + len(inserted) + reach) - low)
+        return new_text
+
+    def open(self, text, rules):
+        """
+        Start a session with a full scan of its text.
+
+        Args:
+            text (str): Initial prompt
+            rules (RuleSet): Rules to scan with
+
+        Returns:
+            tuple: (session_id, SessionState)
+
+        Raises:
+            ValueError: If the text is not a string or is too long
+        """
+        if not isinstance(text, str):
+            raise ValueError("'prompt' must be a string")
+        if len(text) > self.max_length:
+            raise ValueError(f"Prompt must be less than {self.max_length} characters")
+        session_id = secrets.token_urlsafe(12)
+        state = self._full_state(text, rules, 0)
+        self._sessions.set(session_id, state)
+        self._count("opened")
+        return session_id, state
+
+    def edit(self, session_id, revision, edits, rules):
+        """
+        Apply edits made against a revision and store the next revision.
+
+        Edits apply in order, each against the text left by the ones
+        before it; positions count Unicode characters (code points).
+
+        Args:
+            session_id (str): Session from open()
+            revision (int): Revision the client's edits are based on
+            edits (list): {"start": int, "end": int, "text": str} replacing text[start:end]
+            rules (RuleSet): Active rules
+
+        Returns:
+            SessionState: The new state
+
+        Raises:
+            SessionError: If the session is unknown or expired (404) or the revision is stale (409)
+            ValueError: If the edits are malformed or make the prompt too long
+        """
+        state = self._load(session_id)
+        if state is None:
+            raise SessionError("Unknown or expired session", 404)
+        if revision != state.revision:
+            self._count("conflicts")
+            raise SessionError(f"Session is at revision {state.revision}, not {revision}", 409)
+        if not isinstance(edits, list):
+            raise ValueError("'edits' must be a list")
+
+        text = state.text
+        counts = dict(state.counts)
+        incremental = state.rules_version == rules.version and not _needs_full_scan(text)
+        for edit in edits:
+            start, end, inserted = _validate_edit(edit, len(text))
+            if len(text) - (end - start) + len(inserted) > self.max_length:
+                raise ValueError(f"Prompt must be less than {self.max_length} characters")
+            if incremental and not _needs_full_scan(inserted):
+                text = self._apply_edit(text, counts, rules.matcher, start, end, inserted)
+            else:
+                text = text[:start] + inserted + text[end:]
+                incremental = False
+
+        if incremental:
+            new_state = SessionState(text, counts, rules.version, revision + 1)
+            self._count("incremental_edits")
+        else:
+            new_state = self._full_state(text, rules, revision + 1)
+
+        if not self._sessions.compare_and_set(session_id, state, new_state):
+            self._count("conflicts")
+            raise SessionError("Session was changed by another request", 409)
+        return new_state
+
+    def close(self, session_id):
+        """
+        End a session.
+
+        Returns:
+            bool: True if the session existed
+        """
+        return self._sessions.delete(session_id)
+
+    @staticmethod
+    def hits(state, rules):
+        """Keyword hits of a session's text"""
+        return rules.matcher.hits_from_counts(state.counts)
+
+    def stats(self):
+        """
+        Report session occupancy and scan work.
+
+        ``scanned_chars`` counts characters rescanned by full scans and
+        edits together; compare it with the prompt lengths to see how much
+        rescanning the sessions saved.
+
+        Returns:
+            dict: Cache stats of the session table plus session counters
+        """
+        stats = self._sessions.stats()
+        with self._lock:
+            stats.update({name: self._counters[name] for name in (
+                "opened", "incremental_edits", "full_scans", "conflicts", "scanned_chars")})
+        return stats
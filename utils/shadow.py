@@ -0,0 +1,242 @@
+"""
+Shadow runs of candidate transformation engines
+
+A candidate engine is any callable ``engine(prompt, rules)`` returning a
+result dict. Downstream systems key on the derived strings, so a candidate
+is only equivalent if its ``context``, ``expected_solution`` and
+``output_format`` are identical to the current engine's for every prompt.
+
+ShadowRunner re-runs a sample of live transformations through a candidate
+on a background thread and records divergences and relative timings; the
+response is always the current engine's.
+"""
+
+import importlib
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from .batch_scorer import HAS_NUMPY, transform_batch
+from .context_detector import detect_context
+from .language_detector import detect_language
+from .prompt_analyzer import DERIVED_KEYS, transform_prompt_to_json
+from .solution_builder import build_expected_solution
+from .text_chunks import iter_lower_chunks
+
+logger = logging.getLogger(__name__)
+
+
+def current_engine(prompt, rules):
+    """The serving pipeline, including the fingerprint cache"""
+    return transform_prompt_to_json(prompt, rules=rules)
+
+
+def reference_engine(prompt, rules):
+    """The scalar detectors called directly, without any memoization"""
+    hits = rules.matcher.scan_chunks(iter_lower_chunks(prompt))
+    context = detect_context(None, hits, rules)
+    output_format, tech_details = detect_language(None, hits, rules)
+    return {
+        "context": context,
+        "problem": prompt.strip(),
+        "expected_solution": build_expected_solution(context, tech_details, None, hits, rules),
+        "output_format": output_format
+    }
+
+
+def batch_engine(prompt, rules):
+    """The NumPy-vectorized batch scorer on a single prompt, without memoization"""
+    return transform_batch([prompt], rules, memoize=False)[0]
+
+
+ENGINES = {
+    'current': current_engine,
+    'reference': reference_engine,
+    'batch': batch_engine,
+}
+
+
+def load_engine(spec):
+    """
+    Resolve an engine by name or import path.
+
+    Args:
+        spec (str): A name from ENGINES or "package.module:function"
+
+    Returns:
+        callable: engine(prompt, rules) -> dict
+
+    Raises:
+        ValueError: If the engine cannot be found or needs a missing dependency
+    """
+    if spec in ENGINES:
+        if spec == 'batch' and not HAS_NUMPY:
+            raise ValueError("The 'batch' engine requires NumPy")
+        return ENGINES[spec]
+    module_name, _, attribute = spec.partition(':')
+    if not module_name or not attribute:
+        raise ValueError(f"Unknown engine {spec!r}; use one of {sorted(ENGINES)} or 'module:function'")
+    try:
+        engine = getattr(importlib.import_module(module_name), attribute)
+    except (ImportError, AttributeError) as e:
+        raise ValueError(f"Cannot load engine {spec!r}: {e}")
+    if not callable(engine):
+        raise ValueError(f"Engine {spec!r} is not callable")
+    return engine
+
+
+def diverging_keys(expected, actual):
+    """
+    Compare two results on the derived fields.
+
+    Args:
+        expected (dict): Result of the current engine
+        actual (dict): Result of the candidate
+
+    Returns:
+        list: Keys of DERIVED_KEYS whose values differ (missing counts as different)
+    """
+    return [key for key in DERIVED_KEYS if actual.get(key) != expected.get(key)]
+
+
+class ShadowRunner:
+    """
+    Runs a sample of transformations again through a candidate engine.
+
+    submit() only draws the sample and enqueues; a single daemon thread per
+    process runs the candidate, so responses never wait for it. When the
+    queue is full, samples are dropped rather than queued. The most recent
+    divergences are kept for inspection.
+    """
+
+    def __init__(self, engine, name, sample_rate=0.01, max_pending=100, max_divergences=50,
+                 on_result=None, rng=None):
+        """
+        Args:
+            engine (callable): Candidate engine(prompt, rules) -> dict
+            name (str): Engine name for reports
+            sample_rate (float): Share of transformations to shadow (0-1)
+            max_pending (int): Samples allowed to wait for the candidate
+            max_divergences (int): Divergences kept for inspection
+            on_result (callable, optional): Called as on_result(outcome,
+                primary_seconds, candidate_seconds) after each shadow run;
+                outcome is 'match', 'diverged' or 'error'
+            rng (random.Random, optional): Sampling source
+        """
+        self.engine = engine
+        self.name = name
+        self.sample_rate = sample_rate
+        self.on_result = on_result
+        self._rng = rng or random.Random()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._divergences = deque(maxlen=max_divergences)
+        self._lock = threading.Lock()
+        self._owner_pid = None
+        self._counts = {"sampled": 0, "match": 0, "diverged": 0, "error": 0, "dropped": 0}
+        self._primary_seconds = 0.0
+        self._candidate_seconds = 0.0
+
+    def submit(self, prompt, result, seconds, rules):
+        """
+        Offer a finished transformation for shadowing.
+
+        Args:
+            prompt (str): Prompt that was transformed
+            result (dict): Result returned to the client
+            seconds (float): Time the current engine took
+            rules (RuleSet): Rules the result was computed with
+
+        Returns:
+            bool: True if the transformation was queued for the candidate
+        """
+        if self._rng.random() >= self.sample_rate:
+            return False
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((prompt, result, seconds, rules))
+        except queue.Full:
+            with self._lock:
+                self._counts["dropped"] += 1
+            return False
+        with self._lock:
+            self._counts["sampled"] += 1
+        return True
+
+    def _ensure_started(self):
+        """Start the worker thread in this process (forked workers need their own)"""
+        if self._owner_pid == os.getpid():
+            return
+        with self._lock:
+            if self._owner_pid != os.getpid():
+                self._owner_pid = os.getpid()
+                threading.Thread(target=self._run, name='shadow-engine', daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.run_one(*self._queue.get())
+
+    def run_one(self, prompt, result, seconds, rules):
+        """
+        Run the candidate on one prompt and record the outcome.
+
+        Returns:
+            str: 'match', 'diverged' or 'error'
+        """
+        started = time.perf_counter()
+        try:
+            candidate = self.engine(prompt, rules)
+            elapsed = time.perf_counter() - started
+            keys = diverging_keys(result, candidate)
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            logger.warning("Shadow engine %s failed: %s", self.name, e)
+            outcome = 'error'
+            divergence = {"error": str(e)}
+        else:
+            outcome = 'diverged' if keys else 'match'
+            divergence = {
+                "keys": keys,
+                "expected": {key: result.get(key) for key in keys},
+                "actual": {key: candidate.get(key) for key in keys}
+            }
+
+        with self._lock:
+            self._counts[outcome] += 1
+            self._primary_seconds += seconds
+            self._candidate_seconds += elapsed
+            if outcome != 'match':
+                divergence.update(prompt=prompt[:500], rules_version=rules.version, at=time.time())
+                self._divergences.append(divergence)
+        if outcome == 'diverged':
+            logger.warning("Shadow engine %s diverged on %s", self.name, ', '.join(keys))
+        if self.on_result is not None:
+            self.on_result(outcome, seconds, elapsed)
+        return outcome
+
+    def stats(self):
+        """
+        Report outcomes, timings and recent divergences.
+
+        ``speedup`` is the current engine's total time over the candidate's
+        on the same prompts: above 1 means the candidate is faster.
+
+        Returns:
+            dict: Engine, sample rate, counts, mean timings, speedup, divergences
+        """
+        with self._lock:
+            runs = self._counts["match"] + self._counts["diverged"] + self._counts["error"]
+            return {
+                "engine": self.name,
+                "sample_rate": self.sample_rate,
+                "pending": self._queue.qsize(),
+                **self._counts,
+                "primary_mean_us": round(self._primary_seconds / runs * 1e6, 1) if runs else None,
+                "candidate_mean_us": round(self._candidate_seconds / runs * 1e6, 1) if runs else None,
+                "speedup": (round(self._primary_seconds / self._candidate_seconds, 3)
+                            if self._candidate_seconds else None),
+                "divergences": list(self._divergences)
+            }
@@ -0,0 +1,153 @@
+"""
+Request coalescing for concurrent computations of the same key
+"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    """One in-flight computation that followers can wait on"""
+
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Runs at most one computation per key at a time.
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait for its result instead of repeating the
+    work. Waits are bounded by ``timeout``: a follower that times out runs the
+    function itself, so a stuck leader delays others by at most that long.
+
+    ``do`` serves threaded workers and ``do_async`` serves event-loop code;
+    the two keep separate in-flight tables.
+    """
+
+    def __init__(self, timeout=5.0):
+        """
+        Args:
+            timeout (float): Maximum seconds a follower waits for the leader
+        """
+        self.timeout = timeout
+        self._calls = {}
+        self._async_calls = {}
+        self._lock = threading.Lock()
+        self._leaders = 0
+        self._shared = 0
+        self._timeouts = 0
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Call ``function(*args, **kwargs)`` once for concurrent callers with the same key.
+
+        Args:
+            key (str): Coalescing key
+            function (callable): Computation to run
+
+        Returns:
+            tuple: (value, shared) where shared is True if another caller computed it
+
+        Raises:
+            Exception: Whatever the leader's computation raised
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._leaders += 1
+
+        if not leader:
+            if call.event.wait(self.timeout):
+                with self._lock:
+                    self._shared += 1
+                if call.error is not None:
+                    raise call.error
+                return call.value, True
+            with self._lock:
+                self._timeouts += 1
+            return function(*args, **kwargs), False
+
+        try:
+            call.value = function(*args, **kwargs)
+            return call.value, False
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    async def do_async(self, key, function, *args, **kwargs):
+        """
+        Await ``function(*args, **kwargs)`` once for concurrent callers with the same key.
+
+        Args:
+            key (str): Coalescing key
+            function (callable): Coroutine function running the computation
+
+        Returns:
+            tuple: (value, shared) where shared is True if another caller computed it
+        """
+        with self._lock:
+            future = self._async_calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._async_calls[key] = asyncio.get_running_loop().create_future()
+                # Mark the outcome as retrieved even when nobody is waiting
+                future.add_done_callback(lambda f: f.cancelled() or f.exception())
+                self._leaders += 1
+
+        if not leader:
+            try:
+                value = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    self._timeouts += 1
+                return await function(*args, **kwargs), False
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled; compute independently
+                return await function(*args, **kwargs), False
+            with self._lock:
+                self._shared += 1
+            return value, True
+
+        try:
+            value = await function(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return value, False
+        finally:
+            with self._lock:
+                del self._async_calls[key]
+
+    def stats(self):
+        """
+        Report coalescing counters.
+
+        Returns:
+            dict: in_flight, leaders, shared and timeouts
+        """
+        with self._lock:
+            return {
+                "in_flight": len(self._calls) + len(self._async_calls),
+                "leaders": self._leaders,
+                "shared": self._shared,
+                "timeouts": self._timeouts
+            }
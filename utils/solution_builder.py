@@ -2,72 +2,64 @@
 Expected solution builder for different prompt types
 """
 
+from .rules import get_rules
 
-def build_expected_solution(context, tech_details, prompt_lower):
+
+def build_expected_solution(context, tech_details, prompt_lower, hits=None, rules=None):
     """
     Build a detailed expected solution based on context and technology details.
     
     Args:
         context (str): The detected context
         tech_details (dict): Technology-specific details
-        prompt_lower (str): Lowercase version of the prompt
+        prompt_lower (str): Lowercase version of the prompt (unused when hits is given)
+        hits (frozenset, optional): Keywords already matched in the prompt
+        rules (RuleSet, optional): Rules to apply (default: the active rules)
         
     Returns:
         str: The expected solution description
     """
-    base_solutions = {
-        "generate_code": "A complete, working code solution that addresses the requirements.",
-        "debug_fix": "A solution that identifies and fixes the issue with clear explanations.",
-        "explain": "A clear, comprehensive explanation with examples and context.",
-        "professional_writing": "A professional and well-structured document with appropriate formatting and language.",
-        "optimize": "An optimized solution with performance improvements and best practices.",
-        "analyze": "A detailed analysis with findings, recommendations, and insights.",
-        "design": "A well-structured design with clear architecture and implementation guidance."
-    }
+    if rules is None:
+        rules = get_rules()
+    if hits is None:
+        hits = rules.matcher.scan(prompt_lower)
+    base_solutions = rules.base_solutions
+    context_lower = context.lower()
+    is_professional_writing = ("provide information or assistance" in context_lower
+                               and not hits.isdisjoint(rules.professional_writing_words))
     
     # Get base solution
-    if "generate code" in context.lower():
+    if "generate code" in context_lower:
         base = base_solutions["generate_code"]
-    elif "debug" in context.lower() or "fix" in context.lower():
+    elif "debug" in context_lower or "fix" in context_lower:
         base = base_solutions["debug_fix"]
-    elif "explain" in context.lower():
+    elif "explain" in context_lower:
         base = base_solutions["explain"]
-    elif "provide information or assistance" in context.lower() and any(word in prompt_lower for word in ["professional email", "business email", "business letter", "formal letter", "meeting request", "business proposal", "report", "memo", "presentation", "cover letter", "resume", "cv"]):
+    elif is_professional_writing:
         base = base_solutions["professional_writing"]
-    elif "optimize" in context.lower():
+    elif "optimize" in context_lower:
         base = base_solutions["optimize"]
-    elif "analyze" in context.lower():
+    elif "analyze" in context_lower:
         base = base_solutions["analyze"]
-    elif "design" in context.lower():
+    elif "design" in context_lower:
         base = base_solutions["design"]
     else:
         base = base_solutions["generate_code"]
     
     # Detect multi-step tasks - only flag if multiple distinct operations exist
-    multi_step_indicators = ["and", "then", "also", "next", "after", "finally", "followed by"]
-    sequence_indicators = ["first", "second", "third", "step 1", "step 2", "step 3"]
-    
     # Check for sequence indicators
-    has_sequence = any(indicator in prompt_lower for indicator in sequence_indicators)
+    has_sequence = not hits.isdisjoint(rules.sequence_indicators)
     
     # Check for multi-step indicators with careful validation
     has_multi_step = False
-    if any(indicator in prompt_lower for indicator in multi_step_indicators):
+    if not hits.isdisjoint(rules.multi_step_indicators):
         # Only consider it multi-step if there are multiple distinct operations
-        operation_indicators = [
-            "read", "write", "create", "delete", "update", "insert", "fetch", "download", "upload",
-            "connect", "disconnect", "import", "export", "parse", "validate", "transform", "filter",
-            "sort", "group", "join", "merge", "split", "extract", "generate", "process", "analyze",
-            "scrape", "save", "load", "store", "retrieve", "calculate", "compute", "format"
-        ]
-        
-        # Count distinct operations
-        operation_count = sum(1 for op in operation_indicators if op in prompt_lower)
+        operation_count = sum(1 for op in rules.operation_indicators if op in hits)
         
         # Only mark as multi-step if:
         # 1. Has explicit sequence indicators, OR
         # 2. Has 2+ distinct operations with multi-step indicators
-        has_multi_step = has_sequence or (operation_count >= 2 and any(indicator in prompt_lower for indicator in multi_step_indicators))
+        has_multi_step = has_sequence or operation_count >= 2
     
     # Add specific details based on technology
     details = []
@@ -121,7 +113,7 @@ def build_expected_solution(context, tech_details, prompt_lower):
         elif tech_details.get("framework") == "Sinatra":
             details.append("Sinatra web framework")
             
-    elif tech_details.get("web") and "html" in prompt_lower:
+    elif tech_details.get("web") and "html" in hits:
         details.append("HTML structure with CSS styling")
         if tech_details.get("responsive"):
             details.append("responsive design implementation")
@@ -130,26 +122,26 @@ def build_expected_solution(context, tech_details, prompt_lower):
         details.append("React component with hooks and proper state management")
     
     # Add professional writing specific details
-    if "provide information or assistance" in context.lower() and any(word in prompt_lower for word in ["professional email", "business email", "business letter", "formal letter", "meeting request", "business proposal", "report", "memo", "presentation", "cover letter", "resume", "cv"]):
-        if "email" in prompt_lower:
+    if is_professional_writing:
+        if "email" in hits:
             details.append("proper email formatting with subject line and professional tone")
-        if "meeting" in prompt_lower:
+        if "meeting" in hits:
             details.append("clear meeting request with proposed time and agenda")
-        if "business" in prompt_lower:
+        if "business" in hits:
             details.append("business-appropriate language and structure")
-        if "professional" in prompt_lower:
+        if "professional" in hits:
             details.append("professional tone and formatting")
     
     # Add context-specific enhancements
-    if "error" in prompt_lower or "exception" in prompt_lower:
+    if "error" in hits or "exception" in hits:
         details.append("error handling and validation")
-    if "test" in prompt_lower:
+    if "test" in hits:
         details.append("unit tests and test cases")
-    if "documentation" in prompt_lower or "comment" in prompt_lower:
+    if "documentation" in hits or "comment" in hits:
         details.append("comprehensive documentation and comments")
-    if "security" in prompt_lower:
+    if "security" in hits:
         details.append("security best practices and considerations")
-    if "performance" in prompt_lower:
+    if "performance" in hits:
         details.append("performance optimization techniques")
     
     # Handle multi-step tasks - only add multi-step description if truly multi-step
@@ -0,0 +1,90 @@
+"""
+Chunked access to large prompts without whole-text copies
+"""
+
+import re
+
+# Characters per chunk when lowercasing, hashing and scanning a prompt
+CHUNK_SIZE = 64 * 1024
+
+# Capital sigma lowercases to 'σ' or final 'ς' depending on its neighbours;
+# every other character lowercases the same way on its own.
+_CAPITAL_SIGMA = 'Σ'
+_WHITESPACE = re.compile(r'\s')
+_STRIP_BLOCK = 256
+
+
+def strip_bounds(text):
+    """
+    Return (start, end) such that ``text[start:end] == text.strip()``.
+
+    Only the leading and trailing whitespace is examined, so no copy of the
+    text is made.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        tuple: (start, end) indexes of the stripped text
+    """
+    start, end = 0, len(text)
+    while start < end:
+        block = text[start:start + _STRIP_BLOCK]
+        skipped = len(block) - len(block.lstrip())
+        start += skipped
+        if skipped < len(block):
+            break
+    while end > start:
+        block = text[max(start, end - _STRIP_BLOCK):end]
+        skipped = len(block) - len(block.rstrip())
+        end -= skipped
+        if skipped < len(block):
+            break
+    return start, end
+
+
+def iter_chunks(text, start=0, end=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield consecutive slices covering ``text[start:end]``.
+
+    Slices are cut so that lowercasing each one separately gives exactly
+    ``text[start:end].lower()`` when joined. Text without a capital sigma
+    can be cut anywhere; otherwise cuts are moved to just after whitespace,
+    where sigma's final-form rule cannot see across the cut. A range short
+    enough for one chunk is yielded without copying.
+
+    Args:
+        text (str): Text to split
+        start (int): First index to cover
+        end (int, optional): Index after the last one to cover (default: len(text))
+        chunk_size (int): Target characters per slice
+
+    Yields:
+        str: Slices of the text, in order
+    """
+    end = len(text) if end is None else end
+    context_sensitive = text.find(_CAPITAL_SIGMA, start, end) != -1
+    while start < end:
+        cut = min(start + chunk_size, end)
+        if context_sensitive and cut < end:
+            match = _WHITESPACE.search(text, cut - 1, end)
+            cut = match.end() if match else end
+        yield text[start:cut]
+        start = cut
+
+
+def iter_lower_chunks(text, start=0, end=None, chunk_size=CHUNK_SIZE):
+    """
+    Yield ``text[start:end].lower()`` in consecutive pieces.
+
+    Args:
+        text (str): Text to lowercase
+        start (int): First index to cover
+        end (int, optional): Index after the last one to cover (default: len(text))
+        chunk_size (int): Target characters per piece
+
+    Yields:
+        str: Lowercased pieces, in order
+    """
+    for chunk in iter_chunks(text, start, end, chunk_size):
+        yield chunk.lower()
@@ -0,0 +1,99 @@
+"""
+Per-request tracing: request IDs, Server-Timing headers and the slow-request log
+"""
+
+import json
+import logging
+import re
+import uuid
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# Headers browsers may read from cross-origin responses
+EXPOSED_HEADERS = (REQUEST_ID_HEADER, 'Server-Timing')
+
+# Client-supplied IDs are echoed into headers and logs, so only plain tokens are kept
+_REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9._:-]{1,128}')
+
+slow_logger = logging.getLogger('prompt_enhancer.slow')
+error_logger = logging.getLogger('prompt_enhancer.errors')
+
+
+def request_id(supplied=None):
+    """
+    Pick the ID for a request.
+
+    Args:
+        supplied (str, optional): X-Request-ID sent by the client or a proxy
+
+    Returns:
+        str: The supplied ID when it is a plain token, else a new random one
+    """
+    if supplied and _REQUEST_ID_PATTERN.fullmatch(supplied):
+        return supplied
+    return uuid.uuid4().hex
+
+
+def server_timing(timings, total_seconds=None):
+    """
+    Format stage timings as a Server-Timing header value.
+
+    Args:
+        timings (dict): Stage name -> seconds, in the order the stages ran
+        total_seconds (float, optional): Whole request, reported as "total"
+
+    Returns:
+        str: e.g. "validation;dur=0.012, cache_lookup;dur=0.004, total;dur=0.3"
+    """
+    entries = [f"{stage};dur={seconds * 1000:.3f}" for stage, seconds in timings.items()]
+    if total_seconds is not None:
+        entries.append(f"total;dur={total_seconds * 1000:.3f}")
+    return ', '.join(entries)
+
+
+def request_context(request_id, method, path, endpoint, timings, prompt_length=None, cache=None):
+    """
+    Describe a request for the slow log and error log.
+
+    Returns:
+        dict: JSON-serializable context; stage timings are in milliseconds
+    """
+    return {
+        "request_id": request_id,
+        "method": method,
+        "path": path,
+        "endpoint": endpoint,
+        "prompt_length": prompt_length,
+        "cache": cache,
+        "stages_ms": {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()},
+    }
+
+
+def log_slow_request(context, status, total_seconds, threshold_seconds):
+    """
+    Write a structured slow-log entry when a request exceeded the threshold.
+
+    Args:
+        context (dict): From request_context()
+        status (int): Response status code
+        total_seconds (float): Request duration
+        threshold_seconds (float): Slow-request threshold (0 disables the log)
+
+    Returns:
+        bool: True if an entry was written
+    """
+    if not threshold_seconds or total_seconds < threshold_seconds:
+        return False
+    entry = dict(context, event="slow_request", status=status, duration_ms=round(total_seconds * 1000, 3))
+    slow_logger.warning(json.dumps(entry, sort_keys=True, separators=(',', ':')))
+    return True
+
+
+def log_request_error(context, error):
+    """
+    Log an unhandled error with its traceback and request context.
+
+    Must be called from the ``except`` block handling ``error``.
+    """
+    entry = dict(context, event="request_error", error=f"{type(error).__name__}: {error}")
+    error_logger.exception(json.dumps(entry, sort_keys=True, separators=(',', ':')))
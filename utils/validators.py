@@ -4,13 +4,19 @@ Validation utilities for prompt processing
 
 import hashlib
 
+from .text_chunks import CHUNK_SIZE, strip_bounds, iter_lower_chunks
 
-def validate_prompt(prompt):
+# Default maximum prompt length in characters (configurable per call)
+MAX_PROMPT_LENGTH = 5000
+
+
+def validate_prompt(prompt, max_length=MAX_PROMPT_LENGTH):
     """
     Validate the input prompt for basic requirements.
     
     Args:
         prompt (str): The input prompt to validate
+        max_length (int): Maximum prompt length in characters
         
     Returns:
         tuple: (is_valid: bool, error_message: str or None)
@@ -18,11 +24,17 @@ def validate_prompt(prompt):
     if not prompt or not isinstance(prompt, str):
         return False, "Prompt must be a non-empty string"
     
-    if len(prompt.strip()) < 3:
+    if len(prompt) <= CHUNK_SIZE:
+        stripped_length = len(prompt.strip())
+    else:
+        # Measure the stripped length without copying the prompt
+        start, end = strip_bounds(prompt)
+        stripped_length = end - start
+    if stripped_length < 3:
         return False, "Prompt must be at least 3 characters long"
     
-    if len(prompt) > 5000:
-        return False, "Prompt must be less than 5000 characters"
+    if len(prompt) > max_length:
+        return False, f"Prompt must be less than {max_length} characters"
     
     return True, None
 
@@ -31,10 +43,23 @@ def get_cache_key(prompt):
     """
     Generate a cache key for the prompt.
     
+    Prompts longer than one chunk are lowercased and hashed in chunks,
+    which gives the same key as hashing the whole normalized prompt at once.
+    
     Args:
         prompt (str): The input prompt
         
     Returns:
         str: MD5 hash of the normalized prompt
     """
-    return hashlib.md5(prompt.lower().strip().encode()).hexdigest()
+    if len(prompt) <= CHUNK_SIZE:
+        return hashlib.md5(prompt.strip().lower().encode()).hexdigest()
+    start, end = strip_bounds(prompt)
+    digest = hashlib.md5()
+    try:
+        for chunk in iter_lower_chunks(prompt, start, end):
+            digest.update(chunk.encode())
+    except UnicodeEncodeError:
+        # Raise the same error, with whole-prompt positions, as the unchunked form
+        return hashlib.md5(prompt.lower().strip().encode()).hexdigest()
+    return digest.hexdigest()